@@ -1,25 +1,28 @@
+import os
+
 import streamlit as st
 import pandas as pd
 import math
 
+from tools import dashboard
+
 
 # Set the Streamlit page layout to wide
 st.set_page_config(layout="wide")
 
-# Read the CSV file
-file = "/Users/larrydsouza/Documents/Boavitza/boavitza/new_hp.csv"
-open_file = pd.read_csv(file)
-open_file["gwp_total"] = pd.to_numeric(open_file["gwp_total"], errors='coerce')
-
-
+# Data files to show, from the oldest to the newest: the newest ones replace the same devices in the oldest ones
+folder = os.path.dirname(os.path.abspath(__file__))
+available_sources = sorted(name for name in os.listdir(folder) if name.endswith(".csv"))
+selected_sources = st.multiselect("Data sources", options=available_sources, default=["new_hp.csv"])
+if not selected_sources:
+    st.info("Select at least one data source")
+    st.stop()
+sources = [os.path.join(folder, name) for name in selected_sources]
 
-# Filter rows where 'gwp_total' is not null
-filtered_df = open_file[
-    open_file["gwp_total"].notnull() & 
-    open_file["gwp_total"].apply(lambda x: isinstance(x, (int, float)))
-]
-
-complete_df = filtered_df[filtered_df["gwp_manufacturing_ratio"].notnull()]
+# Read the CSV files once per version: reruns reuse the typed tables
+tables = dashboard.load_tables(sources)
+filtered_df = tables["filtered_df"]
+complete_df = tables["complete_df"]
 
 table_options = {
     "filtered_df": filtered_df,
@@ -29,13 +32,21 @@ table_options = {
 selected_table = st.selectbox("Select a table type", options=table_options)
 data_table = table_options[selected_table]
 
+# Filters of the metrics and of the table view
+filter_col1, filter_col2, filter_col3 = st.columns([1,1,2])
+with filter_col1:
+    manufacturers = st.multiselect("Manufacturer", options=list(data_table["manufacturer"].cat.categories))
+with filter_col2:
+    categories = st.multiselect("Category", options=list(data_table["category"].cat.categories))
+with filter_col3:
+    search = st.text_input("Search a manufacturer or a name")
+filters = {column: values for column, values in {"manufacturer": manufacturers, "category": categories}.items() if values}
 
-data_table["gwp_total"] = pd.to_numeric(data_table["gwp_total"], errors='coerce')
-
-data_table["gwp_manufacturing_ratio"] = pd.to_numeric(data_table["gwp_manufacturing_ratio"], errors='coerce')
+# Metrics of the table, precomputed in its aggregate cube
+metrics = dashboard.load_cubes(sources)[selected_table].rollup(**filters)
 
 
-mean_value = data_table["gwp_total"].mean()
+mean_value = metrics["gwp_total"].mean
 mean_pcf = math.ceil(mean_value) if pd.notnull(mean_value) else 0
 
 st.metric("Mean Total PCF",mean_pcf)
@@ -45,14 +56,14 @@ if "count_datasets" is not st.session_state:
         st.session_state.count_datasets = 0
 
 
-new_count = len(data_table["sources_hash"])
+new_count = metrics["gwp_total"].count
 count_datasets = st.session_state.count_datasets
 if count_datasets != new_count:
     count_datasets = new_count
 
     with col1:
         # Current max value
-        max_manufacturing_ratio = round(data_table["gwp_manufacturing_ratio"].max(), 2)
+        max_manufacturing_ratio = round(metrics["gwp_manufacturing_ratio"].max, 2)
 
 
         # Show metric
@@ -69,21 +80,39 @@ if count_datasets != new_count:
     st.session_state["max_gwp_manufacturing"] = max_manufacturing_ratio
 
     with col2:
-        mean_manufacturing_ratio = round(data_table["gwp_manufacturing_ratio"].mean(),2)
+        mean_manufacturing_ratio = round(metrics["gwp_manufacturing_ratio"].mean,2)
         st.metric("Mean manufacturing GWP ratio", mean_manufacturing_ratio)
 
     with col3:
-        min_manufacturing_ratio = round(data_table["gwp_manufacturing_ratio"].min(),2)
+        min_manufacturing_ratio = round(metrics["gwp_manufacturing_ratio"].min,2)
         st.metric("Min manufacturing GWP ratio", min_manufacturing_ratio)    
 
 
-data_table["gwp_manufacturing"] = data_table["gwp_total"] * data_table["gwp_manufacturing_ratio"]
-
-mean_manufacturing_pcf = round(data_table["gwp_manufacturing"].mean(),2)
+mean_manufacturing_pcf = round(metrics["gwp_manufacturing"].mean,2)
 st.metric("**Mean manufacturing PCF**", mean_manufacturing_pcf)
 
 st.caption(f" a total of {count_datasets} datasets")
-st.dataframe(data_table, height=650, row_height=30)
+
+# Only the visible page of the table is sent to the browser: filters, search and sort run on the server
+sort_col, order_col, columns_col = st.columns([1,1,2])
+with sort_col:
+    sort_by = st.selectbox("Sort by", options=[""] + list(data_table.columns))
+with order_col:
+    descending = st.checkbox("Descending")
+with columns_col:
+    columns = st.multiselect(
+        "Columns", options=list(data_table.columns),
+        default=["manufacturer", "name", "category", "subcategory", "gwp_total", "gwp_manufacturing_ratio", "gwp_manufacturing", "report_date", "source"])
+query = dashboard.TableQuery(
+    filters=tuple((column, tuple(values)) for column, values in filters.items()),
+    search=search, sort_by=sort_by, ascending=not descending)
+page_size = 50
+_, nb_rows = dashboard.query_table(sources, selected_table, query, page_size=page_size, columns=columns)
+nb_pages = max(1, math.ceil(nb_rows / page_size))
+page = st.number_input(f"Page (of {nb_pages})", min_value=1, max_value=nb_pages, value=1) - 1
+page_table, nb_rows = dashboard.query_table(sources, selected_table, query, page=page, page_size=page_size, columns=columns)
+st.caption(f"rows {page * page_size + 1 if nb_rows else 0} to {page * page_size + len(page_table)} of {nb_rows}")
+st.dataframe(page_table, height=650, row_height=30)
 
 
 
@@ -0,0 +1,159 @@
+"""Audit and fix the electricity factors of the data files in bulk.
+
+The electricity factors implied by the rows of HP reports reveal lifetimes
+and totals which do not match the computation of the reports (see
+parsers/lib/electricity.py). The audit applies the fixes of the HP parser to
+the existing data, on whole columns of the file's snapshot, and lists the
+rows to fix. With an output file, the rows are fixed and their comment
+annotated, all other rows being copied as they are:
+
+    python -m tools.audit boavizta-data-us.csv -v
+    python -m tools.audit boavizta-data-us.csv -o boavizta-data-us.csv
+
+The heuristics use the factors of HP, so only HP rows are audited by
+default. The implausible factors of other manufacturers are only flagged by
+the electricity_factor rule of validate.py.
+"""
+import argparse
+import io
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from tools import convert_csv
+from tools import snapshot
+from tools import validate
+from tools.parsers.lib import electricity
+
+# The manufacturers whose reports have the errors fixed by the audit.
+AUDITED_MANUFACTURERS = ('HP',)
+
+def _matching_rows(dataset: snapshot.Snapshot, field: str, matches: Callable[[str], bool]) -> np.ndarray:
+    """The rows whose value of a text field matches, tested once per distinct value."""
+    categories = dataset.categories(field).tolist()
+    return np.isin(dataset.codes(field), [code for code, value in enumerate(categories) if matches(value)])
+
+
+def audit(dataset: snapshot.Snapshot, manufacturers: Sequence[str] = AUDITED_MANUFACTURERS) -> electricity.Fixes:
+    """The fixes of the rows of the given manufacturers in a data file.
+
+    Rows whose comment tells they were already fixed, by a parser or a
+    previous audit, are left as they are: their fixed factors can look odd again.
+    """
+    fixes = electricity.fix_electricity_factor(
+        dataset.values('gwp_total'), dataset.values('gwp_use_ratio'),
+        dataset.values('yearly_tec'), dataset.values('lifetime'))
+    audited = ~_matching_rows(dataset, 'comment', lambda comment: any(
+        fix in comment for fix in (electricity.FIXED_LIFETIME, electricity.FIXED_GWP_TOTAL)))
+    lower_manufacturers = {manufacturer.lower() for manufacturer in manufacturers}
+    audited &= _matching_rows(dataset, 'manufacturer', lambda manufacturer: manufacturer.lower() in lower_manufacturers)
+    return fixes._replace(
+        fixed_gwp_total=fixes.fixed_gwp_total & audited, fixed_lifetime=fixes.fixed_lifetime & audited)
+
+
+def _format_number(value: float, original: str) -> str:
+    """Format a fixed number like the original one: with a decimal point or not."""
+    value = round(float(value), 2)
+    if value.is_integer() and '.' not in original:
+        return str(int(value))
+    return str(value)
+
+
+def report(dataset: snapshot.Snapshot, fixes: electricity.Fixes) -> List[Dict[str, Any]]:
+    """The fixed rows, with their key, factor and the values before and after the fixes."""
+    rows = np.flatnonzero(fixes.fixed())
+    factors = validate.electricity_factor(dataset)
+    values = {field: dataset.values(field)[rows].tolist() for field in validate.KEY_FIELDS + ('gwp_total', 'lifetime')}
+    return [
+        {
+            'row': int(row),
+            **{field: values[field][index] for field in validate.KEY_FIELDS},
+            'electricity_factor': round(float(factors[row]), 3),
+            'gwp_total': [values['gwp_total'][index], round(float(fixes.gwp_total[row]), 2)],
+            'lifetime': [values['lifetime'][index], float(fixes.lifetime[row])],
+            'fixes': [
+                fix for fix, fixed in (
+                    (electricity.FIXED_LIFETIME, fixes.fixed_lifetime), (electricity.FIXED_GWP_TOTAL, fixes.fixed_gwp_total))
+                if fixed[row]],
+        }
+        for index, row in enumerate(rows.tolist())]
+
+
+def apply(csv_path: str, fixes: electricity.Fixes) -> str:
+    """The content of a data file with the fixes applied, in the same format.
+
+    The fixed rows get their new gwp_total and lifetime, and the fixes
+    appended to their comment. All other rows are unchanged.
+    """
+    with open(csv_path, 'rt', encoding='utf-8', newline='') as csv_file:
+        content = csv_file.read()
+    text = io.StringIO(content, newline='')
+    csv_format = convert_csv.detect_format(text)
+    rows = list(convert_csv.reader(text, csv_format))
+    headers = rows[0] if rows else []
+    to_us = convert_csv.RowConverter(headers, csv_format, 'us')
+    from_us = convert_csv.RowConverter(headers, 'us', csv_format)
+    columns = {field: headers.index(field) for field in ('gwp_total', 'lifetime', 'comment') if field in headers}
+    if 'comment' not in columns:
+        headers.append('comment')
+        columns['comment'] = len(headers) - 1
+
+    output = io.StringIO(newline='')
+    writer = convert_csv.writer(output, csv_format)
+    writer.writerow(headers)
+    fixed = fixes.fixed()
+    # The rows of the snapshot skip blank and header lines.
+    index = 0
+    for row in rows[1:]:
+        if not row or row == headers:
+            writer.writerow(row)
+            continue
+        if fixed[index]:
+            row = to_us(row)
+            row.extend([''] * (len(headers) - len(row)))
+            comments = [row[columns['comment']].strip()] if row[columns['comment']].strip() else []
+            if fixes.fixed_lifetime[index]:
+                row[columns['lifetime']] = _format_number(fixes.lifetime[index], row[columns['lifetime']])
+                comments.append(electricity.FIXED_LIFETIME)
+            if fixes.fixed_gwp_total[index]:
+                row[columns['gwp_total']] = _format_number(fixes.gwp_total[index], row[columns['gwp_total']])
+                comments.append(electricity.FIXED_GWP_TOTAL)
+            row[columns['comment']] = ' '.join(comments)
+            row = from_us(row)
+        writer.writerow(row)
+        index += 1
+    return output.getvalue()
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Audit and fix the electricity factors of Boavizta csv files',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument('file', help='.csv file to audit')
+    argparser.add_argument(
+        '--manufacturer', nargs='+', default=list(AUDITED_MANUFACTURERS),
+        help='Audit the devices of these manufacturers, whose reports have the same errors as HP ones')
+    argparser.add_argument('-o', '--output', help='Output .csv file with the fixed rows, can be the audited file')
+    argparser.add_argument('-v', '--verbose', action='store_true', help='Print the fixed rows')
+    args = argparser.parse_args(string_args)
+
+    start = time.perf_counter()
+    dataset = snapshot.load(args.file)
+    fixes = audit(dataset, args.manufacturer)
+    fixed_rows = report(dataset, fixes)
+    print(
+        f'{args.file}: {len(dataset)} rows audited in {(time.perf_counter() - start) * 1000:.1f} ms, '
+        f'{int(fixes.fixed_lifetime.sum())} lifetimes and {int(fixes.fixed_gwp_total.sum())} gwp_totals to fix')
+    if args.verbose:
+        for row in fixed_rows:
+            print(f'  {row}')
+
+    if args.output:
+        content = apply(args.file, fixes)
+        with open(args.output, 'wt', encoding='utf-8', newline='') as output_file:
+            output_file.write(content)
+
+
+if __name__ == '__main__':
+    main()
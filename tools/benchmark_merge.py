@@ -0,0 +1,89 @@
+"""Benchmark the insertion of new rows into a sorted data file.
+
+Compare re-sorting the whole file after appending each new row, as
+generate-gh-pr.py used to do, with inserting all the new rows in one pass
+with data.merge_sorted. The data files are synthesized from the rows of
+boavizta-data-us.csv:
+
+    python -m tools.benchmark_merge --sizes 10000 100000 --new_rows 100
+"""
+import argparse
+import csv
+import io
+import random
+import time
+from typing import List, Optional, Tuple
+
+from tools import convert_csv
+from tools.parsers.lib import data
+
+
+def synthesize(template_file: str, size: int, seed: int = 0) -> Tuple[List[str], List[List[str]]]:
+    """A sorted data file of the given size, with rows derived from a template file."""
+    with open(template_file, 'rt', encoding='utf-8', newline='') as csv_file:
+        headers, *template = csv.reader(csv_file)
+    name = headers.index('name')
+    generator = random.Random(seed)
+    rows = []
+    for index in range(size):
+        row = list(generator.choice(template))
+        row[name] = f'{row[name]} #{index}'
+        rows.append(row)
+    return headers, sorted(rows, key=data.row_sort_key(headers))
+
+
+def _to_text(headers: List[str], rows: List[List[str]]) -> str:
+    output = io.StringIO()
+    writer = convert_csv.writer(output, 'us')
+    writer.writerow(headers)
+    writer.writerows(rows)
+    return output.getvalue()
+
+
+def resort_each_row(content: str, new_rows: List[str]) -> str:
+    """Append each row and sort the whole file again."""
+    for row in new_rows:
+        lines = (content + row).splitlines()
+        content = lines[0] + '\n' + '\n'.join(sorted(lines[1:])) + '\n'
+    return content
+
+
+def merge_all_rows(content: str, new_rows: List[List[str]]) -> str:
+    """Parse the file and insert all the new rows in one pass."""
+    headers, *rows = convert_csv.reader(io.StringIO(content), 'us')
+    return _to_text(headers, data.merge_sorted(rows, new_rows, data.row_sort_key(headers)))
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Benchmark the insertion of new rows into a sorted data file',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument('--template', default='boavizta-data-us.csv', help='.csv file to take rows from')
+    argparser.add_argument('--sizes', nargs='+', default=[10000, 100000], type=int, help='Numbers of rows of the data file')
+    argparser.add_argument('--new_rows', default=100, type=int, help='Number of rows to insert')
+    args = argparser.parse_args(string_args)
+
+    print(f'{"rows":>8} {"new rows":>9} {"re-sort (s)":>12} {"merge (s)":>10} {"speedup":>8}')
+    for size in args.sizes:
+        headers, rows = synthesize(args.template, size + args.new_rows)
+        # Take the new rows at random in the sorted ones.
+        new_indexes = set(random.Random(1).sample(range(len(rows)), args.new_rows))
+        new_rows = [row for index, row in enumerate(rows) if index in new_indexes]
+        content = _to_text(headers, [row for index, row in enumerate(rows) if index not in new_indexes])
+
+        start = time.perf_counter()
+        resorted = resort_each_row(content, [_to_text(headers, [row]).split('\n', 1)[1] for row in new_rows])
+        resort_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        merged = merge_all_rows(content, new_rows)
+        merge_seconds = time.perf_counter() - start
+
+        if len(merged) != len(resorted):
+            raise ValueError('The two methods do not give the same number of rows')
+        print(
+            f'{size:>8} {args.new_rows:>9} {resort_seconds:>12.3f} {merge_seconds:>10.3f} '
+            f'{resort_seconds / merge_seconds:>7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
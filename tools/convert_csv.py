@@ -0,0 +1,167 @@
+"""Convert the data files between the US and FR formats.
+
+The FR format uses ';' as a delimiter and ',' as a decimal separator. Only
+the numeric columns of DeviceCarbonFootprintData are converted, so that names,
+URLs or drive descriptions keep their dots. Files are streamed by chunks of
+rows, and both formats can be written from a single read:
+
+    python -m tools.convert_csv boavizta-data-us.csv --fr boavizta-data-fr.csv
+    python -m tools.convert_csv new_fr.csv --us new_us.csv --fr new_fr_clean.csv
+
+To check that the FR file is in sync with the US one, without writing anything:
+
+    python -m tools.convert_csv boavizta-data-us.csv --fr boavizta-data-fr.csv --check
+"""
+import argparse
+import csv
+import itertools
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Mapping, Optional, Sequence, TextIO, Tuple
+
+from tools.parsers.lib import data
+
+CsvFormat = Literal['us', 'fr']
+
+NUMERIC_FIELDS = frozenset(
+    key for key, data_type in data.DeviceCarbonFootprintData.__annotations__.items()
+    if data_type in (float, int))
+_DELIMITERS = {'us': ',', 'fr': ';'}
+# The line endings of boavizta-data-us.csv and boavizta-data-fr.csv.
+_LINE_TERMINATORS = {'us': '\n', 'fr': '\r\n'}
+_DECIMAL_SEPARATORS = {'us': '.', 'fr': ','}
+
+
+def reader(csv_file: TextIO, csv_format: CsvFormat) -> Iterator[List[str]]:
+    return csv.reader(csv_file, delimiter=_DELIMITERS[csv_format])
+
+
+def writer(output: TextIO, csv_format: CsvFormat) -> Any:
+    """A CSV writer in the given format, the output should be opened with newline=''."""
+    return csv.writer(
+        output, delimiter=_DELIMITERS[csv_format], lineterminator=_LINE_TERMINATORS[csv_format])
+
+
+def detect_format(csv_file: TextIO) -> CsvFormat:
+    """Guess the format of a CSV file from its header line, and rewind it."""
+    header = csv_file.readline()
+    csv_file.seek(0)
+    return 'fr' if ';' in header else 'us'
+
+
+class RowConverter:
+    """Convert the rows of a CSV file with the given headers to another format."""
+
+    def __init__(self, headers: Sequence[str], source: CsvFormat, target: CsvFormat) -> None:
+        self._numeric_columns = [
+            column for column, header in enumerate(headers) if header in NUMERIC_FIELDS]
+        self._old = _DECIMAL_SEPARATORS[source]
+        self._new = _DECIMAL_SEPARATORS[target]
+
+    def __call__(self, row: Sequence[str]) -> List[str]:
+        converted = list(row)
+        if self._old == self._new:
+            return converted
+        for column in self._numeric_columns:
+            if column < len(converted):
+                converted[column] = converted[column].replace(self._old, self._new)
+        return converted
+
+
+def _chunks(rows: Iterable[List[str]], chunk_size: int) -> Iterator[List[List[str]]]:
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def convert(
+    source: TextIO, outputs: Mapping[CsvFormat, TextIO], chunk_size: int = 1000,
+) -> int:
+    """Convert a CSV file to each of the given formats, return the number of rows.
+
+    The output files should be opened with newline=''.
+    """
+    source_format = detect_format(source)
+    rows = reader(source, source_format)
+    headers = next(rows)
+    writers = [
+        (writer(output, csv_format), RowConverter(headers, source_format, csv_format))
+        for csv_format, output in outputs.items()]
+    for csv_writer, unused_converter in writers:
+        csv_writer.writerow(headers)
+    count = 0
+    for chunk in _chunks(rows, chunk_size):
+        for csv_writer, converter in writers:
+            csv_writer.writerows([converter(row) for row in chunk])
+        count += len(chunk)
+    return count
+
+
+def check(source: TextIO, target: TextIO) -> List[str]:
+    """List the differences between a converted CSV file and its expected content."""
+    source_format = detect_format(source)
+    target_format = detect_format(target)
+    source_reader = reader(source, source_format)
+    target_reader = reader(target, target_format)
+    headers: List[str] = next(source_reader, [])
+    target_headers: List[str] = next(target_reader, [])
+    if headers != target_headers:
+        return [f'headers differ: {headers} != {target_headers}']
+    converter = RowConverter(headers, source_format, target_format)
+    errors: List[str] = []
+    for line, (row, target_row) in enumerate(itertools.zip_longest(source_reader, target_reader), start=2):
+        if row is None:
+            errors.append(f'line {line}: extra row in the {target_format} file')
+        elif target_row is None:
+            errors.append(f'line {line}: missing row in the {target_format} file')
+        else:
+            expected = converter(row)
+            if expected != target_row:
+                fields = [
+                    header for header, value, target_value in itertools.zip_longest(headers, expected, target_row)
+                    if value != target_value]
+                errors.append(f'line {line}: {", ".join(str(field) for field in fields)} differ')
+    return errors
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Convert Boavizta csv files between the US and FR formats',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument('source', help='.csv file to convert, in the US or FR format')
+    argparser.add_argument('--us', help='Output .csv file in the US format')
+    argparser.add_argument('--fr', help='Output .csv file in the FR format')
+    argparser.add_argument('--check', action='store_true', help='Check that the outputs are in sync with the source instead of writing them')
+    argparser.add_argument('--chunk_size', default=1000, type=int, help='Number of rows converted at once')
+    args = argparser.parse_args(string_args)
+    formats: Tuple[Tuple[CsvFormat, Optional[str]], ...] = (('us', args.us), ('fr', args.fr))
+    targets = {csv_format: path for csv_format, path in formats if path}
+    if not targets:
+        argparser.error('at least one of --us and --fr is required')
+
+    if args.check:
+        in_sync = True
+        for path in targets.values():
+            with open(args.source, 'rt', encoding='utf-8', newline='') as source, \
+                    open(path, 'rt', encoding='utf-8', newline='') as target:
+                for error in check(source, target):
+                    in_sync = False
+                    print(f'{path}: {error}', file=sys.stderr)
+        if not in_sync:
+            sys.exit(1)
+        return
+
+    outputs: Dict[CsvFormat, TextIO] = {csv_format: open(path, 'w', encoding='utf-8', newline='') for csv_format, path in targets.items()}
+    try:
+        with open(args.source, 'rt', encoding='utf-8', newline='') as source:
+            count = convert(source, outputs, chunk_size=args.chunk_size)
+    finally:
+        for output in outputs.values():
+            output.close()
+    print(f'{count} rows converted to {", ".join(targets.values())}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,440 @@
+"""Aggregate cubes of the data files, for the dashboard metrics and breakdowns.
+
+A cube holds the count, sum, exact min and max and a quantile sketch of each
+measure per manufacturer, category, subcategory and report year, so that metrics of
+any slice of the data read a few cells instead of scanning the rows. A cube
+only counts the devices which have its required fields, e.g. those with a
+manufacturing ratio for the dashboard's complete table.
+
+The cubes of a data file are saved next to it (e.g. boavizta-data-us.csv.cube.json),
+built once per version of the file and updated incrementally by merge_csv
+with a manifest:
+
+    data_cube = cube.load('boavizta-data-us.csv')
+    data_cube.rollup(manufacturer='HP')['gwp_total'].quantile(0.5)
+    data_cube.breakdown('year')
+
+To print a breakdown of a data file:
+
+    python -m tools.cube boavizta-data-us.csv --by manufacturer
+"""
+import argparse
+import collections
+import json
+import math
+import operator
+import os
+import re
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple, Union, cast
+
+import numpy as np
+
+from tools import snapshot
+from tools.parsers.lib import data
+
+_VERSION = 2
+DIMENSIONS = ('manufacturer', 'category', 'subcategory', 'year')
+MEASURES = ('gwp_total', 'gwp_manufacturing_ratio', 'gwp_manufacturing')
+# Quantiles are estimated within 1% of their value.
+_RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + _RELATIVE_ACCURACY) / (1 - _RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+CellKey = Tuple[str, str, str, str]
+
+
+def report_year(report_date: str) -> str:
+    match = re.search(r'\b(?:19|20)\d\d\b', report_date)
+    return match[0] if match else ''
+
+
+class QuantileSketch:
+    """A mergeable histogram of values in logarithmic bins (DDSketch), to estimate quantiles.
+
+    Values below or equal to 0 are counted as 0.
+    """
+
+    def __init__(self) -> None:
+        self.zeros = 0
+        self.bins: Dict[int, int] = collections.Counter()
+
+    @staticmethod
+    def _bin(value: float) -> int:
+        return math.ceil(math.log(value) / _LOG_GAMMA)
+
+    @staticmethod
+    def _bin_value(index: int) -> float:
+        return 2 * _GAMMA ** index / (_GAMMA + 1)
+
+    def add(self, value: float, count: int = 1) -> None:
+        if value <= 0:
+            self.zeros += count
+        else:
+            self.bins[self._bin(value)] += count
+
+    def add_values(self, values: np.ndarray) -> None:
+        positive = values[values > 0]
+        self.zeros += len(values) - len(positive)
+        indexes, counts = np.unique(np.ceil(np.log(positive) / _LOG_GAMMA).astype(np.int64), return_counts=True)
+        for index, count in zip(indexes.tolist(), counts.tolist()):
+            self.bins[index] += count
+
+    def remove(self, value: float) -> None:
+        if value <= 0:
+            self.zeros -= 1
+            return
+        index = self._bin(value)
+        self.bins[index] -= 1
+        if not self.bins[index]:
+            del self.bins[index]
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        self.zeros += other.zeros
+        for index, count in other.bins.items():
+            self.bins[index] += count
+
+    def quantile(self, fraction: float) -> float:
+        """The estimated value at a fraction (0 to 1) of the sorted values, NaN if empty."""
+        total = self.zeros + sum(self.bins.values())
+        if not total:
+            return math.nan
+        rank = fraction * (total - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                return self._bin_value(index)
+        return self._bin_value(max(self.bins))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'zeros': self.zeros, 'bins': sorted(self.bins.items())}
+
+    @classmethod
+    def from_json(cls, value: Mapping[str, Any]) -> 'QuantileSketch':
+        sketch = cls()
+        sketch.zeros = value['zeros']
+        sketch.bins.update({index: count for index, count in value['bins']})
+        return sketch
+
+
+def _merge_extreme(
+    extreme: float, count: int, other: float, other_count: int, is_beyond: Callable[[float, float], bool],
+) -> Tuple[float, int]:
+    """Merge two extremes (min or max) with the number of values equal to them, 0 if they are unknown."""
+    if not count or not other_count:
+        return math.nan, 0
+    if other == extreme:
+        return extreme, count + other_count
+    return (other, other_count) if is_beyond(other, extreme) else (extreme, count)
+
+
+class Stats:
+    """The aggregates of a measure over a set of devices.
+
+    The min and max are exact: the number of values equal to each is kept so
+    that they survive removals. Once all the values equal to one of them are
+    removed, it is unknown (NaN) until its cell is recomputed, see Cube.update.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.
+        self.min = math.nan
+        self.max = math.nan
+        self.min_count = 0
+        self.max_count = 0
+        self.sketch = QuantileSketch()
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else math.nan
+
+    @property
+    def exact_bounds(self) -> bool:
+        """Whether the min and max are known."""
+        return not self.count or bool(self.min_count and self.max_count)
+
+    def quantile(self, fraction: float) -> float:
+        if not self.count:
+            return math.nan
+        value = self.sketch.quantile(fraction)
+        if self.min_count:
+            value = max(value, self.min)
+        if self.max_count:
+            value = min(value, self.max)
+        return value
+
+    def _merge_bounds(self, low: float, low_count: int, high: float, high_count: int) -> None:
+        if not self.count:
+            self.min, self.min_count, self.max, self.max_count = low, low_count, high, high_count
+            return
+        self.min, self.min_count = _merge_extreme(self.min, self.min_count, low, low_count, operator.lt)
+        self.max, self.max_count = _merge_extreme(self.max, self.max_count, high, high_count, operator.gt)
+
+    def add(self, value: float) -> None:
+        self._merge_bounds(value, 1, value, 1)
+        self.count += 1
+        self.total += value
+        self.sketch.add(value)
+
+    def add_values(self, values: np.ndarray) -> None:
+        if not len(values):
+            return
+        low, high = float(values.min()), float(values.max())
+        self._merge_bounds(low, int((values == low).sum()), high, int((values == high).sum()))
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.sketch.add_values(values)
+
+    def remove(self, value: float) -> None:
+        """Remove a value: if it was the last one equal to the min or max, that one becomes unknown."""
+        self.count -= 1
+        self.sketch.remove(value)
+        if not self.count:
+            self.total, self.min, self.max, self.min_count, self.max_count = 0., math.nan, math.nan, 0, 0
+            return
+        self.total -= value
+        if value == self.min:
+            self.min_count -= 1
+            if not self.min_count:
+                self.min = math.nan
+        if value == self.max:
+            self.max_count -= 1
+            if not self.max_count:
+                self.max = math.nan
+
+    def merge(self, other: 'Stats') -> None:
+        if not other.count:
+            return
+        self._merge_bounds(other.min, other.min_count, other.max, other.max_count)
+        self.count += other.count
+        self.total += other.total
+        self.sketch.merge(other.sketch)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'count': self.count, 'total': self.total, 'min': self.min, 'max': self.max,
+            'min_count': self.min_count, 'max_count': self.max_count, 'sketch': self.sketch.to_json()}
+
+    @classmethod
+    def from_json(cls, value: Mapping[str, Any]) -> 'Stats':
+        stats = cls()
+        stats.count, stats.total = value['count'], value['total']
+        stats.min, stats.max = value['min'], value['max']
+        stats.min_count, stats.max_count = value['min_count'], value['max_count']
+        stats.sketch = QuantileSketch.from_json(value['sketch'])
+        return stats
+
+
+def _measures(device: data.DeviceCarbonFootprint) -> Dict[str, float]:
+    values = {
+        measure: float(value) for measure in MEASURES[:2]
+        for value in [device.get(measure)] if isinstance(value, (int, float))}
+    if len(values) == 2:
+        values['gwp_manufacturing'] = values['gwp_total'] * values['gwp_manufacturing_ratio']
+    return values
+
+
+class Cube:
+    """Aggregates of the measures by manufacturer, category, subcategory and report year."""
+
+    def __init__(self, required: Sequence[str] = ('gwp_total',)) -> None:
+        self.required = tuple(required)
+        self.cells: Dict[CellKey, Dict[str, Stats]] = {}
+
+    def _cell(self, key: CellKey) -> Dict[str, Stats]:
+        if key not in self.cells:
+            self.cells[key] = {measure: Stats() for measure in MEASURES}
+        return self.cells[key]
+
+    def _key(self, device: data.DeviceCarbonFootprint) -> Optional[CellKey]:
+        measures = _measures(device)
+        for field in self.required:
+            if field not in measures if field in MEASURES else not str(device.get(field) or '').strip():
+                return None
+        manufacturer, category, subcategory, report_date = (
+            str(device.get(field) or '').strip()
+            for field in ('manufacturer', 'category', 'subcategory', 'report_date'))
+        return manufacturer, category, subcategory, report_year(report_date)
+
+    def add(self, device: data.DeviceCarbonFootprint) -> None:
+        key = self._key(device)
+        if key is None:
+            return
+        cell = self._cell(key)
+        for measure, value in _measures(device).items():
+            cell[measure].add(value)
+
+    def remove(self, device: data.DeviceCarbonFootprint) -> None:
+        key = self._key(device)
+        if key is None or key not in self.cells:
+            return
+        cell = self.cells[key]
+        for measure, value in _measures(device).items():
+            cell[measure].remove(value)
+        if not any(stats.count for stats in cell.values()):
+            del self.cells[key]
+
+    def update(
+        self, removed: Iterable[data.DeviceCarbonFootprint], added: Iterable[data.DeviceCarbonFootprint],
+    ) -> Set[CellKey]:
+        """Replace devices, e.g. the previous and new versions of merged devices.
+
+        Return the cells which lost their min or max: recompute them with all
+        the devices to know them again.
+        """
+        for device in removed:
+            self.remove(device)
+        for device in added:
+            self.add(device)
+        return {
+            key for key, cell in self.cells.items() if not all(stats.exact_bounds for stats in cell.values())}
+
+    def recompute(self, keys: Set[CellKey], devices: Iterable[data.DeviceCarbonFootprint]) -> None:
+        """Compute some cells again from all the devices."""
+        for key in keys:
+            self.cells.pop(key, None)
+        for device in devices:
+            if self._key(device) in keys:
+                self.add(device)
+
+    def _matches(self, key: CellKey, filters: Mapping[str, Union[str, Sequence[str]]]) -> bool:
+        for dimension, value in filters.items():
+            cell_value = key[DIMENSIONS.index(dimension)]
+            if cell_value != value if isinstance(value, str) else cell_value not in value:
+                return False
+        return True
+
+    def rollup(self, **filters: Union[str, Sequence[str]]) -> Dict[str, Stats]:
+        """The aggregates of the devices matching filters on the dimensions, e.g. category='Workplace'."""
+        for dimension in filters:
+            if dimension not in DIMENSIONS:
+                raise ValueError(f'Unknown dimension "{dimension}", use one of {DIMENSIONS}')
+        result = {measure: Stats() for measure in MEASURES}
+        for key, cell in self.cells.items():
+            if self._matches(key, filters):
+                for measure, stats in cell.items():
+                    result[measure].merge(stats)
+        return result
+
+    def breakdown(self, dimension: str, **filters: Union[str, Sequence[str]]) -> Dict[str, Dict[str, Stats]]:
+        """The aggregates of the devices matching the filters, by value of a dimension."""
+        position = DIMENSIONS.index(dimension)
+        values = sorted({key[position] for key in self.cells if self._matches(key, filters)})
+        return {value: self.rollup(**dict(filters, **{dimension: value})) for value in values}
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'required': list(self.required),
+            'cells': [
+                [list(key), {measure: stats.to_json() for measure, stats in cell.items()}]
+                for key, cell in sorted(self.cells.items())]}
+
+    @classmethod
+    def from_json(cls, value: Mapping[str, Any]) -> 'Cube':
+        cube = cls(value['required'])
+        for key, cell in value['cells']:
+            cube.cells[cast(CellKey, tuple(key))] = {
+                measure: Stats.from_json(stats) for measure, stats in cell.items()}
+        return cube
+
+
+def from_dataframe(dataframe: Any, required: Sequence[str] = ('gwp_total',)) -> Cube:
+    """Compute the cube of a DataFrame of devices with categorical string columns, see Snapshot.to_dataframe."""
+    cube = Cube(required)
+    selected = dataframe[list(required)].notnull().all(axis=1).to_numpy() if required else np.ones(len(dataframe), dtype=bool)
+    columns = {
+        measure: dataframe[measure].to_numpy(dtype=np.float64, na_value=np.nan)[selected]
+        for measure in MEASURES[:2]}
+    columns['gwp_manufacturing'] = columns['gwp_total'] * columns['gwp_manufacturing_ratio']
+
+    years = [report_year(str(date)) for date in dataframe['report_date'].cat.categories] + ['']
+    labels = [
+        [str(value) for value in dataframe[field].cat.categories] + [''] for field in DIMENSIONS[:3]] + [years]
+    codes = np.stack([
+        dataframe[field].cat.codes.to_numpy()[selected] for field in DIMENSIONS[:3] + ('report_date',)], axis=1)
+    groups, inverse = np.unique(codes, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    for group, group_codes in enumerate(groups.tolist()):
+        in_group = inverse == group
+        # Dates of the same year share a cell.
+        cell = cube._cell(cast(CellKey, tuple(labels[column][code] for column, code in enumerate(group_codes))))
+        for measure, values in columns.items():
+            group_values = values[in_group]
+            cell[measure].add_values(group_values[~np.isnan(group_values)])
+    # Devices without any measure leave no cell, as when they are removed.
+    for key in [key for key, cell in cube.cells.items() if not any(stats.count for stats in cell.values())]:
+        del cube.cells[key]
+    return cube
+
+
+def build(csv_path: str, required: Sequence[str] = ('gwp_total',)) -> Cube:
+    """Compute the cube of a data file from its snapshot."""
+    return from_dataframe(snapshot.load(csv_path).to_dataframe(), required)
+
+
+def cube_path(csv_path: str) -> str:
+    return f'{csv_path}.cube.json'
+
+
+def read_cubes(csv_path: str) -> Optional[Dict[Tuple[str, ...], Cube]]:
+    """The saved cubes of a data file, by required fields, or None if the file changed since."""
+    try:
+        with open(cube_path(csv_path), 'rt', encoding='utf-8') as cube_file:
+            saved: Dict[str, Any] = json.load(cube_file)
+        stat = os.stat(csv_path)
+    except (OSError, ValueError):
+        return None
+    if saved.get('version') != _VERSION:
+        return None
+    if (saved['mtime_ns'], saved['size']) != (stat.st_mtime_ns, stat.st_size) and (
+            saved['size'] != stat.st_size or saved['md5'] != data.md5_file(csv_path)):
+        return None
+    cubes = [Cube.from_json(value) for value in saved['cubes']]
+    return {cube.required: cube for cube in cubes}
+
+
+def write_cubes(csv_path: str, cubes: Mapping[Tuple[str, ...], Cube]) -> None:
+    """Save the cubes of the current version of a data file."""
+    stat = os.stat(csv_path)
+    saved = {
+        'version': _VERSION, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+        'md5': data.md5_file(csv_path), 'cubes': [cube.to_json() for cube in cubes.values()]}
+    tmp_path = f'{cube_path(csv_path)}.{os.getpid()}'
+    with open(tmp_path, 'wt', encoding='utf-8') as cube_file:
+        json.dump(saved, cube_file)
+    os.replace(tmp_path, cube_path(csv_path))
+
+
+def load(csv_path: str, required: Sequence[str] = ('gwp_total',)) -> Cube:
+    """The cube of a data file, built and saved if it is missing or out of date."""
+    cubes = read_cubes(csv_path) or {}
+    if tuple(required) not in cubes:
+        cubes[tuple(required)] = build(csv_path, required)
+        write_cubes(csv_path, cubes)
+    return cubes[tuple(required)]
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Print aggregates of a Boavizta csv file',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument('file', help='.csv file to aggregate')
+    argparser.add_argument('--by', default='manufacturer', choices=DIMENSIONS, help='Dimension to break the aggregates down by')
+    argparser.add_argument('--measure', default='gwp_total', choices=MEASURES, help='Measure to aggregate')
+    args = argparser.parse_args(string_args)
+
+    breakdown = load(args.file).breakdown(args.by)
+    print(f'{args.by:<30} {"count":>6} {"mean":>10} {"min":>10} {"median":>10} {"p90":>10} {"max":>10}')
+    for value, measures in breakdown.items():
+        stats = measures[args.measure]
+        if stats.count:
+            print(
+                f'{value or "-":<30} {stats.count:>6} {stats.mean:>10.2f} {stats.min:>10.2f} '
+                f'{stats.quantile(.5):>10.2f} {stats.quantile(.9):>10.2f} {stats.max:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""The data of the dashboard (boavitza.py), loaded once per version of its data files.
+
+Streamlit runs the whole dashboard script again on every interaction: the
+data files and the tables derived from them are memoized by path,
+modification time and size, so that a rerun only looks them up while the
+files are unchanged. Columns are typed after DeviceCarbonFootprintData by the
+files' snapshots, and the metrics of each table come from its aggregate cube
+(see cube.py).
+
+    tables = dashboard.load_tables('boavizta-data-us.csv')
+    tables['complete_df']['gwp_manufacturing']
+    dashboard.load_cubes('boavizta-data-us.csv')['complete_df'].rollup()['gwp_manufacturing'].mean
+
+Several data files, in the US or FR format, can be federated: each one is
+loaded and cached on its own, the snapshots to (re)build are built in
+parallel, and the devices of the newest files replace those with the same
+sources_hash and name in the oldest ones. A source column tells which file
+each device comes from.
+
+    tables = dashboard.load_tables(['boavizta-data-us.csv', 'new_hp.csv', 'new_lenovo.csv'])
+
+The table view only gets one page of a table: filters, searches and sorts
+run here, on the categorical codes of the columns, and their results are
+memoized too.
+
+    page, total = dashboard.query_table(
+        'boavizta-data-us.csv', 'filtered_df', dashboard.TableQuery(search='latitude', sort_by='gwp_total'))
+"""
+from concurrent import futures
+import functools
+import os
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from tools import cube
+from tools import snapshot
+
+# The tables of the dashboard, with the fields their devices must have.
+TABLES = {
+    'filtered_df': ('gwp_total',),
+    'complete_df': ('gwp_total', 'gwp_manufacturing_ratio'),
+}
+# The columns searched by the search box of the table view.
+SEARCH_COLUMNS = ('manufacturer', 'name')
+SOURCE_COLUMN = 'source'
+
+# A data file, or several ones from the oldest to the newest.
+Sources = Union[str, Sequence[str]]
+
+
+class FileVersion(NamedTuple):
+    """A version of a file, which changes whenever the file is written."""
+    path: str
+    mtime_ns: int
+    size: int
+
+
+def file_version(path: str) -> FileVersion:
+    stat = os.stat(path)
+    return FileVersion(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def _versions(sources: Sources) -> Tuple[FileVersion, ...]:
+    return tuple(file_version(path) for path in ([sources] if isinstance(sources, str) else sources))
+
+
+@functools.lru_cache(maxsize=32)
+def _load_source(version: FileVersion) -> Any:
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    dataframe = snapshot.load(version.path).to_dataframe()
+    dataframe['gwp_manufacturing'] = dataframe['gwp_total'] * dataframe['gwp_manufacturing_ratio']
+    dataframe[SOURCE_COLUMN] = pd.Categorical([os.path.basename(version.path)] * len(dataframe))
+    return dataframe
+
+
+def _build_snapshot(path: str) -> int:
+    return len(snapshot.build(path))
+
+
+def _build_snapshots(paths: Sequence[str]) -> None:
+    """Build the snapshots which are out of date, in parallel."""
+    out_of_date = [path for path in paths if not snapshot.is_up_to_date(path)]
+    if len(out_of_date) < 2:
+        return
+    with futures.ProcessPoolExecutor(max_workers=min(len(out_of_date), os.cpu_count() or 1)) as executor:
+        list(executor.map(_build_snapshot, out_of_date))
+
+
+def _federate(dataframes: Sequence[Any]) -> Any:
+    """Concatenate DataFrames of devices, the newest ones replacing the devices with the same key."""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    from pandas.api.types import union_categoricals  # pylint: disable=import-outside-toplevel
+
+    columns = {}
+    for column in dataframes[0].columns:
+        if isinstance(dataframes[0][column].dtype, pd.CategoricalDtype):
+            # Columns without values have categories of objects instead of strings.
+            columns[column] = union_categoricals([
+                dataframe[column].cat.set_categories(dataframe[column].cat.categories.astype(str))
+                for dataframe in dataframes], sort_categories=True)
+        else:
+            columns[column] = pd.concat([dataframe[column] for dataframe in dataframes], ignore_index=True)
+    federated = pd.DataFrame(columns)
+
+    # Dedupe on the codes of sources_hash and of the lower case names.
+    names = federated['name'].cat
+    lower_names = pd.factorize(names.categories.str.lower())[0]
+    name_ids = np.where(names.codes >= 0, lower_names[names.codes], -1)
+    keys = pd.DataFrame({
+        'sources_hash': federated['sources_hash'].cat.codes.to_numpy(),
+        'name': name_ids,
+        'source': np.repeat(np.arange(len(dataframes)), [len(dataframe) for dataframe in dataframes]),
+    })
+    newest = keys.groupby(['sources_hash', 'name'])['source'].transform('max').to_numpy()
+    # Devices without a name are all kept, as well as duplicates within a file.
+    keep = (keys['source'].to_numpy() == newest) | (name_ids < 0)
+    return federated[keep].reset_index(drop=True)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_dataframe(versions: Tuple[FileVersion, ...]) -> Any:
+    _build_snapshots([version.path for version in versions])
+    if len(versions) == 1:
+        return _load_source(versions[0])
+    return _federate([_load_source(version) for version in versions])
+
+
+def load_dataframe(sources: Sources) -> Any:
+    """The devices of data files, with their manufacturing footprint and source.
+
+    The DataFrame is shared by all the reruns: do not modify it.
+    """
+    return _load_dataframe(_versions(sources))
+
+
+@functools.lru_cache(maxsize=8)
+def _load_tables(versions: Tuple[FileVersion, ...]) -> Dict[str, Any]:
+    dataframe = _load_dataframe(versions)
+    return {
+        name: dataframe[dataframe[list(required)].notnull().all(axis=1)]
+        for name, required in TABLES.items()}
+
+
+def load_tables(sources: Sources) -> Dict[str, Any]:
+    """The tables of the dashboard, by name: devices with a total footprint, and with its manufacturing ratio too.
+
+    The DataFrames are shared by all the reruns: do not modify them.
+    """
+    return _load_tables(_versions(sources))
+
+
+@functools.lru_cache(maxsize=8)
+def _load_cubes(versions: Tuple[FileVersion, ...]) -> Dict[str, cube.Cube]:
+    if len(versions) == 1:
+        return {name: cube.load(versions[0].path, required) for name, required in TABLES.items()}
+    dataframe = _load_dataframe(versions)
+    return {name: cube.from_dataframe(dataframe, required) for name, required in TABLES.items()}
+
+
+def load_cubes(sources: Sources) -> Dict[str, cube.Cube]:
+    """The aggregate cubes of the tables of the dashboard, by name."""
+    return _load_cubes(_versions(sources))
+
+
+class TableQuery(NamedTuple):
+    """Filters, search and sort of the table view."""
+    # Values to keep, by column.
+    filters: Tuple[Tuple[str, Tuple[str, ...]], ...] = ()
+    # Case-insensitive text to find in the search columns.
+    search: str = ''
+    sort_by: str = ''
+    ascending: bool = True
+
+
+@functools.lru_cache(maxsize=32)
+def _sort_order(versions: Tuple[FileVersion, ...], table: str, sort_by: str, ascending: bool) -> np.ndarray:
+    """The positions of the rows of a table in sorted order, missing values last."""
+    column = _load_tables(versions)[table][sort_by].reset_index(drop=True)
+    return np.asarray(column.sort_values(ascending=ascending, na_position='last', kind='stable').index)
+
+
+@functools.lru_cache(maxsize=32)
+def _selection(
+    versions: Tuple[FileVersion, ...], table: str, filters: Tuple[Tuple[str, Tuple[str, ...]], ...], search: str,
+) -> np.ndarray:
+    """A boolean array of the rows of a table matching filters and a search."""
+    dataframe = _load_tables(versions)[table]
+    selected = np.ones(len(dataframe), dtype=bool)
+    for column, values in filters:
+        selected &= np.asarray(dataframe[column].isin(values))
+    if search:
+        found = np.zeros(len(dataframe), dtype=bool)
+        for column in SEARCH_COLUMNS:
+            # Search the distinct values only, then select their rows.
+            categories = dataframe[column].cat.categories
+            matches = categories[categories.str.contains(search, case=False, regex=False)]
+            found |= np.asarray(dataframe[column].isin(matches))
+        selected &= found
+    return selected
+
+
+def query_table(
+    sources: Sources, table: str, query: TableQuery = TableQuery(), page: int = 0, page_size: int = 50,
+    columns: Optional[Sequence[str]] = None,
+) -> Tuple[Any, int]:
+    """A page of a table of the dashboard and the number of rows matching the query.
+
+    Pages are numbered from 0, and only the given columns are returned.
+    """
+    versions = _versions(sources)
+    dataframe = _load_tables(versions)[table]
+    selected = _selection(versions, table, query.filters, query.search.strip())
+    if query.sort_by:
+        order = _sort_order(versions, table, query.sort_by, query.ascending)
+        positions = order[selected[order]]
+    else:
+        positions = np.flatnonzero(selected)
+    rows = positions[page * page_size:(page + 1) * page_size]
+    return dataframe.iloc[rows][list(columns) if columns else dataframe.columns], len(positions)
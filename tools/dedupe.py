@@ -0,0 +1,228 @@
+"""Find near-duplicate devices in data files, for review.
+
+Names are normalized and cut into character trigrams, whose MinHash
+signatures are indexed by bands (locality-sensitive hashing) within each
+manufacturer. Only the devices sharing a band are compared, with the
+closeness rules of DeviceCarbonFootprint.merge, so that the whole dataset
+is processed without comparing all the pairs of devices:
+
+    python -m tools.dedupe boavizta-data-us.csv new_*.csv -o clusters.csv
+
+Instead of the approximate LSH bands, the candidate pairs can be all the
+names whose trigrams are similar enough, found with the index of
+name_index.py:
+
+    python -m tools.dedupe boavizta-data-us.csv new_*.csv --candidates trigram
+"""
+import argparse
+import collections
+import csv
+import itertools
+import sys
+import zlib
+from typing import Dict, FrozenSet, Iterable, List, Literal, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from tools import merge_csv
+from tools import name_index
+from tools.name_index import jaccard, model_tokens, normalize_name, shingles, variant_words
+from tools.parsers.lib import data
+
+# A Mersenne prime, small enough for the products of the hash functions to fit in 64 bits.
+_PRIME = (1 << 31) - 1
+
+
+class Entry(NamedTuple):
+    """A device of one of the files to dedupe."""
+    source: str
+    # The line of the device in the file, 2 for the first one after the headers.
+    row: int
+    device: data.DeviceCarbonFootprint
+
+
+class Cluster(NamedTuple):
+    """Devices which are likely the same, with the similarity of the pairs which linked them."""
+    entries: List[Entry]
+    pairs: List[Tuple[int, int, float]]
+
+
+class LshIndex:
+    """A MinHash LSH index of sets of shingles, by blocks (e.g. manufacturers)."""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1) -> None:
+        if num_perm % bands:
+            raise ValueError(f'The number of permutations ({num_perm}) must be a multiple of the bands ({bands})')
+        generator = np.random.default_rng(seed)
+        self._a = generator.integers(1, _PRIME, size=(num_perm, 1), dtype=np.int64)
+        self._b = generator.integers(0, _PRIME, size=(num_perm, 1), dtype=np.int64)
+        self._bands = bands
+        self._rows = num_perm // bands
+        self._buckets: Dict[Tuple[str, int, bytes], List[int]] = collections.defaultdict(list)
+
+    def signature(self, items: Iterable[str]) -> np.ndarray:
+        hashes = np.array([zlib.crc32(item.encode('utf-8')) & _PRIME for item in items], dtype=np.int64)
+        return np.asarray(((self._a * hashes + self._b) % _PRIME).min(axis=1))
+
+    def add(self, block: str, item_id: int, items: FrozenSet[str]) -> None:
+        if not items:
+            return
+        signature = self.signature(sorted(items))
+        for band in range(self._bands):
+            band_values = signature[band * self._rows:(band + 1) * self._rows]
+            self._buckets[(block, band, band_values.tobytes())].append(item_id)
+
+    def candidates(self) -> Set[Tuple[int, int]]:
+        """Pairs of items sharing at least one band."""
+        pairs: Set[Tuple[int, int]] = set()
+        for item_ids in self._buckets.values():
+            pairs.update(itertools.combinations(sorted(set(item_ids)), 2))
+        return pairs
+
+
+def _block(device: data.DeviceCarbonFootprint) -> str:
+    return str(device.get('manufacturer')).strip().lower()
+
+
+def _trigram_candidates(entries: Sequence[Entry], threshold: float, k: int = 20) -> Set[Tuple[int, int]]:
+    """Pairs of entries of the same manufacturer whose names have similar enough trigrams.
+
+    Each distinct name is searched once, for its k most similar names.
+    """
+    index = name_index.NameIndex()
+    names: Dict[Tuple[str, str], List[int]] = collections.defaultdict(list)
+    for entry_id, entry in enumerate(entries):
+        block, name = _block(entry.device), str(entry.device.get('name'))
+        index.add(block, name, entry_id)
+        names[(block, name)].append(entry_id)
+    pairs: Set[Tuple[int, int]] = set()
+    for (block, name), entry_ids in names.items():
+        for hit in index.search(block, name, k=k, threshold=threshold):
+            pairs.update(
+                (min(entry_id, row), max(entry_id, row))
+                for entry_id in entry_ids for row in hit.rows if row != entry_id)
+    return pairs
+
+
+def find_clusters(
+    entries: Sequence[Entry], threshold: float = 0.6, blocking_fields: Sequence[str] = ('gwp_total',),
+    num_perm: int = 64, bands: int = 16, candidates_from: Literal['lsh', 'trigram'] = 'lsh',
+) -> Tuple[List[Cluster], int]:
+    """Group the entries which are likely the same devices, return them and the number of compared pairs.
+
+    Two devices of the same manufacturer are linked if their names are close
+    enough, or similar enough with no distinct model numbers nor variants, and
+    merging them has no conflict on any of the blocking fields.
+    """
+    index = LshIndex(num_perm=num_perm, bands=bands)
+    entry_shingles = []
+    entry_tokens = []
+    entry_words = []
+    for entry_id, entry in enumerate(entries):
+        name = normalize_name(str(entry.device.get('name')))
+        entry_shingles.append(shingles(name))
+        entry_tokens.append(model_tokens(name))
+        entry_words.append(variant_words(name))
+        if candidates_from == 'lsh':
+            index.add(_block(entry.device), entry_id, entry_shingles[-1])
+
+    parents = list(range(len(entries)))
+
+    def find(entry_id: int) -> int:
+        while parents[entry_id] != entry_id:
+            parents[entry_id] = parents[parents[entry_id]]
+            entry_id = parents[entry_id]
+        return entry_id
+
+    candidates = index.candidates() if candidates_from == 'lsh' else _trigram_candidates(entries, threshold)
+    links: List[Tuple[int, int, float]] = []
+    for first, second in sorted(candidates):
+        device1, device2 = entries[first].device, entries[second].device
+        if data.are_close_enough(device1.get('name'), device2.get('name')):
+            similarity = 1.
+        else:
+            # Models often differ only by a number: the model tokens of a name
+            # must all be in the other one. Or by a word, e.g. "iPhone 13 mini".
+            tokens1, tokens2 = entry_tokens[first], entry_tokens[second]
+            if not name_index.tokens_match(tokens1, tokens2) or entry_words[first] != entry_words[second]:
+                continue
+            similarity = jaccard(entry_shingles[first], entry_shingles[second])
+            if similarity < threshold:
+                continue
+        unused_merged, unused_report, conflicts = data.DeviceCarbonFootprint.merge(device1, device2)
+        if any(field in conflicts for field in blocking_fields):
+            continue
+        links.append((first, second, similarity))
+        parents[find(first)] = find(second)
+
+    members: Dict[int, List[int]] = collections.defaultdict(list)
+    for entry_id in range(len(entries)):
+        members[find(entry_id)].append(entry_id)
+    clusters = []
+    for entry_ids in members.values():
+        if len(entry_ids) < 2:
+            continue
+        positions = {entry_id: position for position, entry_id in enumerate(entry_ids)}
+        clusters.append(Cluster(
+            [entries[entry_id] for entry_id in entry_ids],
+            [(positions[first], positions[second], similarity)
+             for first, second, similarity in links if first in positions]))
+    return clusters, len(candidates)
+
+
+def load_entries(filenames: Iterable[str]) -> List[Entry]:
+    """The devices of the files, with the line of each one in its file."""
+    entries: List[Entry] = []
+    for filename in filenames:
+        with open(filename, 'rt', encoding='utf-8', newline='') as csv_file:
+            reader = csv.reader(csv_file)
+            decode = data.RowDecoder(next(reader, []), merge_csv.CLEANERS)
+            entries.extend(Entry(filename, reader.line_num, decode(row)) for row in reader if row != decode.headers)
+    return entries
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Find near-duplicate devices in Boavizta csv files',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument('files', nargs='+', help='.csv files to dedupe, together')
+    argparser.add_argument('-t', '--threshold', default=0.6, type=float, help='Minimal similarity of the names (Jaccard index of their trigrams)')
+    argparser.add_argument('-f', '--field', action='append', dest='fields', help='Field which must not conflict between duplicates (default: gwp_total)')
+    argparser.add_argument('--num_perm', default=64, type=int, help='Number of MinHash permutations')
+    argparser.add_argument('--bands', default=16, type=int, help='Number of LSH bands (more bands find less similar names)')
+    argparser.add_argument('--candidates', default='lsh', choices=('lsh', 'trigram'), help='How to find the pairs of devices to compare: LSH bands or a trigram index')
+    argparser.add_argument('-o', '--output', help='Output .csv file listing the clusters')
+    args = argparser.parse_args(string_args)
+
+    entries = load_entries(args.files)
+    clusters, nb_compared = find_clusters(
+        entries, threshold=args.threshold, blocking_fields=args.fields or ('gwp_total',),
+        num_perm=args.num_perm, bands=args.bands, candidates_from=args.candidates)
+    blocks = collections.Counter(_block(entry.device) for entry in entries)
+    nb_pairs = sum(count * (count - 1) // 2 for count in blocks.values())
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as output:
+            writer = csv.writer(output, lineterminator='\n')
+            writer.writerow(['cluster', 'file', 'row', 'manufacturer', 'name', 'gwp_total'])
+            for cluster_id, cluster in enumerate(clusters, start=1):
+                for entry in cluster.entries:
+                    writer.writerow([
+                        cluster_id, entry.source, entry.row, entry.device.get('manufacturer'),
+                        entry.device.get('name'), entry.device.get('gwp_total')])
+    else:
+        for cluster_id, cluster in enumerate(clusters, start=1):
+            print(f'Cluster {cluster_id}:')
+            for entry in cluster.entries:
+                print(f'  {entry.source}:{entry.row}  {entry.device.get("manufacturer")}  {entry.device.get("name")}')
+            for first, second, similarity in cluster.pairs:
+                if similarity < 1:
+                    print(f'  ~ {cluster.entries[first].device.get("name")} / {cluster.entries[second].device.get("name")}: {similarity:.2f}')
+    print(
+        f'{len(entries)} devices, {nb_compared} pairs compared out of {nb_pairs}, '
+        f'{len(clusters)} clusters of {sum(len(cluster.entries) for cluster in clusters)} devices',
+        file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""Estimate the footprint of a fleet of devices from an inventory.
+
+The inventory is a CSV file with a line per model of the fleet: its
+manufacturer, model, count of devices and optionally their memory (in GB)
+and storage, e.g.
+
+    manufacturer,model,count,memory,storage
+    HP,EliteBook 840 G8,1200,16,512GB
+    Dell,Latitude 7420,800,,
+
+Each distinct model is resolved once against the devices of the data file
+with the same manufacturer, through the index of their names (see
+name_index.py): first by its normalized name, else by the trigrams of its
+name, the model numbers and variants of both names having to match. The
+memory and storage of the line choose between the devices matching its
+model, e.g. between the configurations of "iPhone 13 Pro": a line left with
+several of them is not matched rather than priced as one of them. The
+footprints of the lines, in kgCO2eq, are then computed on whole columns, by
+phase:
+
+    python -m tools.fleet inventory.csv --data boavizta-data-us.csv -o footprint.csv
+"""
+import argparse
+import csv
+import functools
+import re
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from tools import cube
+from tools import name_index
+from tools import snapshot
+
+# The footprint of each phase, from the ratio of gwp_total.
+PHASES = {
+    'gwp_manufacturing': 'gwp_manufacturing_ratio',
+    'gwp_use': 'gwp_use_ratio',
+    'gwp_transport': 'gwp_transport_ratio',
+    'gwp_eol': 'gwp_eol_ratio',
+}
+_OUTPUT_FIELDS = ('matched_manufacturer', 'matched_name', 'match', 'score', 'gwp_total') + tuple(PHASES)
+
+
+class Inventory(NamedTuple):
+    """The lines of an inventory, by column."""
+    manufacturer: List[str]
+    model: List[str]
+    counts: np.ndarray
+    # In GB, NaN when unknown.
+    memory: np.ndarray
+    storage: List[str]
+
+    def __len__(self) -> int:
+        return len(self.model)
+
+
+def read_inventory(filename: str) -> Inventory:
+    """Read an inventory CSV file, with a model (or name) column and optional count, memory and storage ones."""
+    with open(filename, 'rt', encoding='utf-8', newline='') as inventory_file:
+        lines = list(csv.DictReader(inventory_file))
+    model_column = 'model' if not lines or 'model' in lines[0] else 'name'
+    return Inventory(
+        manufacturer=[(line.get('manufacturer') or '').strip() for line in lines],
+        model=[(line.get(model_column) or '').strip() for line in lines],
+        counts=np.array([float(line.get('count') or 1) for line in lines], dtype=np.float64),
+        memory=np.array([
+            float(re.sub(r'\s*gb$', '', line['memory'].strip(), flags=re.IGNORECASE))
+            if (line.get('memory') or '').strip() else np.nan for line in lines], dtype=np.float64),
+        storage=[(line.get('storage') or '').strip() for line in lines],
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def _compact(text: str) -> str:
+    return name_index.normalize_name(text).replace(' ', '')
+
+
+class _Resolver:
+    """Choose a device among the matches of a model, with the configuration of the line."""
+
+    def __init__(self, dataset: snapshot.Snapshot, index: name_index.NameIndex, threshold: float) -> None:
+        self.index = index
+        self.threshold = threshold
+        self._has_total = ~np.isnan(dataset.values('gwp_total'))
+        self._names = dataset.values('name')
+        self._memory = dataset.values('memory')
+        self._storage = [
+            _compact(f'{hard_drive} {name}')
+            for hard_drive, name in zip(dataset.values('hard_drive').tolist(), dataset.values('name').tolist())]
+        years = np.array([int(cube.report_year(date) or 0) for date in dataset.categories('report_date').tolist()] + [0])
+        self._years = years[dataset.codes('report_date')]
+
+    def resolve(
+        self, manufacturer: str, model: str, memory: Optional[float], storage: str,
+    ) -> Tuple[int, name_index.Match]:
+        match = self.index.match(manufacturer, model, self.threshold)
+        rows = match.rows
+        preferences = [lambda row: bool(self._has_total[row])]
+        if memory is not None:
+            preferences.append(lambda row: bool(self._memory[row] == memory))
+        if storage:
+            compact_storage = _compact(storage)
+            preferences.append(lambda row: compact_storage in self._storage[row])
+        for preference in preferences:
+            preferred = [row for row in rows if preference(row)]
+            rows = preferred or rows
+        if not rows:
+            return -1, match
+        if len({_compact(self._names[row]) for row in rows}) > 1:
+            # Distinct configurations of the model, none of them is the line's.
+            return -1, match
+        # The most recent report.
+        return max(rows, key=lambda row: (self._years[row], row)), match
+
+
+class Footprint(NamedTuple):
+    """The devices matched by the lines of an inventory, and the footprints of the lines."""
+    rows: np.ndarray
+    matches: List[name_index.Match]
+    # Footprints of the lines by field (gwp_total and the phases), NaN when unknown.
+    footprints: Dict[str, np.ndarray]
+
+
+def footprint(
+    dataset: snapshot.Snapshot, inventory: Inventory, threshold: float = name_index.DEFAULT_THRESHOLD,
+    index: Optional[name_index.NameIndex] = None,
+) -> Footprint:
+    """Match the lines of an inventory with devices, and compute their footprints.
+
+    The index of the names of the dataset is built if not given.
+    """
+    if index is None:
+        index = name_index.from_columns(dataset.values('manufacturer').tolist(), dataset.values('name').tolist())
+    resolver = _Resolver(dataset, index, threshold)
+    resolved: Dict[Tuple[str, str, Optional[float], str], Tuple[int, name_index.Match]] = {}
+    rows = np.empty(len(inventory), dtype=np.int64)
+    matches = []
+    # None rather than NaN, which is not equal to itself.
+    memories = [None if np.isnan(memory) else memory for memory in inventory.memory.tolist()]
+    for line, key in enumerate(zip(inventory.manufacturer, inventory.model, memories, inventory.storage)):
+        if key not in resolved:
+            resolved[key] = resolver.resolve(*key)
+        rows[line], match = resolved[key]
+        matches.append(match)
+
+    matched = rows >= 0
+    safe_rows = np.where(matched, rows, 0)
+    gwp_total = np.where(matched, dataset.values('gwp_total')[safe_rows], np.nan) * inventory.counts
+    footprints = {'gwp_total': gwp_total}
+    for phase, ratio in PHASES.items():
+        footprints[phase] = gwp_total * dataset.values(ratio)[safe_rows]
+    return Footprint(rows, matches, footprints)
+
+
+def summarize(inventory: Inventory, result: Footprint) -> Dict[str, Dict[str, float]]:
+    """The lines, devices and footprints of the inventory, by kind of match, and the total footprints by field."""
+    kinds = np.array([match.kind if row >= 0 else '' for match, row in zip(result.matches, result.rows.tolist())])
+    summary: Dict[str, Dict[str, float]] = {}
+    for kind, label in (('exact', 'exact'), ('fuzzy', 'fuzzy'), ('', 'unmatched')):
+        lines = kinds == kind
+        summary[label] = {'lines': int(lines.sum()), 'devices': float(inventory.counts[lines].sum())}
+    summary['total'] = {
+        field: float(np.nansum(values)) for field, values in result.footprints.items()}
+    summary['known'] = {
+        field: float(inventory.counts[~np.isnan(values)].sum()) for field, values in result.footprints.items()}
+    return summary
+
+
+def write_lines(filename: str, inventory_file: str, dataset: snapshot.Snapshot, result: Footprint) -> None:
+    """Write the lines of the inventory with their matched devices and footprints."""
+    with open(inventory_file, 'rt', encoding='utf-8', newline='') as input_file:
+        reader = csv.reader(input_file)
+        headers: List[str] = next(reader, [])
+        lines: Iterable[List[str]] = list(reader)
+    manufacturers = dataset.values('manufacturer')
+    names = dataset.values('name')
+    footprints = {field: values.tolist() for field, values in result.footprints.items()}
+    with open(filename, 'wt', encoding='utf-8', newline='') as output:
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(headers + list(_OUTPUT_FIELDS))
+        for index, (line, match, row) in enumerate(zip(lines, result.matches, result.rows.tolist())):
+            matched = row >= 0
+            writer.writerow(line + [
+                manufacturers[row] if matched else '',
+                names[row] if matched else '',
+                match.kind if matched else '',
+                f'{match.score:.3f}' if matched else '',
+            ] + ['' if np.isnan(footprints[field][index]) else f'{footprints[field][index]:.1f}' for field in ('gwp_total',) + tuple(PHASES)])
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Estimate the footprint of an inventory of devices with Boavizta data',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument('inventory', help='.csv file with manufacturer, model, count, memory and storage columns')
+    argparser.add_argument('--data', default='boavizta-data-us.csv', help='.csv data file of the devices')
+    argparser.add_argument('-t', '--threshold', default=name_index.DEFAULT_THRESHOLD, type=float, help='Minimal similarity of the names (Jaccard index of their trigrams)')
+    argparser.add_argument('-o', '--output', help='Output .csv file with the matched devices and footprints of the lines')
+    args = argparser.parse_args(string_args)
+
+    start = time.perf_counter()
+    dataset = snapshot.load(args.data)
+    inventory = read_inventory(args.inventory)
+    result = footprint(dataset, inventory, args.threshold, name_index.load(args.data))
+    summary = summarize(inventory, result)
+    print(f'{len(inventory)} lines resolved in {time.perf_counter() - start:.2f} s')
+    for label in ('exact', 'fuzzy', 'unmatched'):
+        print(f'  {label:<10} {summary[label]["lines"]} lines, {summary[label]["devices"]:.0f} devices')
+    for field, total in summary['total'].items():
+        print(f'{field:<18} {total:>14.0f} kgCO2eq ({summary["known"][field]:.0f} devices)')
+
+    if args.output:
+        write_lines(args.output, args.inventory, dataset, result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""A fake GitHub API server, to test and time generate-gh-pr.py offline.
+
+It serves one repository whose main branch holds the given files, and
+implements the parts of the API used to create PRs: git refs, commits,
+trees and blobs, and pulls. Every request is counted by endpoint.
+
+    python tools/generate-gh-pr/fake_github.py --port 8765 boavizta-data-us.csv boavizta-data-fr.csv
+"""
+import argparse
+import base64
+import collections
+import hashlib
+import http.server
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def _sha(kind: str, content: bytes) -> str:
+    return hashlib.sha1(f'{kind} {len(content)}\0'.encode('utf-8') + content).hexdigest()
+
+
+class FakeGitHub:
+    """The state of a fake repository, served over HTTP."""
+
+    def __init__(self, files: Dict[str, bytes], repo: str = 'Boavizta/environmental-footprint-data') -> None:
+        self.repo = repo
+        self.blobs: Dict[str, bytes] = {}
+        self.trees: Dict[str, Dict[str, str]] = {}
+        self.commits: Dict[str, Dict[str, Any]] = {}
+        self.refs: Dict[str, str] = {}
+        self.pulls: List[Dict[str, Any]] = []
+        self.requests: Dict[str, int] = collections.Counter()
+        self._lock = threading.Lock()
+        tree_sha = self._add_tree({path: self._add_blob(content) for path, content in files.items()})
+        self.refs['refs/heads/main'] = self._add_commit('Initial commit', tree_sha, [])
+        self._server: Optional[http.server.ThreadingHTTPServer] = None
+        self.url = ''
+
+    def _add_blob(self, content: bytes) -> str:
+        sha = _sha('blob', content)
+        self.blobs[sha] = content
+        return sha
+
+    def _add_tree(self, entries: Dict[str, str]) -> str:
+        sha = _sha('tree', json.dumps(entries, sort_keys=True).encode('utf-8'))
+        self.trees[sha] = dict(entries)
+        return sha
+
+    def _add_commit(self, message: str, tree_sha: str, parents: List[str]) -> str:
+        commit = {'message': message, 'tree': tree_sha, 'parents': parents}
+        sha = _sha('commit', json.dumps(commit, sort_keys=True).encode('utf-8'))
+        self.commits[sha] = commit
+        return sha
+
+    def file_content(self, ref: str, path: str) -> bytes:
+        """The content of a file in a branch, e.g. to check a PR."""
+        tree = self.trees[self.commits[self.refs[f'refs/heads/{ref}']]['tree']]
+        return self.blobs[tree[path]]
+
+    # JSON representations of the objects, as in the GitHub API.
+
+    def _repo_url(self) -> str:
+        return f'{self.url}/repos/{self.repo}'
+
+    def _ref_json(self, ref: str) -> Dict[str, Any]:
+        sha = self.refs[ref]
+        return {
+            'ref': ref, 'url': f'{self._repo_url()}/git/{ref}',
+            'object': {'sha': sha, 'type': 'commit', 'url': f'{self._repo_url()}/git/commits/{sha}'}}
+
+    def _commit_json(self, sha: str) -> Dict[str, Any]:
+        commit = self.commits[sha]
+        return {
+            'sha': sha, 'url': f'{self._repo_url()}/git/commits/{sha}', 'message': commit['message'],
+            'tree': {'sha': commit['tree'], 'url': f'{self._repo_url()}/git/trees/{commit["tree"]}'},
+            'parents': [
+                {'sha': parent, 'url': f'{self._repo_url()}/git/commits/{parent}'}
+                for parent in commit['parents']]}
+
+    def _tree_json(self, sha: str) -> Dict[str, Any]:
+        return {
+            'sha': sha, 'url': f'{self._repo_url()}/git/trees/{sha}', 'truncated': False,
+            'tree': [
+                {'path': path, 'mode': '100644', 'type': 'blob', 'sha': blob_sha,
+                 'size': len(self.blobs[blob_sha]), 'url': f'{self._repo_url()}/git/blobs/{blob_sha}'}
+                for path, blob_sha in sorted(self.trees[sha].items())]}
+
+    # Endpoints.
+
+    def _get_repo(self, unused_body: Any) -> Tuple[int, Any]:
+        owner, name = self.repo.split('/')
+        return 200, {
+            'full_name': self.repo, 'name': name, 'owner': {'login': owner}, 'url': self._repo_url(),
+            'default_branch': 'main'}
+
+    def _get_ref(self, unused_body: Any, ref: str) -> Tuple[int, Any]:
+        if f'refs/{ref}' not in self.refs:
+            return 404, {'message': 'Not Found'}
+        return 200, self._ref_json(f'refs/{ref}')
+
+    def _create_ref(self, body: Dict[str, Any]) -> Tuple[int, Any]:
+        if body['ref'] in self.refs:
+            return 422, {'message': 'Reference already exists'}
+        if body['sha'] not in self.commits:
+            return 422, {'message': 'Object does not exist'}
+        self.refs[body['ref']] = body['sha']
+        return 201, self._ref_json(body['ref'])
+
+    def _get_commit(self, unused_body: Any, sha: str) -> Tuple[int, Any]:
+        if sha not in self.commits:
+            return 404, {'message': 'Not Found'}
+        return 200, self._commit_json(sha)
+
+    def _create_commit(self, body: Dict[str, Any]) -> Tuple[int, Any]:
+        if body['tree'] not in self.trees or any(parent not in self.commits for parent in body['parents']):
+            return 422, {'message': 'Object does not exist'}
+        return 201, self._commit_json(self._add_commit(body['message'], body['tree'], body['parents']))
+
+    def _get_tree(self, unused_body: Any, sha: str) -> Tuple[int, Any]:
+        if sha not in self.trees:
+            return 404, {'message': 'Not Found'}
+        return 200, self._tree_json(sha)
+
+    def _create_tree(self, body: Dict[str, Any]) -> Tuple[int, Any]:
+        entries = dict(self.trees[body['base_tree']]) if body.get('base_tree') else {}
+        for element in body['tree']:
+            if element['sha'] not in self.blobs:
+                return 422, {'message': 'Object does not exist'}
+            entries[element['path']] = element['sha']
+        return 201, self._tree_json(self._add_tree(entries))
+
+    def _get_blob(self, unused_body: Any, sha: str) -> Tuple[int, Any]:
+        if sha not in self.blobs:
+            return 404, {'message': 'Not Found'}
+        content = self.blobs[sha]
+        return 200, {
+            'sha': sha, 'url': f'{self._repo_url()}/git/blobs/{sha}', 'size': len(content),
+            'encoding': 'base64', 'content': base64.b64encode(content).decode('ascii')}
+
+    def _create_blob(self, body: Dict[str, Any]) -> Tuple[int, Any]:
+        content = body['content']
+        raw = base64.b64decode(content) if body.get('encoding') == 'base64' else content.encode('utf-8')
+        sha = self._add_blob(raw)
+        return 201, {'sha': sha, 'url': f'{self._repo_url()}/git/blobs/{sha}'}
+
+    def _create_pull(self, body: Dict[str, Any]) -> Tuple[int, Any]:
+        if f'refs/heads/{body["head"]}' not in self.refs:
+            return 422, {'message': 'Validation Failed'}
+        number = len(self.pulls) + 1
+        pull = dict(body, number=number, state='open', url=f'{self._repo_url()}/pulls/{number}',
+                    html_url=f'{self.url}/{self.repo}/pull/{number}')
+        self.pulls.append(pull)
+        return 201, pull
+
+    def _routes(self) -> List[Tuple[str, 're.Pattern[str]', Callable[..., Tuple[int, Any]]]]:
+        repo = re.escape(f'/repos/{self.repo}')
+        return [
+            ('GET', re.compile(f'{repo}'), self._get_repo),
+            ('GET', re.compile(f'{repo}/git/refs?/(.+)'), self._get_ref),
+            ('POST', re.compile(f'{repo}/git/refs'), self._create_ref),
+            ('GET', re.compile(f'{repo}/git/commits/([0-9a-f]+)'), self._get_commit),
+            ('POST', re.compile(f'{repo}/git/commits'), self._create_commit),
+            ('GET', re.compile(f'{repo}/git/trees/([0-9a-f]+)'), self._get_tree),
+            ('POST', re.compile(f'{repo}/git/trees'), self._create_tree),
+            ('GET', re.compile(f'{repo}/git/blobs/([0-9a-f]+)'), self._get_blob),
+            ('POST', re.compile(f'{repo}/git/blobs'), self._create_blob),
+            ('POST', re.compile(f'{repo}/pulls'), self._create_pull),
+        ]
+
+    def handle(self, method: str, path: str, body: Any) -> Tuple[int, Any]:
+        path = path.split('?')[0]
+        # Clients may prefix the API with a path, as for GitHub Enterprise.
+        path = path[path.find('/repos/'):] if '/repos/' in path else path
+        for route_method, pattern, endpoint in self._routes():
+            match = pattern.fullmatch(path)
+            if route_method == method and match:
+                with self._lock:
+                    self.requests[endpoint.__name__.lstrip('_')] += 1
+                    return endpoint(body, *match.groups())
+        return 404, {'message': 'Not Found'}
+
+    def start(self, port: int = 0) -> str:
+        """Serve the API in a background thread, return its URL."""
+        fake = self
+
+        class _Handler(http.server.BaseHTTPRequestHandler):
+
+            def _respond(self) -> None:
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                status, response = fake.handle(self.command, self.path, body)
+                content = json.dumps(response).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = do_PATCH = _respond
+
+            def log_message(self, *unused_args: Any) -> None:
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Serve a fake GitHub API for generate-gh-pr.py',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument('files', nargs='+', help='Files of the main branch of the repository')
+    argparser.add_argument('--port', default=8765, type=int, help='Port to listen to')
+    argparser.add_argument('--github_repo', default='Boavizta/environmental-footprint-data', help='Name of the repository')
+    args = argparser.parse_args(string_args)
+
+    files = {}
+    for filename in args.files:
+        with open(filename, 'rb') as file:
+            files[os.path.basename(filename)] = file.read()
+    fake = FakeGitHub(files, args.github_repo)
+    print(f'Serving a fake GitHub API on {fake.start(args.port)}, Ctrl-C to stop')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
+    for endpoint, count in sorted(fake.requests.items()):
+        print(f'{count:>6} {endpoint}')
+    print(f'{len(fake.pulls)} pull requests')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,132 @@
-"""Create a GitHub PR for each line of new carbon footprint data."""
+"""Create GitHub PRs for new carbon footprint data.
+
+By default there is one PR per new device. With --batch, the devices are
+grouped by manufacturer or all together in one PR. The data files of the base
+branch are fetched once, the new rows are inserted at their place (sorted by
+manufacturer and name) in one pass, and
+each PR gets one commit per data file (US and FR) through the git data API.
+
+To try it offline, start a fake GitHub server (see fake_github.py) and run:
+
+    python tools/generate-gh-pr/generate-gh-pr.py --access_token fake \\
+        --github_url http://localhost:8765 --seconds_between_requests 0 --seconds_between_writes 0 \\
+        --batch manufacturer new_hp.csv
+"""
 import argparse
-import csv
+import base64
+import collections
+import io
+import re
 import textwrap
-import typing
-from typing import Iterator, List, Optional
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import github
-from github.ContentFile import ContentFile
+from github.GitCommit import GitCommit
+from github.GitTree import GitTree
+from github.InputGitTreeElement import InputGitTreeElement
+from github.Repository import Repository
 
+from tools import convert_csv
 from tools.parsers.lib import data
 
+US_FILE = 'boavizta-data-us.csv'
+FR_FILE = 'boavizta-data-fr.csv'
+
 
 def _iterate_on_data(csv_filename: str) -> Iterator[data.DeviceCarbonFootprint]:
-    with open(csv_filename, 'rt', encoding='utf-8') as new_data_file:
-        reader = csv.DictReader(new_data_file)
-        for new_row in reader:
-            yield data.DeviceCarbonFootprint.from_text(new_row)
+    yield from data.DeviceCarbonFootprint.from_csv(csv_filename)
+
+
+def group_devices(
+    devices: Iterable[data.DeviceCarbonFootprint], batch: str,
+) -> List[Tuple[str, List[data.DeviceCarbonFootprint]]]:
+    """Group the devices by PR, with the title of each PR."""
+    if batch == 'run':
+        all_devices = list(devices)
+        return [(f'Add {len(all_devices)} new devices', all_devices)] if all_devices else []
+    if batch == 'manufacturer':
+        by_manufacturer: Dict[str, List[data.DeviceCarbonFootprint]] = collections.defaultdict(list)
+        for device in devices:
+            by_manufacturer[str(device.get('manufacturer'))].append(device)
+        return [
+            (f'Add {len(group)} new {manufacturer} devices', group)
+            for manufacturer, group in by_manufacturer.items()]
+    return [(f'Add new {device.get("name")} {device.get("category")}'.strip(), [device]) for device in devices]
+
+
+def branch_name(title: str) -> str:
+    return re.sub(r'[^A-Za-z0-9._-]+', '-', title).strip('-.')
+
+
+class BaseBranch:
+    """The data files of the base branch, fetched once for all the PRs."""
+
+    def __init__(self, repo: Repository, branch: str = 'main') -> None:
+        self.name = branch
+        self.commit: GitCommit = repo.get_git_commit(repo.get_git_ref(f'heads/{branch}').object.sha)
+        self.tree: GitTree = repo.get_git_tree(self.commit.tree.sha)
+        blob_shas = {element.path: element.sha for element in self.tree.tree}
+        self.headers, *self.rows = convert_csv.reader(io.StringIO(_decode_blob(repo, blob_shas[US_FILE])), 'us')
+        self._sort_key = data.row_sort_key(self.headers)
+
+    def us_content(self, devices: Iterable[data.DeviceCarbonFootprint]) -> str:
+        """The US file with new devices inserted at their place.
+
+        The existing rows are sorted, and if some are not, they stay in place
+        anyway so that the diff of the PR only adds the new rows.
+        """
+        if self.headers != list(data.DeviceCarbonFootprintData.__annotations__):
+            raise ValueError(f'{US_FILE} does not have the expected headers: {self.headers}')
+        new_rows = [data.CsvWriter.format(device)[0] for device in devices]
+        output = io.StringIO()
+        writer = convert_csv.writer(output, 'us')
+        writer.writerow(self.headers)
+        writer.writerows(data.merge_sorted(self.rows, new_rows, self._sort_key))
+        return output.getvalue()
+
+
+def _decode_blob(repo: Repository, sha: str) -> str:
+    return base64.b64decode(repo.get_git_blob(sha).content).decode('utf-8')
+
+
+def _to_fr(us_content: str) -> str:
+    output = io.StringIO()
+    convert_csv.convert(io.StringIO(us_content), {'fr': output})
+    return output.getvalue()
+
+
+def _commit_file(
+    repo: Repository, parent: GitCommit, base_tree: GitTree, path: str, content: str, message: str,
+) -> Tuple[GitCommit, GitTree]:
+    blob = repo.create_git_blob(content, 'utf-8')
+    tree = repo.create_git_tree([InputGitTreeElement(path, '100644', 'blob', sha=blob.sha)], base_tree)
+    return repo.create_git_commit(message, tree, [parent]), tree
+
+
+def submit(
+    repo: Repository, base: BaseBranch, title: str, devices: List[data.DeviceCarbonFootprint],
+) -> Optional[str]:
+    """Create a PR adding devices to the data files, return its URL or None if its branch exists."""
+    newbranch = branch_name(title)
+    try:
+        repo.get_git_ref(f'heads/{newbranch}')
+        return None
+    except github.UnknownObjectException:
+        pass
+    us_content = base.us_content(devices)
+    commit, tree = _commit_file(repo, base.commit, base.tree, US_FILE, us_content, f'{title} - us format')
+    commit, tree = _commit_file(repo, commit, tree, FR_FILE, _to_fr(us_content), f'{title} - fr format')
+    repo.create_git_ref(f'refs/heads/{newbranch}', commit.sha)
+    sources = sorted({str(device.get('sources')) for device in devices if device.get('sources')})
+    body = textwrap.dedent('''\
+        SUMMARY
+        {title}
+
+        PDF_SOURCE_LINK
+        {sources}
+    ''').format(title=title, sources='\n'.join(sources))
+    return str(repo.create_pull(title=title, body=body, head=newbranch, base=base.name).html_url)
 
 
 def main(string_args: Optional[List[str]] = None) -> None:
@@ -26,42 +137,34 @@ def main(string_args: Optional[List[str]] = None) -> None:
     argparser.add_argument('--access_token', help='GitHub access token', required=True)
     argparser.add_argument(
         '--github_repo', help='GitHub repository org and name', default='Boavizta/environmental-footprint-data')
+    argparser.add_argument('--github_url', help='URL of the GitHub API', default='https://api.github.com')
+    argparser.add_argument(
+        '--batch', default='device', choices=('device', 'manufacturer', 'run'),
+        help='Create one PR per device, per manufacturer or for all the new data')
+    argparser.add_argument(
+        '--seconds_between_requests', default=0.25, type=float, help='Minimal delay between two API requests')
+    argparser.add_argument(
+        '--seconds_between_writes', default=1., type=float, help='Minimal delay between two API writes')
     argparser.add_argument(
         'new_data_csv', help='Path to a CSV with new data to submit')
     args = argparser.parse_args(string_args)
 
-    github_client = github.Github(args.access_token)
+    start = time.monotonic()
+    github_client = github.Github(
+        args.access_token, base_url=args.github_url,
+        seconds_between_requests=args.seconds_between_requests,
+        seconds_between_writes=args.seconds_between_writes)
     repo = github_client.get_repo(args.github_repo)
+    base = BaseBranch(repo)
 
-    for device in _iterate_on_data(args.new_data_csv):
-        change_name = f'Add new {device.get("Name")} {device.get("Category")}'
-        newbranch = change_name.replace(' ', '-')
-        try:
-            repo.get_git_ref(f'heads/{newbranch}')
-            continue
-        except github.UnknownObjectException:
-            pass
-        repo.create_git_ref(f'refs/heads/{newbranch}', repo.get_branch('main').commit.sha)
-        contents = typing.cast(ContentFile, repo.get_contents('boavizta-data-us.csv', ref='main'))
-        newcontent = contents.decoded_content.decode() + "\n" + device.as_csv_row(csv_format='us')
-
-        repo.update_file(
-            contents.path, f'{change_name} - us format',
-            contents.decoded_content.decode().splitlines()[0] + '\n'.join(sorted((contents.decoded_content.decode() + "\n" + device.as_csv_row(csv_format='us')).splitlines()[1:])),
-            contents.sha, branch=newbranch)
-        contents = typing.cast(ContentFile, repo.get_contents('boavizta-data-fr.csv', ref='main'))
-        repo.update_file(
-            contents.path, f'{change_name} - fr format',
-            contents.decoded_content.decode().splitlines()[0] + '\n'.join(sorted((contents.decoded_content.decode() + "\n" + device.as_csv_row(csv_format='fr')).splitlines()[1:])),
-            contents.sha, branch=newbranch)
-        body = textwrap.dedent(f'''\
-            SUMMARY
-            {change_name}
-
-            PDF_SOURCE_LINK
-            {device.get('Sources')}
-        ''')
-        repo.create_pull(title=change_name, body=body, head=newbranch, base='main')
+    nb_pulls = nb_devices = 0
+    for title, devices in group_devices(_iterate_on_data(args.new_data_csv), args.batch):
+        url = submit(repo, base, title, devices)
+        if url:
+            print(f'{url}: {title}')
+            nb_pulls += 1
+            nb_devices += len(devices)
+    print(f'{nb_pulls} PRs created for {nb_devices} devices in {time.monotonic() - start:.1f}s')
 
 
 if __name__ == '__main__':
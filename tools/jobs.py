@@ -0,0 +1,243 @@
+"""A persistent queue of documents to crawl and parse.
+
+Each document URL is recorded with its state (discovered, downloaded, parsed
+or failed) and, once parsed, the devices found in it. Nothing is lost when a
+crawl is interrupted: a restart resumes with the documents which are not
+parsed yet and only retries the failed ones. Several processes can drain the
+same queue concurrently, each job being leased to one of them at a time.
+
+    python -m tools.jobs jobs.sqlite add urls.txt
+    python -m tools.pipeline --queue jobs.sqlite  # in as many processes as needed
+    python -m tools.jobs jobs.sqlite status
+    python -m tools.jobs jobs.sqlite export -o new.csv
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from tools.parsers.lib import data
+
+DISCOVERED = 'discovered'
+DOWNLOADED = 'downloaded'
+PARSED = 'parsed'
+FAILED = 'failed'
+STATES = (DISCOVERED, DOWNLOADED, PARSED, FAILED)
+# Default duration of the lease of a job to a worker.
+LEASE_SECONDS = 600.
+
+
+class Job(NamedTuple):
+    """A document to process."""
+    url: str
+    parser: Optional[str]
+    state: str
+    attempts: int
+
+
+def default_worker_name() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class JobQueue:
+    """A queue of jobs stored in a SQLite file."""
+
+    def __init__(self, path: str, timeout: float = 30) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Autocommit mode: transactions are explicit where needed.
+        self._db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        # Let readers work while another process writes.
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS jobs (
+            url TEXT PRIMARY KEY,
+            parser TEXT,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            sources_hash TEXT,
+            output TEXT,
+            error TEXT,
+            worker TEXT,
+            lease_until REAL NOT NULL DEFAULT 0,
+            updated REAL NOT NULL)''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_until)')
+
+    def close(self) -> None:
+        self._db.close()
+
+    def add(self, url: str, parser: Optional[str] = None) -> bool:
+        """Add a discovered document, return whether it was new."""
+        cursor = self._db.execute(
+            'INSERT OR IGNORE INTO jobs (url, parser, state, updated) VALUES (?, ?, ?, ?)',
+            (url, parser, DISCOVERED, time.time()))
+        return cursor.rowcount > 0
+
+    def add_many(self, jobs: Iterable[Job]) -> int:
+        """Add discovered documents in one transaction, return the number of new ones."""
+        now = time.time()
+        with self._transaction():
+            cursor = self._db.executemany(
+                'INSERT OR IGNORE INTO jobs (url, parser, state, updated) VALUES (?, ?, ?, ?)',
+                ((job.url, job.parser, DISCOVERED, now) for job in jobs))
+        return cursor.rowcount
+
+    def _transaction(self) -> '_Transaction':
+        return _Transaction(self._db)
+
+    def claim(
+        self, worker: str, limit: int = 1, lease_seconds: float = LEASE_SECONDS, max_attempts: int = 3,
+    ) -> List[Job]:
+        """Lease some jobs to a worker.
+
+        These are jobs not parsed yet, whose lease (if any) has expired, and failed
+        jobs which have not been attempted max_attempts times yet.
+        """
+        now = time.time()
+        with self._transaction():
+            rows = self._db.execute(
+                '''SELECT url, parser, state, attempts FROM jobs
+                WHERE lease_until < ? AND (
+                    state IN (?, ?) OR (state = ? AND attempts < ?))
+                ORDER BY attempts, updated LIMIT ?''',
+                (now, DISCOVERED, DOWNLOADED, FAILED, max_attempts, limit)).fetchall()
+            self._db.executemany(
+                'UPDATE jobs SET worker = ?, lease_until = ?, attempts = attempts + 1 WHERE url = ?',
+                ((worker, now + lease_seconds, row[0]) for row in rows))
+        return [Job(url, parser, state, attempts + 1) for url, parser, state, attempts in rows]
+
+    def iter_claims(
+        self, worker: str, batch_size: int = 8, lease_seconds: float = LEASE_SECONDS, max_attempts: int = 3,
+    ) -> Iterator[Job]:
+        """Claim jobs by batches until the queue is drained.
+
+        The jobs may wait before being processed: renew their leases meanwhile.
+        """
+        while True:
+            jobs = self.claim(worker, batch_size, lease_seconds, max_attempts)
+            if not jobs:
+                return
+            yield from jobs
+
+    def renew(self, url: str, worker: str, lease_seconds: float = LEASE_SECONDS) -> bool:
+        """Extend the lease of a job held by a worker, return False if another worker took it over."""
+        cursor = self._db.execute(
+            'UPDATE jobs SET lease_until = ? WHERE url = ? AND worker = ? AND lease_until > 0',
+            (time.time() + lease_seconds, url, worker))
+        if cursor.rowcount:
+            return True
+        # Released (e.g. parsed) jobs have no lease to renew.
+        row = self._db.execute('SELECT worker FROM jobs WHERE url = ?', (url,)).fetchone()
+        return row is None or row[0] in (None, worker)
+
+    def _set_state(self, url: str, state: str, **fields: Optional[str]) -> None:
+        assignments = ''.join(f', {field} = ?' for field in fields)
+        self._db.execute(
+            f'UPDATE jobs SET state = ?, updated = ?{assignments} WHERE url = ?',
+            (state, time.time(), *fields.values(), url))
+
+    def mark_downloaded(self, url: str, sources_hash: str) -> None:
+        self._set_state(url, DOWNLOADED, sources_hash=sources_hash)
+
+    def mark_parsed(
+        self, url: str, devices: List[data.DeviceCarbonFootprintData], parser: Optional[str] = None,
+    ) -> None:
+        """Record the devices parsed in a document, and release it."""
+        self._db.execute(
+            '''UPDATE jobs SET state = ?, output = ?, parser = COALESCE(?, parser), error = NULL,
+            lease_until = 0, updated = ? WHERE url = ?''',
+            (PARSED, json.dumps(devices), parser, time.time(), url))
+
+    def mark_failed(self, url: str, error: str) -> None:
+        """Record a failure, the job will be retried by the next claims."""
+        self._db.execute(
+            'UPDATE jobs SET state = ?, error = ?, lease_until = 0, updated = ? WHERE url = ?',
+            (FAILED, error, time.time(), url))
+
+    def get(self, url: str) -> Optional[Job]:
+        row = self._db.execute(
+            'SELECT url, parser, state, attempts FROM jobs WHERE url = ?', (url,)).fetchone()
+        return Job(*row) if row else None
+
+    def retry_failed(self) -> int:
+        """Give all the failed jobs a new set of attempts."""
+        cursor = self._db.execute(
+            'UPDATE jobs SET attempts = 0, lease_until = 0 WHERE state = ?', (FAILED,))
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(self._db.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state'))
+        return counts
+
+    def failures(self) -> Iterator[Job]:
+        for row in self._db.execute(
+                'SELECT url, parser, state, attempts FROM jobs WHERE state = ? ORDER BY url', (FAILED,)):
+            yield Job(*row)
+
+    def parsed_devices(self) -> Iterator[data.DeviceCarbonFootprint]:
+        """All the devices parsed so far, in the order their documents were parsed."""
+        for (output,) in self._db.execute(
+                'SELECT output FROM jobs WHERE state = ? ORDER BY updated', (PARSED,)):
+            for device_data in json.loads(output):
+                yield data.DeviceCarbonFootprint(device_data)
+
+
+class _Transaction:
+    """Hold SQLite's write lock for a block, so that concurrent workers do not claim the same jobs."""
+
+    def __init__(self, db: sqlite3.Connection) -> None:
+        self._db = db
+
+    def __enter__(self) -> None:
+        self._db.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type: object, *unused_args: object) -> None:
+        self._db.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Manage a queue of documents to crawl and parse',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument('queue', help='SQLite file of the queue')
+    commands = argparser.add_subparsers(dest='command', required=True)
+    add_command = commands.add_parser('add', help='Add documents, one "URL [parser]" per line')
+    add_command.add_argument('documents', nargs='?', default='-', help='File listing the documents, "-" for stdin')
+    commands.add_parser('status', help='Count the jobs in each state and list the failures')
+    commands.add_parser('retry', help='Retry all the failed jobs')
+    export_command = commands.add_parser('export', help='Export the parsed devices as CSV')
+    export_command.add_argument('-o', '--output', help='Output .csv file')
+    args = argparser.parse_args(string_args)
+
+    queue = JobQueue(args.queue)
+    if args.command == 'add':
+        documents = sys.stdin if args.documents == '-' else open(args.documents, 'rt', encoding='utf-8')
+        with documents:
+            jobs = (
+                Job(url, parser[0] if parser else None, DISCOVERED, 0)
+                for url, *parser in (line.split() for line in documents if line.strip())
+                if not url.startswith('#'))
+            print(f'{queue.add_many(jobs)} new jobs')
+    elif args.command == 'status':
+        for state, count in queue.counts().items():
+            print(f'{state:<12} {count:>6}')
+        for job in queue.failures():
+            print(f'failed ({job.attempts} attempts): {job.url}')
+    elif args.command == 'retry':
+        print(f'{queue.retry_failed()} jobs to retry')
+    elif args.command == 'export':
+        if args.output and args.output != '-':
+            with open(args.output, 'w', encoding='utf-8') as output, data.CsvWriter(output) as writer:
+                writer.write_all(queue.parsed_devices())
+        else:
+            with data.CsvWriter(sys.stdout) as writer:
+                writer.write_all(queue.parsed_devices())
+    queue.close()
+
+
+if __name__ == '__main__':
+    main()
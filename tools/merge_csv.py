@@ -1,33 +1,49 @@
-"""Merge two csv file while reporting and dealing with conflicts."""
-import csv
+"""Merge two csv file while reporting and dealing with conflicts.
+
+With a manifest, the merge is incremental: the manifest records the key and
+content hash of each input row, and the merged row of each key. The next
+runs only decode and merge again the keys whose input rows changed, and
+update the aggregate cubes of the output (see cube.py) with the rows which
+changed. The output is still written whole, from the merged rows kept in the
+manifest, and the summary report covers all its rows, with the stats of each
+key recorded when it was last merged:
+
+    python -m tools.merge_csv boavizta-data-us.csv new_lenovo.csv -m merge.manifest.json -o merged.csv
+"""
 import argparse
+import collections
+import csv
+import hashlib
+import json
+import os
 import sys
 import re
-from typing import List, Optional, Dict, Set
+from typing import Any, Callable, Iterable, List, Literal, Optional, Dict, Sequence, Set, Tuple
+from tools import cube
 from tools.parsers.lib import data
 
-# FIXME: this could be done in DeviceCarbonFootprint.from_text?
-def clean_device(data: Dict[str, str]) -> Dict[str, str]:
-    result = data
+_LOCATIONS = {
+    'China': 'CN',
+    'Worldwide': 'WW',
+    'Germany': 'DE'
+}
 
-    if 'memory' in result:
-        result['memory'] = re.sub(r'(?i)GB', '', result['memory'])
-    
-    locs = {
-        'China': 'CN',
-        'Worldwide': 'WW',
-        'Germany': 'DE'
-    }
-    for l in ['use_location','assembly_location']:
-        if l in result and result[l] in locs.keys():
-            result[l] = locs[result[l]]
+# Cleanups of some columns, applied to their text before they are decoded.
+CLEANERS: Dict[str, Callable[[str], str]] = {
+    'memory': lambda memory: re.sub(r'(?i)GB', '', memory),
+    'use_location': lambda location: _LOCATIONS.get(location, location),
+    'assembly_location': lambda location: _LOCATIONS.get(location, location),
+}
 
+def clean_device(data: Dict[str, str]) -> Dict[str, str]:
+    result = data
+    for key, clean in CLEANERS.items():
+        if result.get(key):
+            result[key] = clean(result[key])
     return result
 
-def load_csv(filename: str):
-    with open(filename, 'rt', encoding='utf-8') as file:
-        csvreader = csv.DictReader(file)
-        return [data.DeviceCarbonFootprint.from_text(clean_device(row)) for row in csvreader]
+def load_csv(filename: str) -> List[data.DeviceCarbonFootprint]:
+    return data.DeviceCarbonFootprint.from_csv(filename, cleaners=CLEANERS)
 
 def get_key(device: dict, key_name: str) -> str:
     assert key_name in device
@@ -37,6 +53,131 @@ def get_key(device: dict, key_name: str) -> str:
         return pdf_file[0]
     return device.get(key_name, "").lower()
 
+_MANIFEST_VERSION = 2
+
+
+def _row_key(headers: Sequence[str], row: Sequence[str], key_name: str) -> str:
+    """The key of a CSV row, as get_key gives for the decoded device."""
+    return get_key({header: value for header, value in zip(headers, row) if value}, key_name)
+
+
+def index_csv(filename: str, key_name: str) -> Dict[str, Any]:
+    """The key and the content hash of each row of a CSV file, without decoding them."""
+    keys: List[str] = []
+    hashes: List[str] = []
+    with open(filename, 'rt', encoding='utf-8', newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        headers: List[str] = next(reader, [])
+        header_hash = hashlib.md5('\x1f'.join(headers).encode('utf-8'))
+        for row in reader:
+            if row == headers:
+                continue
+            row_hash = header_hash.copy()
+            row_hash.update('\x1e'.join(row).encode('utf-8'))
+            keys.append(_row_key(headers, row, key_name))
+            hashes.append(row_hash.hexdigest())
+    return {'md5': data.md5_file(filename), 'keys': keys, 'hashes': hashes}
+
+
+def _signatures(files: Sequence[str], indexes: Dict[str, Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """For each key, the hashes of its rows in each file."""
+    signatures: Dict[str, List[Any]] = {}
+    for filename in files:
+        for key, row_hash in zip(indexes[filename]['keys'], indexes[filename]['hashes']):
+            signature = signatures.setdefault(key, [])
+            if not signature or signature[-1][0] != filename:
+                signature.append([filename, []])
+            signature[-1][1].append(row_hash)
+    return signatures
+
+
+def _load_rows(filename: str, rows: Set[int]) -> List[data.DeviceCarbonFootprint]:
+    """Decode some rows of a CSV file, given by their index."""
+    with open(filename, 'rt', encoding='utf-8', newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        decode = data.RowDecoder(next(reader, []), CLEANERS)
+        data_rows = (row for row in reader if row != decode.headers)
+        return [decode(row) for index, row in enumerate(data_rows) if index in rows]
+
+
+def load_manifest(filename: str, key_name: str) -> Dict[str, Any]:
+    """Load a merge manifest, or an empty one if it is missing or was built with another key."""
+    empty: Dict[str, Any] = {
+        'version': _MANIFEST_VERSION, 'key': key_name, 'files': {}, 'signatures': {}, 'rows': {}, 'stats': {}}
+    try:
+        with open(filename, 'rt', encoding='utf-8') as manifest_file:
+            manifest: Dict[str, Any] = json.load(manifest_file)
+    except (OSError, ValueError):
+        return empty
+    if manifest.get('version') != _MANIFEST_VERSION or manifest.get('key') != key_name:
+        return empty
+    return manifest
+
+
+def plan_incremental_merge(
+    files: Sequence[str], manifest: Dict[str, Any], key_name: str,
+) -> Tuple[Dict[str, Dict[str, Any]], Set[str], Set[str]]:
+    """Index the input files, reusing the manifest for unchanged ones.
+
+    Return the indexes, the keys to merge again and the keys which disappeared.
+    The signatures of the keys are updated in the manifest.
+    """
+    indexes: Dict[str, Dict[str, Any]] = {}
+    for filename in files:
+        previous = manifest['files'].get(filename)
+        if previous and previous['md5'] == data.md5_file(filename):
+            indexes[filename] = previous
+        else:
+            indexes[filename] = index_csv(filename, key_name)
+    signatures = _signatures(files, indexes)
+    # The rows of the previous merge written into one of the inputs (usually
+    # the data file) include the rows of the other files of that merge: the
+    # files which are no longer given do not change them.
+    absorbed_into = manifest.get('absorbed_into') if manifest.get('absorbed_into') in files else None
+
+    def is_unchanged(key: str, signature: List[Any]) -> bool:
+        previous = manifest['signatures'].get(key)
+        if previous == signature:
+            return True
+        if previous is None or not any(entry[0] == absorbed_into for entry in previous):
+            return False
+        return [entry for entry in previous if entry[0] in files] == signature
+
+    changed = {
+        key for key, signature in signatures.items()
+        if key not in manifest['rows'] or not is_unchanged(key, signature)}
+    removed = set(manifest['rows']) - set(signatures)
+    manifest['signatures'] = signatures
+    manifest.pop('absorbed_into', None)
+    return indexes, changed, removed
+
+
+def _output_order(files: Sequence[str], indexes: Dict[str, Dict[str, Any]]) -> List[str]:
+    """The keys in the order a full merge outputs them: from the last row of the newest file."""
+    order: Dict[str, None] = {}
+    for filename in reversed(files):
+        for key in reversed(indexes[filename]['keys']):
+            order.setdefault(key)
+    return list(order)
+
+
+def sort_output(
+    order: Sequence[str], first_file_keys: Iterable[str], row_of: Callable[[str], Sequence[str]],
+) -> List[str]:
+    """Sort the keys of the output by the sort key of their rows.
+
+    The rows coming from the first file (usually the data file) keep their
+    order and the other ones are inserted in one pass, so that the rows
+    already in place do not move even if the first file is not sorted.
+    """
+    sort_key = data.row_sort_key(list(data.DeviceCarbonFootprintData.__annotations__))
+    key: Callable[[str], Tuple[str, ...]] = lambda device_key: sort_key(row_of(device_key))
+    in_output = set(order)
+    existing = [device_key for device_key in dict.fromkeys(first_file_keys) if device_key in in_output]
+    existing_keys = set(existing)
+    return data.merge_sorted(existing, [device_key for device_key in order if device_key not in existing_keys], key)
+
+
 def main(string_args: Optional[List[str]] = None) -> None:
     argparser = argparse.ArgumentParser(
         description='Merge two Boavizta csv file',
@@ -46,74 +187,142 @@ def main(string_args: Optional[List[str]] = None) -> None:
     argparser.add_argument('-i', '--interactive', action='store_true', help='Ask user how ot resolve conflicts')
     argparser.add_argument('-k', '--key', default='name', help='Name of the field used to find duplicates')
     argparser.add_argument('-o', '--output', help='Output .csv file')
+    argparser.add_argument('-s', '--sort', action='store_true', help='Sort the output by manufacturer and name')
+    argparser.add_argument('-m', '--manifest', help='Manifest .json file of the previous merges, to only merge again the changed rows')
     args = argparser.parse_args(string_args)
-    conflict = 'interactive' if args.interactive else 'keep2nd'
+    conflict: Literal['keep2nd', 'interactive'] = 'interactive' if args.interactive else 'keep2nd'
     nb_files = len(args.files)
     result :Dict[str,data.DeviceCarbonFootprint] = {}
-    origins :Dict[str,Set[int]] = {}
-    nb_truly_clean_fusions = 0
-    nb_clean_fusions_with_conflicts = 0
-    nb_mixed_fusions = 0
-    nb_attributes_in_mixed_fusions = 0
-    nb_duplicates = [0]*nb_files
-    conflict_count :Dict[str,int] = {}
+    key_stats: Dict[str, Dict[str, Any]] = {}
+
+    if args.manifest:
+        manifest = load_manifest(args.manifest, args.key)
+        indexes, changed_keys, removed_keys = plan_incremental_merge(args.files, manifest, args.key)
+        files_devices = [
+            _load_rows(filename, {
+                index for index, key in enumerate(indexes[filename]['keys']) if key in changed_keys})
+            for filename in args.files]
+    else:
+        files_devices = [load_csv(filename) for filename in args.files]
 
     for i in reversed(range(nb_files)):
-        devices = load_csv(args.files[i])
+        devices = files_devices[i]
         for device in reversed(devices):
-            key = get_key(device, args.key)
+            key = get_key(dict(device.data), args.key)
             if key in result:
                 # merge the twos while giving priority to the one that is already present in result
                 device2 = result[key]
                 result[key],report,conflicts = data.DeviceCarbonFootprint.merge(device, device2, conflict=conflict, verbose=args.verbose)
+                stats = key_stats[key]
                 # record stats on conflicts
-                for conflict in conflicts:
-                    if conflict in conflict_count:
-                        conflict_count[conflict] += 1
-                    else:
-                        conflict_count[conflict] = 0
-                if i in origins[key]:
-                    nb_duplicates[i] += 1
+                stats['conflicts'].extend(conflicts)
+                if args.files[i] in stats['origins']:
+                    stats['duplicates'][args.files[i]] = stats['duplicates'].get(args.files[i], 0) + 1
                 else:
                     # we had a collision
                     if len(report[0])==0:
                         # in this case, device2 has been left unchanged
-                        if len(conflicts)==0:
-                            nb_truly_clean_fusions += 1
-                        else:
-                            nb_clean_fusions_with_conflicts += 1
+                        stats['fusions'].append('clean' if len(conflicts)==0 else 'hiding_conflicts')
                     else:
                         # in this case some attributes have been gathered from the older device
-                        nb_mixed_fusions += 1
-                        nb_attributes_in_mixed_fusions += len(report[0])
+                        stats['fusions'].append('mixed')
+                        stats['attributes'] += len(report[0])
                         if args.verbose>=1:
                             print(key,": gather old attributes for",report[0])
+                    stats['origins'].append(args.files[i])
             else:
                 result[key] = device
-                origins[key] = set()
-            origins[key].add(i)
-    
-    content = data.DeviceCarbonFootprint.csv_headers()
-    for device in result.values():
-        content += device.reorder().as_csv_row()
-    if args.output and args.output!="-":
-        with open(args.output, 'w', encoding='utf-8') as output:
-            output.write(content)
+                key_stats[key] = {
+                    'origins': [args.files[i]], 'duplicates': {}, 'fusions': [], 'attributes': 0, 'conflicts': []}
+
+    if args.manifest:
+        rows: Dict[str, List[str]] = manifest['rows']
+        replaced_rows = [rows[key] for key in changed_keys | removed_keys if key in rows]
+        for key in removed_keys:
+            del rows[key]
+            del manifest['stats'][key]
+        for key, device in result.items():
+            rows[key] = data.CsvWriter.format(device)[0]
+        manifest['stats'].update(key_stats)
+        headers = list(data.DeviceCarbonFootprintData.__annotations__)
+        order = _output_order(args.files, indexes)
+        if args.sort:
+            order = sort_output(order, indexes[args.files[0]]['keys'], rows.__getitem__)
+        # Only the changed keys are decoded and merged, but the output is still
+        # written whole, from the formatted rows of the manifest.
+        if args.output and args.output!="-":
+            # The cubes of the output can be updated if it is the output of the previous merge.
+            previous_output = manifest['files'].get(args.output)
+            output_cubes = None
+            if previous_output and os.path.exists(args.output) and previous_output['md5'] == data.md5_file(args.output):
+                output_cubes = cube.read_cubes(args.output)
+            with open(args.output, 'w', encoding='utf-8') as output:
+                csv.writer(output).writerows([headers] + [rows[key] for key in order])
+            if output_cubes:
+                decode = data.RowDecoder(headers)
+                removed_devices = [decode(row) for row in replaced_rows]
+                added_devices = [decode(rows[key]) for key in changed_keys]
+                output_devices: Optional[List[data.DeviceCarbonFootprint]] = None
+                for output_cube in output_cubes.values():
+                    lost_bounds = output_cube.update(removed_devices, added_devices)
+                    if lost_bounds:
+                        # The min or max of some cells were removed: find them again in all the rows.
+                        if output_devices is None:
+                            output_devices = [decode(rows[key]) for key in order]
+                        output_cube.recompute(lost_bounds, output_devices)
+                cube.write_cubes(args.output, output_cubes)
+            # The output is often the input of the next merge: index it right away.
+            header_hash = hashlib.md5('\x1f'.join(headers).encode('utf-8'))
+            output_index: Dict[str, Any] = {'md5': data.md5_file(args.output), 'keys': [], 'hashes': []}
+            for key in order:
+                row_hash = header_hash.copy()
+                row_hash.update('\x1e'.join(rows[key]).encode('utf-8'))
+                output_index['keys'].append(_row_key(headers, rows[key], args.key))
+                output_index['hashes'].append(row_hash.hexdigest())
+            indexes[args.output] = output_index
+            if args.output in args.files:
+                # Its rows already include the other files' ones: merging them again gives them back.
+                manifest['signatures'] = _signatures(args.files, indexes)
+                manifest['absorbed_into'] = args.output
+        else:
+            csv.writer(sys.stdout).writerows([headers] + [rows[key] for key in order])
+        manifest['files'].update(indexes)
+        tmp_manifest = f'{args.manifest}.tmp'
+        with open(tmp_manifest, 'wt', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(tmp_manifest, args.manifest)
+        print(
+            f'\nIncremental merge: {len(changed_keys)} keys merged again, {len(removed_keys)} removed, '
+            f'{len(order) - len(changed_keys)} unchanged')
+        # The stats of the unchanged keys are the ones of their last merge.
+        key_stats = {key: manifest['stats'][key] for key in order}
     else:
-        sys.stdout.write(content)
-    
-    nb_singletons = [0]*nb_files
-    for i in range(nb_files):
-        nb_singletons[i] = sum(map(lambda x: len(x)==1 and i in x, origins.values()))
+        devices = list(result.values())
+        if args.sort:
+            output_rows = {key: data.CsvWriter.format(device)[0] for key, device in result.items()}
+            first_file_keys = (get_key(dict(device.data), args.key) for device in files_devices[0])
+            devices = [result[key] for key in sort_output(list(result), first_file_keys, output_rows.__getitem__)]
+        if args.output and args.output!="-":
+            with open(args.output, 'w', encoding='utf-8') as output, data.CsvWriter(output) as writer:
+                writer.write_all(devices)
+        else:
+            with data.CsvWriter(sys.stdout) as writer:
+                writer.write_all(devices)
+
+    all_stats = list(key_stats.values())
+    nb_singletons = [sum(stats['origins'] == [filename] for stats in all_stats) for filename in args.files]
+    nb_duplicates = [sum(stats['duplicates'].get(filename, 0) for stats in all_stats) for filename in args.files]
+    fusions = collections.Counter(fusion for stats in all_stats for fusion in stats['fusions'])
+    conflict_count = collections.Counter(field for stats in all_stats for field in stats['conflicts'])
     print("\n------------------------------------------------------------")
     print(  "| Summary report                                           |")
     print(  "------------------------------------------------------------")
     print(  "Number of singletons: ", nb_singletons, sep='')
     print(  "Number of self duplicates: ", nb_duplicates, sep='')
-    print(  "Number of truly clean fusions:            ", nb_truly_clean_fusions, sep='')
-    print(  "Number of clean fusions hiding conflicts: ", nb_clean_fusions_with_conflicts, sep='')
-    print(  "Number of mixed fusions:                  ", nb_mixed_fusions, sep='')
-    print(  "Number of attributes gathered from the oldest data: ", nb_attributes_in_mixed_fusions, sep='')
+    print(  "Number of truly clean fusions:            ", fusions['clean'], sep='')
+    print(  "Number of clean fusions hiding conflicts: ", fusions['hiding_conflicts'], sep='')
+    print(  "Number of mixed fusions:                  ", fusions['mixed'], sep='')
+    print(  "Number of attributes gathered from the oldest data: ", sum(stats['attributes'] for stats in all_stats), sep='')
     print(  "Details on conflicts:")
     for k,n in conflict_count.items():
         print("  ", k, "x", n)
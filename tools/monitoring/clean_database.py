@@ -18,10 +18,10 @@ def main(string_args: Optional[List[str]] = None) -> None:
     argparser.add_argument('-o', '--output', help='Output .csv file')
     args = argparser.parse_args(string_args)
     conflict = 'interactive' if args.interactive else 'keep2nd'
-    content = data.DeviceCarbonFootprint.csv_headers()
     with open(args.file, 'rt', encoding='utf-8') as existing_file:
         csvfile = csv.DictReader(existing_file)
         seen: List[data.DeviceCarbonFootprint] = []
+        merged: List[data.DeviceCarbonFootprint] = []
         for row in csvfile:
             result=data.DeviceCarbonFootprint(row)
             if not 'comment' in result.data:
@@ -50,23 +50,22 @@ def main(string_args: Optional[List[str]] = None) -> None:
                     for i in seen:
                         if row.get('name') == i.data["name"]:
                             notseen=False
-                            new_result,report = data.DeviceCarbonFootprint.merge(i, result, conflict=conflict, verbose=args.verbose)
+                            new_result, report, conflicts = data.DeviceCarbonFootprint.merge(i, result, conflict=conflict, verbose=args.verbose)
                             new_result.data['comment']= result.data['comment'] + " merged"
                             seen.remove(i)
-                            content += new_result.reorder().as_csv_row()
+                            merged.append(new_result)
                             print(new_result.reorder().as_csv_row())
                             # Ne gere pas le cas de plus de 2 doublons
                 if notseen:
                     seen.append(result)
                     print(result.reorder().as_csv_row())
         
-        for device in seen:
-            content += device.reorder().as_csv_row()
         if args.output and args.output!="-":
-            with open(args.output, 'w', encoding='utf-8') as output:
-                output.write(content)
+            with open(args.output, 'w', encoding='utf-8') as output, data.CsvWriter(output) as writer:
+                writer.write_all(merged + seen)
         else:
-            sys.stdout.write(content)
+            with data.CsvWriter(sys.stdout) as writer:
+                writer.write_all(merged + seen)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
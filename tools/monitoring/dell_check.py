@@ -1,32 +1,14 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from tools.spiders.lib import browsers
 
 
-# start web browser
-options = Options()
-options.add_argument("--headless")
-#options.add_argument("--dump-dom")
-desired_capabilities = options.to_capabilities()
-browser = webdriver.Chrome(options=options)
+_INDEX_PAGE_URL = 'https://www.dell.com/en-us/dt/corporate/social-impact/advancing-sustainability/sustainable-products-and-services/product-carbon-footprints.htm'
 
-
-# get source code
-browser.get("https://www.dell.com/en-us/dt/corporate/social-impact/advancing-sustainability/sustainable-products-and-services/product-carbon-footprints.htm#tab0=0")
-# Implicit wait
-test=WebDriverWait(browser, 10).until(
-        EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'div[class=list-component]'))
-    )
-# Explicit wait
-all_pdfs = browser.find_elements(By.XPATH,"//a[contains(@href, '.pdf')]")
-pdfs=[]
-pdfs.append(i.get_attribute("href") for i in all_pdfs)
-for i in all_pdfs:
-    print(i.get_attribute("href"))
-
-
-
-# close web browser
-browser.close()
\ No newline at end of file
+# List the PDFs of all the tabs (Desktops, Laptops, ...) in parallel.
+tabs = [f'{_INDEX_PAGE_URL}#tab0={i}' for i in range(6)]
+all_pdfs = browsers.get_pool().map(
+    lambda browser, url: browsers.collect_links(
+        browser, url, "//a[contains(@href, '.pdf')]", wait_for="//div[@class='list-component']"),
+    tabs)
+for pdfs in all_pdfs:
+    for pdf in pdfs:
+        print(pdf)
@@ -0,0 +1,350 @@
+"""An index of device names, to resolve free-text model names in microseconds.
+
+Names are normalized (case, punctuation, units and the manufacturer they
+may start with) and cut into character trigrams. The index is partitioned
+by manufacturer: a lookup only scores the names of the same manufacturer
+sharing a trigram with the query, by the Jaccard index of their trigrams,
+and returns the top ones. The index of a data file, with its postings, is
+saved next to it (e.g. boavizta-data-us.csv.names.json) and rebuilt when the
+file changes:
+
+    index = name_index.load('boavizta-data-us.csv')
+    index.search('HP', 'HP EliteBook 840 G8', k=3)
+    index.match('Dell Inc.', 'Latitude 7420')
+
+Or from the command line:
+
+    python -m tools.name_index boavizta-data-us.csv Dell "Latitude 7420" -k 3
+"""
+import argparse
+import collections
+import json
+import os
+import re
+import time
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tools import snapshot
+from tools.parsers.lib import data
+
+# Bump when the format of the saved index changes.
+_VERSION = 2
+# Minimal Jaccard index of the trigrams of a query and of the name it matches.
+DEFAULT_THRESHOLD = 0.5
+
+
+def normalize_name(name: str) -> str:
+    """Lower case a name and remove the variations in punctuation and units."""
+    name = name.lower().replace('”', 'in').replace('"', 'in')
+    name = re.sub(r'[-\s]*inch(es)?\b', 'in', name)
+    name = re.sub(r'[^a-z0-9.]+', ' ', name)
+    # Keep decimal points only.
+    name = re.sub(r'(?<![0-9])\.|\.(?![0-9])', ' ', name)
+    return ' '.join(name.split())
+
+
+def shingles(name: str, size: int = 3) -> FrozenSet[str]:
+    """The character n-grams of a normalized name."""
+    padded = f' {name} '
+    return frozenset(padded[index:index + size] for index in range(len(padded) - size + 1))
+
+
+def model_tokens(name: str) -> FrozenSet[str]:
+    """The words with digits in a normalized name, e.g. model numbers, sizes or years."""
+    return frozenset(token for token in name.split() if re.search(r'[0-9]', token))
+
+
+# Words which do not tell models apart.
+_GENERIC_WORDS = frozenset({
+    'and', 'cpu', 'desktop', 'for', 'in', 'laptop', 'notebook', 'of', 'pc', 'the', 'with'})
+
+
+def variant_words(name: str) -> FrozenSet[str]:
+    """The other words of a normalized name, e.g. the line and variant of a model: pro, max, mini, 2-in-1..."""
+    words = {token for token in name.split() if token not in _GENERIC_WORDS and not re.search(r'[0-9]', token)}
+    if re.search(r'\b2 in 1\b', name):
+        words.add('2in1')
+    return frozenset(words)
+
+
+def jaccard(shingles1: FrozenSet[str], shingles2: FrozenSet[str]) -> float:
+    if not shingles1 or not shingles2:
+        return 0.
+    return len(shingles1 & shingles2) / len(shingles1 | shingles2)
+
+
+def tokens_match(tokens1: FrozenSet[str], tokens2: FrozenSet[str]) -> bool:
+    """Whether the model tokens of a name are all in the other one: models often differ only by a number."""
+    return tokens1 <= tokens2 or tokens2 <= tokens1
+
+
+class Hit(NamedTuple):
+    """A name of the index matching a query, with the rows of its devices."""
+    name: str
+    score: float
+    rows: List[int]
+
+
+class Match(NamedTuple):
+    """The devices matching a query, all with the same best score, or all the configurations of the queried model."""
+    # 'exact' for the same normalized name, 'fuzzy' or '' if none.
+    kind: str
+    score: float
+    rows: List[int]
+
+
+_NO_MATCH = Match('', 0., [])
+
+
+def _block(manufacturer: str) -> str:
+    return manufacturer.strip().lower()
+
+
+class _Block:
+    """The names of a manufacturer, with an inverted index of their trigrams."""
+
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.labels: List[str] = []
+        self.rows: List[List[int]] = []
+        self.tokens: List[FrozenSet[str]] = []
+        self.words: List[FrozenSet[str]] = []
+        self.sizes: List[int] = []
+        self.trigrams: Dict[str, List[int]] = collections.defaultdict(list)
+        # Arrays of the postings and sizes, built on the first lookup after a change.
+        self._arrays: Optional[Tuple[Dict[str, np.ndarray], np.ndarray]] = None
+
+    def add(self, name: str, label: str, row: int) -> None:
+        name_id = self.ids.get(name)
+        if name_id is None:
+            name_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.labels.append(label)
+            self.rows.append([])
+            self.tokens.append(model_tokens(name))
+            self.words.append(variant_words(name))
+            name_shingles = shingles(name)
+            self.sizes.append(len(name_shingles))
+            for trigram in name_shingles:
+                self.trigrams[trigram].append(name_id)
+            self._arrays = None
+        self.rows[name_id].append(row)
+
+    def scores(self, name: str, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+        """The ids of the names scoring at least the threshold against a query, and their scores, best first."""
+        if self._arrays is None:
+            self._arrays = (
+                {trigram: np.array(name_ids, dtype=np.int32) for trigram, name_ids in self.trigrams.items()},
+                np.array(self.sizes, dtype=np.float64))
+        postings, sizes = self._arrays
+        query_shingles = shingles(name)
+        found = [postings[trigram] for trigram in query_shingles if trigram in postings]
+        if not found:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        # Only the names sharing a trigram with the query are scored.
+        name_ids, shared = np.unique(np.concatenate(found), return_counts=True)
+        scores = shared / (len(query_shingles) + sizes[name_ids] - shared)
+        kept = np.flatnonzero(scores >= max(threshold, 1e-9))
+        kept = kept[np.argsort(-scores[kept], kind='stable')]
+        return name_ids[kept], scores[kept]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'names': self.names, 'labels': self.labels, 'rows': self.rows, 'sizes': self.sizes,
+            'tokens': [sorted(tokens) for tokens in self.tokens],
+            'words': [sorted(words) for words in self.words],
+            'trigrams': self.trigrams}
+
+    @classmethod
+    def from_json(cls, value: Dict[str, Any]) -> '_Block':
+        block = cls()
+        block.names = value['names']
+        block.ids = {name: name_id for name_id, name in enumerate(block.names)}
+        block.labels = value['labels']
+        block.rows = value['rows']
+        block.sizes = value['sizes']
+        block.tokens = [frozenset(tokens) for tokens in value['tokens']]
+        block.words = [frozenset(words) for words in value['words']]
+        block.trigrams.update(value['trigrams'])
+        return block
+
+
+class NameIndex:
+    """A trigram index of device names, partitioned by manufacturer."""
+
+    def __init__(self) -> None:
+        self._blocks: Dict[str, _Block] = collections.defaultdict(_Block)
+        self._matches: Dict[Tuple[str, str, float], Match] = {}
+
+    @staticmethod
+    def _normalize(block: str, name: str) -> str:
+        """The normalized name, without the manufacturer it may start with."""
+        name = normalize_name(name)
+        return name[len(block) + 1:] if name.startswith(f'{block} ') else name
+
+    def add(self, manufacturer: str, name: str, row: int) -> None:
+        """Index the name of a device, identified by its row."""
+        block = _block(manufacturer)
+        normalized = self._normalize(block, name)
+        if block and normalized:
+            self._blocks[block].add(normalized, name, row)
+            self._matches.clear()
+
+    def __len__(self) -> int:
+        return sum(len(block.names) for block in self._blocks.values())
+
+    def _find_block(self, manufacturer: str) -> str:
+        block = _block(manufacturer)
+        if block in self._blocks:
+            return block
+        # E.g. "HP Inc." or "Dell Technologies".
+        first_word = normalize_name(block).split(' ', 1)[0]
+        return first_word if first_word in self._blocks else ''
+
+    def search(self, manufacturer: str, name: str, k: int = 5, threshold: float = 0.) -> List[Hit]:
+        """The k names of the manufacturer most similar to a query, best first."""
+        block_name = self._find_block(manufacturer)
+        normalized = self._normalize(block_name, name)
+        if not block_name or not normalized:
+            return []
+        block = self._blocks[block_name]
+        name_ids, scores = block.scores(normalized, threshold)
+        return [
+            Hit(block.labels[name_id], score, block.rows[name_id])
+            for name_id, score in zip(name_ids[:k].tolist(), scores[:k].tolist())]
+
+    def match(self, manufacturer: str, name: str, threshold: float = DEFAULT_THRESHOLD) -> Match:
+        """The devices of the manufacturer with the same normalized name, else with the most similar one.
+
+        Names whose model numbers or variant words differ from the query's do
+        not match. If the query lacks the configuration of the names it
+        matches, e.g. "iPhone 13 Pro" for "iPhone 13 Pro 256GB", all of them
+        match rather than the closest one.
+        """
+        key = (manufacturer, name, threshold)
+        if key not in self._matches:
+            self._matches[key] = self._match(manufacturer, name, threshold)
+        return self._matches[key]
+
+    def _match(self, manufacturer: str, name: str, threshold: float) -> Match:
+        block_name = self._find_block(manufacturer)
+        normalized = self._normalize(block_name, name)
+        if not block_name or not normalized:
+            return _NO_MATCH
+        block = self._blocks[block_name]
+        name_id = block.ids.get(normalized)
+        if name_id is not None:
+            return Match('exact', 1., block.rows[name_id])
+
+        query_tokens = model_tokens(normalized)
+        query_words = variant_words(normalized)
+        name_ids, scores = block.scores(normalized, threshold)
+        candidates = [
+            (candidate, score) for candidate, score in zip(name_ids.tolist(), scores.tolist())
+            if tokens_match(query_tokens, block.tokens[candidate]) and block.words[candidate] == query_words]
+        if not candidates:
+            return _NO_MATCH
+        # The configurations of the model, e.g. its storage, missing from the query.
+        configurations = [candidate for candidate, unused_score in candidates if query_tokens < block.tokens[candidate]]
+        others = [(candidate, score) for candidate, score in candidates if query_tokens >= block.tokens[candidate]]
+        if others:
+            best_score = others[0][1]
+            best_ids = [candidate for candidate, score in others if score >= best_score]
+        else:
+            best_score = candidates[0][1]
+            best_ids = configurations
+        return Match('fuzzy', best_score, sorted(row for name_id in best_ids for row in block.rows[name_id]))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {block_name: block.to_json() for block_name, block in self._blocks.items()}
+
+    @classmethod
+    def from_json(cls, value: Dict[str, Any]) -> 'NameIndex':
+        index = cls()
+        for block_name, saved in value.items():
+            index._blocks[block_name] = _Block.from_json(saved)
+        return index
+
+
+def from_columns(manufacturers: Sequence[str], names: Sequence[str]) -> NameIndex:
+    """An index of devices given by their manufacturers and names, identified by their positions."""
+    index = NameIndex()
+    for row, (manufacturer, name) in enumerate(zip(manufacturers, names)):
+        index.add(manufacturer, name, row)
+    return index
+
+
+def build(csv_path: str) -> NameIndex:
+    """The index of the devices of a data file, identified by their rows in its snapshot."""
+    dataset = snapshot.load(csv_path)
+    return from_columns(dataset.values('manufacturer').tolist(), dataset.values('name').tolist())
+
+
+def index_path(csv_path: str) -> str:
+    return f'{csv_path}.names.json'
+
+
+def read_index(csv_path: str) -> Optional[NameIndex]:
+    """The saved index of a data file, or None if the file changed since."""
+    try:
+        with open(index_path(csv_path), 'rt', encoding='utf-8') as index_file:
+            saved: Dict[str, Any] = json.load(index_file)
+        stat = os.stat(csv_path)
+    except (OSError, ValueError):
+        return None
+    if saved.get('version') != _VERSION:
+        return None
+    if (saved['mtime_ns'], saved['size']) != (stat.st_mtime_ns, stat.st_size) and (
+            saved['size'] != stat.st_size or saved['md5'] != data.md5_file(csv_path)):
+        return None
+    return NameIndex.from_json(saved['index'])
+
+
+def write_index(csv_path: str, index: NameIndex) -> None:
+    """Save the index of the current version of a data file."""
+    stat = os.stat(csv_path)
+    saved = {
+        'version': _VERSION, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+        'md5': data.md5_file(csv_path), 'index': index.to_json()}
+    tmp_path = f'{index_path(csv_path)}.{os.getpid()}'
+    with open(tmp_path, 'wt', encoding='utf-8') as index_file:
+        json.dump(saved, index_file)
+    os.replace(tmp_path, index_path(csv_path))
+
+
+def load(csv_path: str) -> NameIndex:
+    """The index of a data file, built and saved if it is missing or out of date."""
+    index = read_index(csv_path)
+    if index is None:
+        index = build(csv_path)
+        write_index(csv_path, index)
+    return index
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Find the devices of a Boavizta csv file with the closest names',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument('file', help='.csv data file')
+    argparser.add_argument('manufacturer', help='Manufacturer of the device')
+    argparser.add_argument('name', help='Name of the device, free text')
+    argparser.add_argument('-k', default=5, type=int, help='Number of names to return')
+    args = argparser.parse_args(string_args)
+
+    start = time.perf_counter()
+    index = load(args.file)
+    loaded = time.perf_counter()
+    hits = index.search(args.manufacturer, args.name, k=args.k)
+    searched = time.perf_counter()
+    print(
+        f'{len(index)} names loaded in {(loaded - start) * 1000:.1f} ms, '
+        f'searched in {(searched - loaded) * 1e6:.0f} µs')
+    for hit in hits:
+        print(f'{hit.score:.3f} {hit.name} (rows {", ".join(str(row) for row in hit.rows)})')
+
+
+if __name__ == '__main__':
+    main()
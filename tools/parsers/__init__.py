@@ -1,8 +1,15 @@
-"""All existing parsers."""
-
-from . import apple
-from . import dell_laptop
-from . import hp_workplace
-from . import google
-from . import lenovo
-from . import huawei
+"""All existing parsers.
+
+They are imported on first use (e.g. `parsers.apple`), so that the data helpers
+in tools.parsers.lib can be used without loading the PDF and image libraries.
+"""
+import importlib
+from typing import Any
+
+_PARSERS = ('apple', 'dell_laptop', 'hp_workplace', 'google', 'lenovo', 'huawei')
+
+
+def __getattr__(name: str) -> Any:
+    if name in _PARSERS:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -11,6 +11,7 @@ import hashlib
 import math
 
 from tools.parsers.lib import data
+from tools.parsers.lib import electricity
 from tools.parsers.lib import loader
 from tools.parsers.lib import pdf
 from tools.parsers.lib import text
@@ -243,39 +244,19 @@ def parse(body: BinaryIO, pdf_filename: str) -> Iterator[data.DeviceCarbonFootpr
 
 
 
-    # Apply some automatic fixes
+    # Apply some automatic fixes, see lib/electricity.py: the reported lifetime
+    # may not be the one used for the computation, and the reported
+    # gwp_total may not match its breakdown.
     if 'gwp_use_ratio' in result and 'yearly_tec' in result and result.get('gwp_total'):
-        # compute electricity factor assuming 100% of the 'use' phase comes from the electricity consumption,
-        elec_factor = result['gwp_use_ratio'] * result['gwp_total'] / (result['lifetime'] * result['yearly_tec'])
-        if math.isfinite(elec_factor):
-            # Fix #1: for some items, the reported lifetime does not
-            # match the one used for the computation, leading to odd elecfactor.
-            # Those can be identified by computing what would have been the
-            # lifetime for a factor of 0.686kgCO2e/kWh and checking this
-            # number is roughly an integer
-            for expected_factor in [0.686, 0.525]:
-                expected_lifetime = elec_factor * result['lifetime'] / expected_factor
-                if (elec_factor<0.52 or elec_factor>0.695) and (abs(expected_lifetime-result['lifetime'])>0.6) and abs(expected_lifetime-round(expected_lifetime))<0.1:
-                    result['lifetime'] = round(expected_lifetime)
-                    result['comment'] = ' '.join([result['comment'], "fixed lifetime"])
-                    elec_factor = result['gwp_use_ratio'] * result['gwp_total'] / (result['lifetime'] * result['yearly_tec'])
-                    break
-
-            # Problem #2: for many items, there is a odd discrepancy between
-            # the reported CO2e values (mean & percentiles) and the mean gwp_total obtained
-            # by summing up the values of the bar plots. For those items, we can
-            # also observe that the percentages of the pie-chart match the percentage
-            # of the bar plot. Moreover, the 'use' phase of the bar-plot can also be
-            # properly recovered from "yearly_tec * lifetime * 0.525kgCO2e/kWh"
-            # -> Those observations suggest that the bar plots are corrects,
-            #    but that the global mean (and percentiles) are not correct.
-            # -> It is important to correct this error as it also impact the embodied values.
-            # Those items can be found from the estimated electricity factor which is around
-            # 0.42 for those erroneous files.
-            if elec_factor > 0.34 and elec_factor < 0.46:
-                correction_factor = 0.525 / elec_factor
-                result['gwp_total'] *= correction_factor
-                result['comment'] = ' '.join([result['comment'], "fixed gwp_total"])
+        fixes = electricity.fix_electricity_factor(
+            [result['gwp_total']], [result['gwp_use_ratio']], [result['yearly_tec']],
+            [result.get('lifetime', math.nan)])
+        if fixes.fixed_lifetime[0]:
+            result['lifetime'] = int(fixes.lifetime[0])
+            result['comment'] = ' '.join([result['comment'], electricity.FIXED_LIFETIME])
+        if fixes.fixed_gwp_total[0]:
+            result['gwp_total'] = float(fixes.gwp_total[0])
+            result['comment'] = ' '.join([result['comment'], electricity.FIXED_GWP_TOTAL])
 
     yield data.DeviceCarbonFootprint(result)
 
@@ -1,10 +1,13 @@
 import csv
 import io
 import hashlib
+import heapq
 import math
 import re
 from sre_compile import isstring
-from typing import Any, Dict, Iterable, Iterator, Literal, Union, TextIO, TypedDict, Tuple, List, Set, cast
+from typing import Any, Callable, Dict, Iterable, Iterator, Literal, Optional, Sequence, Union, TextIO, TypedDict, Tuple, TypeVar, List, Set, cast
+
+_T = TypeVar('_T')
 
 class DeviceCarbonFootprintData(TypedDict, total=False):
     """The carbon footprint data for one device model."""
@@ -55,6 +58,85 @@ def md5(pdf):
         hash_md5.update(chunk)
     return hash_md5.hexdigest()
 
+def _to_int(value: Any) -> int:
+    if type(value) is str:
+        value = _INT_SUFFIX.sub('', value)
+    return int(value)
+
+
+def _to_str(value: Any) -> str:
+    return value if type(value) is str else str(value)
+
+
+_INT_SUFFIX = re.compile(r'\.0*$')
+_TYPE_CONVERTERS: Dict[type, Callable[[Any], Any]] = {int: _to_int, float: float, str: _to_str}
+# How to convert each field from text, in the schema order.
+_CONVERTERS: List[Tuple[str, Callable[[Any], Any]]] = [
+    (key, _TYPE_CONVERTERS[data_type])
+    for key, data_type in DeviceCarbonFootprintData.__annotations__.items()
+]
+
+
+def _conversion_error(key: str, value: Any, data: Any) -> ValueError:
+    data_type = DeviceCarbonFootprintData.__annotations__[key]
+    return ValueError(f'Value error for converting "{key}": "{value}" as"{data_type}"\n{data}')
+
+
+class RowDecoder:
+    """Decode CSV rows into devices, for a given CSV header.
+
+    The column and converter of each field are resolved once, so that a row is
+    decoded without building a dict of the CSV row nor looking up the schema.
+    """
+
+    def __init__(
+        self, headers: Sequence[str], cleaners: Optional[Dict[str, Callable[[str], str]]] = None,
+    ) -> None:
+        self.headers = list(headers)
+        positions = {header: position for position, header in enumerate(self.headers)}
+        cleaners = cleaners or {}
+        self._columns: List[Tuple[int, str, Callable[[Any], Any]]] = []
+        for key, convert in _CONVERTERS:
+            if key not in positions:
+                continue
+            if key in cleaners:
+                convert = _chain(cleaners[key], convert)
+            self._columns.append((positions[key], key, convert))
+        self._width = max((position + 1 for position, unused_key, unused_convert in self._columns), default=0)
+
+    def _decode(self, row: Sequence[str]) -> 'DeviceCarbonFootprint':
+        typed: Dict[str, Any] = {}
+        for position, key, convert in self._columns:
+            value = row[position]
+            if value:
+                # CSV values are already strings.
+                typed[key] = value if convert is _to_str else convert(value)
+        return DeviceCarbonFootprint(cast(DeviceCarbonFootprintData, typed))
+
+    def __call__(self, row: Sequence[str]) -> 'DeviceCarbonFootprint':
+        if len(row) < self._width:
+            row = list(row) + [''] * (self._width - len(row))
+        try:
+            return self._decode(row)
+        except ValueError:
+            # Find which value failed to convert.
+            for position, key, convert in self._columns:
+                try:
+                    if row[position]:
+                        convert(row[position])
+                except ValueError as error:
+                    raise _conversion_error(key, row[position], dict(zip(self.headers, row))) from error
+            raise
+
+
+def _chain(clean: Callable[[str], str], convert: Callable[[Any], Any]) -> Callable[[str], Any]:
+    return lambda value: convert(clean(value))
+
+
+# Characters removed from the text values written in the CSV files.
+_CSV_UNSAFE = str.maketrans('', '', ',";')
+
+
 def _format_csv_row(row: Iterable[Any], csv_format: Literal['us', 'fr']) -> str:
     output = io.StringIO()
     writer = csv.writer(output, delimiter=';' if csv_format == 'fr' else ',')
@@ -100,17 +182,29 @@ class DeviceCarbonFootprint:
 
     @classmethod
     def from_text(cls, data: Dict[str, str]) -> 'DeviceCarbonFootprint':
-        typed_data: DeviceCarbonFootprintData = {}
-        for key, data_type in DeviceCarbonFootprintData.__annotations__.items():
+        typed_data: Dict[str, Any] = {}
+        for key, convert in _CONVERTERS:
             if not (value := data.get(key)):
                 continue
             try:
-                if data_type==int and type(value)==str:
-                    value = re.sub(r'\.0*$', '', value)
-                typed_data[key] = data_type(value)  # type: ignore
+                typed_data[key] = convert(value)
             except ValueError as error:
-                raise ValueError(f'Value error for converting "{key}": "{value}" as"{data_type}"\n{data}') from error
-        return DeviceCarbonFootprint(typed_data)
+                raise _conversion_error(key, value, data) from error
+        return DeviceCarbonFootprint(cast(DeviceCarbonFootprintData, typed_data))
+
+    @staticmethod
+    def from_csv(
+        filename: str, cleaners: Optional[Dict[str, Callable[[str], str]]] = None,
+    ) -> List['DeviceCarbonFootprint']:
+        """Decode all the devices of a CSV file (in the US format).
+
+        Cleaners can rewrite the text of some columns before they are converted.
+        Header lines repeated by concatenated exports are skipped.
+        """
+        with open(filename, 'rt', encoding='utf-8', newline='') as csv_file:
+            reader = csv.reader(csv_file)
+            decode = RowDecoder(next(reader, []), cleaners)
+            return [decode(row) for row in reader if row != decode.headers]
 
     def get(self, key: str) -> Union[float, str, int]:
         if key in self.data:
@@ -129,7 +223,7 @@ class DeviceCarbonFootprint:
         typed_data: DeviceCarbonFootprintData = {}
         for key in DeviceCarbonFootprintData.__annotations__.keys():
             if isstring(self.get(key)):
-                typed_data[key]=cast(str, self.get(key)).replace(",","").replace("\"","").replace(";","").strip()  # type: ignore [misc]
+                typed_data[key]=cast(str, self.get(key)).translate(_CSV_UNSAFE).strip()  # type: ignore [misc]
             else:
                 typed_data[key]=self.get(key)  # type: ignore [misc]
         return DeviceCarbonFootprint(typed_data)
@@ -210,3 +304,102 @@ class DeviceCarbonFootprint:
                     result[key] = device2.get(key)  # type: ignore [misc]
                     report[1].add(key)
         return DeviceCarbonFootprint(result), report, conflicts
+
+
+class CsvWriter:
+    """Stream devices to CSV files, in the US and/or FR format at once.
+
+    Each device is formatted in one pass for both formats, as its reorder()ed
+    as_csv_row() would be, and the rows are written by chunks through one
+    csv writer per file:
+
+        with open('us.csv', 'w') as us_file, open('fr.csv', 'w') as fr_file:
+            with data.CsvWriter(us_file, fr_file) as writer:
+                writer.write_all(devices)
+    """
+
+    def __init__(
+        self, us_file: Optional[TextIO] = None, fr_file: Optional[TextIO] = None,
+        headers: bool = True, chunk_size: int = 1000, lineterminator: str = '\r\n',
+    ) -> None:
+        self._us_writer = csv.writer(us_file, lineterminator=lineterminator) if us_file else None
+        self._fr_writer = csv.writer(fr_file, delimiter=';', lineterminator=lineterminator) if fr_file else None
+        self._us_rows: List[List[str]] = []
+        self._fr_rows: List[List[str]] = []
+        self._chunk_size = chunk_size
+        self.rows = 0
+        if headers:
+            keys = list(DeviceCarbonFootprintData.__annotations__)
+            self._us_rows.append(keys)
+            self._fr_rows.append(keys)
+
+    @staticmethod
+    def format(device: DeviceCarbonFootprint) -> Tuple[List[str], List[str]]:
+        """The values of the US and FR rows of a device."""
+        values = device.data
+        us_row: List[str] = []
+        fr_row: List[str] = []
+        for key in DeviceCarbonFootprintData.__annotations__:
+            value = values.get(key, '')
+            if type(value) is str:
+                value = value.translate(_CSV_UNSAFE).strip()
+                us_row.append(value)
+                fr_row.append(value)
+            else:
+                text = str(value)
+                us_row.append(text)
+                fr_row.append(text.replace('.', ',') if isinstance(value, float) else text)
+        return us_row, fr_row
+
+    def write(self, device: DeviceCarbonFootprint) -> None:
+        us_row, fr_row = self.format(device)
+        self._us_rows.append(us_row)
+        self._fr_rows.append(fr_row)
+        self.rows += 1
+        if len(self._us_rows) >= self._chunk_size:
+            self.flush()
+
+    def write_all(self, devices: Iterable[DeviceCarbonFootprint]) -> None:
+        for device in devices:
+            self.write(device)
+
+    def flush(self) -> None:
+        if self._us_writer:
+            self._us_writer.writerows(self._us_rows)
+        if self._fr_writer:
+            self._fr_writer.writerows(self._fr_rows)
+        self._us_rows.clear()
+        self._fr_rows.clear()
+
+    def __enter__(self) -> 'CsvWriter':
+        return self
+
+    def __exit__(self, *unused_args: object) -> None:
+        self.flush()
+
+
+# The fields by which the rows of the data files are sorted.
+SORT_FIELDS = ('manufacturer', 'name', 'category', 'subcategory', 'report_date')
+
+
+def row_sort_key(headers: Sequence[str]) -> Callable[[Sequence[str]], Tuple[str, ...]]:
+    """The sort key of the CSV rows with the given headers."""
+    positions = [headers.index(field) if field in headers else -1 for field in SORT_FIELDS]
+    return lambda row: tuple(
+        row[position].casefold() if 0 <= position < len(row) else '' for position in positions)
+
+
+def is_sorted(items: Sequence[_T], key: Callable[[_T], Any]) -> bool:
+    keys = [key(item) for item in items]
+    return all(previous <= current for previous, current in zip(keys, keys[1:]))
+
+
+def merge_sorted(sorted_items: Iterable[_T], new_items: Iterable[_T], key: Callable[[_T], Any]) -> List[_T]:
+    """Insert new items into items already sorted by key, in one linear pass.
+
+    Only the new items get sorted. The merge is stable: existing items come
+    before the new ones with the same key. If the existing items are not
+    sorted, they keep their order and each new item comes before the first
+    one which is greater.
+    """
+    return list(heapq.merge(sorted_items, sorted(new_items, key=key), key=key))
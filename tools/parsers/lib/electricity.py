@@ -0,0 +1,74 @@
+"""Fixes of the electricity factors of HP reports.
+
+The use phase of a footprint mostly comes from the electricity consumed over
+the lifetime of the device, so gwp_total * gwp_use_ratio / (yearly_tec *
+lifetime) gives the carbon intensity of the electricity the manufacturer
+used. The factors of HP reports reveal two known errors, fixed by the HP
+parser and by tools/audit.py on existing data:
+
+* the lifetime used for the computation is not the reported one: it is
+  recovered from the factors 0.686 or 0.525 kgCO2e/kWh, when it is then
+  roughly a whole number of years,
+* the reported gwp_total does not match its breakdown, whose use phase is
+  right with a factor of 0.525 kgCO2e/kWh: such rows have factors around 0.42.
+
+The factors are the ones of HP: do not apply these fixes to other manufacturers.
+"""
+from typing import NamedTuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+# Electricity factors (kgCO2e/kWh) with which the lifetime of the computation is recovered.
+LIFETIME_FACTORS = (0.686, 0.525)
+# Factors which are not odd enough to question the lifetime.
+PLAUSIBLE_FACTOR_RANGE = (0.52, 0.695)
+# Factors of the rows whose gwp_total does not match its breakdown, and the factor of the breakdown.
+WRONG_TOTAL_FACTOR_RANGE = (0.34, 0.46)
+BREAKDOWN_FACTOR = 0.525
+
+FIXED_LIFETIME = 'fixed lifetime'
+FIXED_GWP_TOTAL = 'fixed gwp_total'
+
+
+class Fixes(NamedTuple):
+    """The fixed values of rows, and which ones were fixed."""
+    gwp_total: np.ndarray
+    lifetime: np.ndarray
+    fixed_gwp_total: np.ndarray
+    fixed_lifetime: np.ndarray
+
+    def fixed(self) -> np.ndarray:
+        return np.asarray(self.fixed_gwp_total | self.fixed_lifetime)
+
+
+def fix_electricity_factor(
+    gwp_total: ArrayLike, gwp_use_ratio: ArrayLike, yearly_tec: ArrayLike, lifetime: ArrayLike,
+) -> Fixes:
+    """Fix the lifetime, then the gwp_total, of rows with odd electricity factors.
+
+    Missing values are NaN, and rows whose factor is unknown are left as they are.
+    """
+    gwp_totals = np.asarray(gwp_total, dtype=np.float64)
+    use_ratios = np.asarray(gwp_use_ratio, dtype=np.float64)
+    yearly_tecs = np.asarray(yearly_tec, dtype=np.float64)
+    lifetimes = np.asarray(lifetime, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = use_ratios * gwp_totals / (lifetimes * yearly_tecs)
+        odd = np.isfinite(factor) & ((factor < PLAUSIBLE_FACTOR_RANGE[0]) | (factor > PLAUSIBLE_FACTOR_RANGE[1]))
+
+        fixed_lifetime = np.zeros(factor.shape, dtype=bool)
+        fixed_lifetimes = lifetimes.copy()
+        for expected_factor in LIFETIME_FACTORS:
+            expected_lifetime = factor * lifetimes / expected_factor
+            years = np.round(expected_lifetime)
+            matches = (
+                odd & ~fixed_lifetime & (years >= 1) &
+                (np.abs(expected_lifetime - lifetimes) > 0.6) & (np.abs(expected_lifetime - years) < 0.1))
+            fixed_lifetimes[matches] = years[matches]
+            fixed_lifetime |= matches
+        factor = np.where(fixed_lifetime, use_ratios * gwp_totals / (fixed_lifetimes * yearly_tecs), factor)
+
+        fixed_gwp_total = (factor > WRONG_TOTAL_FACTOR_RANGE[0]) & (factor < WRONG_TOTAL_FACTOR_RANGE[1])
+        fixed_gwp_totals = np.where(fixed_gwp_total, gwp_totals * BREAKDOWN_FACTOR / factor, gwp_totals)
+    return Fixes(fixed_gwp_totals, fixed_lifetimes, fixed_gwp_total, fixed_lifetime)
@@ -1,10 +1,11 @@
 """Helper modules to load a parser easily."""
+import importlib
 import io
 import json
 import sys
-from typing import Callable, BinaryIO, Iterator
+from typing import Callable, BinaryIO, Iterator, List
 
-from tools.parsers.lib.data import DeviceCarbonFootprint
+from tools.parsers.lib.data import DeviceCarbonFootprint, DeviceCarbonFootprintData
 
 
 def main(parse_func: Callable[[BinaryIO, str], Iterator[DeviceCarbonFootprint]]) -> None:
@@ -14,3 +15,13 @@ def main(parse_func: Callable[[BinaryIO, str], Iterator[DeviceCarbonFootprint]])
         body = io.BytesIO(file.read())
     for device in parse_func(body, filename):
         print(json.dumps(device.data, indent=2))
+
+
+def parse_bytes(parser_name: str, body: bytes, url: str) -> List[DeviceCarbonFootprintData]:
+    """Parse a document with the named parser.
+
+    This returns plain data, so that it can run in a worker process.
+    """
+    parse: Callable[[BinaryIO, str], Iterator[DeviceCarbonFootprint]] = getattr(
+        importlib.import_module(f'tools.parsers.{parser_name}'), 'parse')
+    return [device.data for device in parse(io.BytesIO(body), url)]
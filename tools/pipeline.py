@@ -0,0 +1,413 @@
+"""Refresh the data from PDF sources with a staged, pipelined runner.
+
+Each document goes through the stages fetch -> hash -> classify -> parse ->
+validate -> merge. The stages are connected by bounded queues: when a stage
+falls behind, the stages upstream wait, so memory stays bounded whatever the
+number of documents. Downloads run concurrently on asyncio, parsing runs in a
+process pool and a single task merges the results into the master table.
+
+    python -m tools.spiders.lib.sources -e boavizta-data-us.csv urls.txt | \\
+        python -m tools.pipeline - --master boavizta-data-us.csv -o merged.csv
+
+Each input line is a document URL (or a local path), optionally followed by
+the name of the parser to use. With --queue, documents are taken from (and
+their progress recorded in) a persistent job queue, see tools/jobs.py.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import re
+import sys
+import time
+import urllib.parse
+import urllib.request
+from concurrent import futures
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+from tools import jobs
+from tools import merge_csv
+from tools import name_index
+from tools.parsers.lib import data
+from tools.parsers.lib import loader
+
+# Parser to use for documents hosted on each manufacturer's site.
+PARSERS_BY_SITE = {
+    'apple.com': 'apple',
+    'dell.com': 'dell_laptop',
+    'delltechnologies.com': 'dell_laptop',
+    'google.com': 'google',
+    'gstatic.com': 'google',
+    'hp.com': 'hp_workplace',
+    'hpe.com': 'hpe',
+    'huawei.com': 'huawei',
+    'lenovo.com': 'lenovo',
+    'microsoft.com': 'microsoft',
+}
+
+_USER_AGENT = (
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36')
+
+
+class Document:
+    """A source document flowing through the pipeline."""
+
+    def __init__(self, url: str, parser: Optional[str] = None) -> None:
+        self.url = url
+        self.parser = parser
+        self.body = b''
+        self.sources_hash = ''
+        self.devices: List[data.DeviceCarbonFootprint] = []
+
+    def __repr__(self) -> str:
+        return f'Document({self.url!r})'
+
+
+class StageMetrics:
+    """Counters of one stage of the pipeline."""
+
+    def __init__(self, name: str, workers: int) -> None:
+        self.name = name
+        self.workers = workers
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.max_latency = 0.0
+        self.max_queue_depth = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'stage': self.name,
+            'workers': self.workers,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'mean_latency': round(self.busy_seconds / self.processed, 3) if self.processed else 0.0,
+            'max_latency': round(self.max_latency, 3),
+            'max_queue_depth': self.max_queue_depth,
+        }
+
+
+# A stage function processes a document, and returns None to drop it.
+_StageFunc = Callable[[Document], Awaitable[Optional[Document]]]
+
+
+def classify(url: str) -> Optional[str]:
+    """Find the parser for a document from its URL."""
+    host = (urllib.parse.urlsplit(url).hostname or '').lower()
+    site = '.'.join(host.split('.')[-2:])
+    return PARSERS_BY_SITE.get(site)
+
+
+def validate(device: data.DeviceCarbonFootprint) -> List[str]:
+    """List the problems preventing a parsed device to be merged."""
+    problems = []
+    for key in ('manufacturer', 'name'):
+        if not device.get(key):
+            problems.append(f'missing {key}')
+    gwp_total = device.get('gwp_total')
+    if not isinstance(gwp_total, (int, float)) or gwp_total <= 0:
+        problems.append(f'invalid gwp_total "{gwp_total}"')
+    for key in data.DeviceCarbonFootprintData.__annotations__:
+        value = device.get(key)
+        if key.endswith('_ratio') and isinstance(value, float) and not 0 <= value <= 1:
+            problems.append(f'{key} out of [0, 1]: {value}')
+    return problems
+
+
+def _download(url: str, timeout: float) -> bytes:
+    if not re.match(r'https?://', url):
+        with open(url, 'rb') as file:
+            return file.read()
+    request = urllib.request.Request(url, headers={'User-Agent': _USER_AGENT})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return bytes(response.read())
+
+
+# Minimal similarity of the names of a new device and of an existing one to report it as a likely duplicate.
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+
+class Pipeline:
+    """Fetch, parse and merge documents into a master table of devices.
+
+    The master table maps a key (see merge_csv.get_key) to a device, newly
+    parsed devices are merged in with priority over the existing data. If a
+    job queue is given, the state of each document is recorded in it. The
+    documents claimed by a worker from the queue have their lease renewed by
+    each stage.
+    """
+
+    def __init__(
+        self, master: Dict[str, data.DeviceCarbonFootprint], key: str = 'name',
+        fetch_workers: int = 8, parse_workers: int = 0, queue_size: int = 16,
+        timeout: float = 60, job_queue: Optional[jobs.JobQueue] = None,
+        worker: Optional[str] = None, lease_seconds: float = jobs.LEASE_SECONDS,
+    ) -> None:
+        self.master = master
+        self.job_queue = job_queue
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.key = key
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self._known_hashes: Set[str] = {
+            str(device.get('sources_hash')) for device in master.values() if device.get('sources_hash')}
+        self._parse_pool: Optional[futures.ProcessPoolExecutor] = None
+        # The names of the devices, to find the new devices which look like existing ones.
+        self._names = name_index.NameIndex()
+        self._labels: List[str] = []
+        for device in master.values():
+            self._add_name(device)
+        self.near_duplicates: List[Tuple[str, str, float]] = []
+        self.stages: List[Tuple[str, _StageFunc, int]] = [
+            ('fetch', self._fetch, fetch_workers),
+            ('hash', self._hash, 2),
+            ('classify', self._classify, 1),
+            ('parse', self._parse, self.parse_workers),
+            ('validate', self._validate, 1),
+            # A single writer for the master table.
+            ('merge', self._merge, 1),
+        ]
+        self.metrics = [StageMetrics(name, workers) for name, unused_func, workers in self.stages]
+
+    async def _fetch(self, document: Document) -> Document:
+        document.body = await asyncio.to_thread(_download, document.url, self.timeout)
+        return document
+
+    async def _hash(self, document: Document) -> Optional[Document]:
+        document.sources_hash = await asyncio.to_thread(data.md5, io.BytesIO(document.body))
+        if document.sources_hash in self._known_hashes:
+            logging.info('Source already existing: %s', document.url)
+            if self.job_queue:
+                self.job_queue.mark_parsed(document.url, [])
+            return None
+        # So that the same document under another URL is not parsed twice, forgotten if the parsing fails.
+        self._known_hashes.add(document.sources_hash)
+        if self.job_queue:
+            self.job_queue.mark_downloaded(document.url, document.sources_hash)
+        return document
+
+    async def _classify(self, document: Document) -> Optional[Document]:
+        if not document.body.startswith(b'%PDF'):
+            self._drop(document, 'Not a PDF')
+            return None
+        document.parser = document.parser or classify(document.url)
+        if not document.parser:
+            self._drop(document, 'No parser')
+            return None
+        return document
+
+    def _drop(self, document: Document, reason: str) -> None:
+        logging.warning('%s: %s', reason, document.url)
+        # The same document under another URL may still be parsed.
+        self._known_hashes.discard(document.sources_hash)
+        if self.job_queue:
+            self.job_queue.mark_failed(document.url, reason)
+
+    async def _parse(self, document: Document) -> Document:
+        assert self._parse_pool and document.parser
+        try:
+            devices = await asyncio.get_running_loop().run_in_executor(
+                self._parse_pool, loader.parse_bytes, document.parser, document.body, document.url)
+        except Exception:
+            self._known_hashes.discard(document.sources_hash)
+            raise
+        # The body is not needed anymore, free it as early as possible.
+        document.body = b''
+        for device_data in devices:
+            device = data.DeviceCarbonFootprint(device_data)
+            device.data['sources'] = document.url
+            device.data['sources_hash'] = document.sources_hash
+            # Clean the values up as the spiders do, so that the keys match the ones of the CSV files.
+            document.devices.append(device.reorder())
+        return document
+
+    async def _validate(self, document: Document) -> Optional[Document]:
+        valid_devices = []
+        for device in document.devices:
+            problems = validate(device)
+            if problems:
+                logging.warning('Invalid device in %s: %s', document.url, ', '.join(problems))
+            else:
+                valid_devices.append(device)
+        document.devices = valid_devices
+        if self.job_queue:
+            self.job_queue.mark_parsed(
+                document.url, [device.data for device in valid_devices], document.parser)
+        return document if valid_devices else None
+
+    def _add_name(self, device: data.DeviceCarbonFootprint) -> None:
+        self._names.add(str(device.get('manufacturer') or ''), str(device.get('name') or ''), len(self._labels))
+        self._labels.append(str(device.get('name')))
+
+    def _check_near_duplicate(self, device: data.DeviceCarbonFootprint) -> None:
+        """Record a new device if its name is close to an existing one, then index it."""
+        name = str(device.get('name') or '')
+        match = self._names.match(str(device.get('manufacturer') or ''), name, NEAR_DUPLICATE_THRESHOLD)
+        if match.rows:
+            existing = self._labels[match.rows[0]]
+            logging.warning('New device "%s" looks like "%s" (%.2f)', name, existing, match.score)
+            self.near_duplicates.append((name, existing, match.score))
+        self._add_name(device)
+
+    async def _merge(self, document: Document) -> Document:
+        for device in document.devices:
+            key = merge_csv.get_key(dict(device.data), self.key)
+            if key in self.master:
+                device, unused_report, unused_conflicts = data.DeviceCarbonFootprint.merge(
+                    self.master[key], device)
+            else:
+                self._check_near_duplicate(device)
+            self.master[key] = device
+        return document
+
+    async def _run_stage(
+        self, index: int, inbox: 'asyncio.Queue[Optional[Document]]',
+        outbox: 'Optional[asyncio.Queue[Optional[Document]]]',
+    ) -> None:
+        unused_name, func, workers = self.stages[index]
+        metrics = self.metrics[index]
+
+        async def _work() -> None:
+            while True:
+                metrics.max_queue_depth = max(metrics.max_queue_depth, inbox.qsize())
+                document = await inbox.get()
+                if document is None:
+                    return
+                if self.job_queue and self.worker and not self.job_queue.renew(
+                        document.url, self.worker, self.lease_seconds):
+                    # The lease expired and another worker took the document over.
+                    logging.warning('Lease lost for %s', document.url)
+                    metrics.dropped += 1
+                    continue
+                start = time.monotonic()
+                try:
+                    result = await func(document)
+                except Exception as error:  # pylint: disable=broad-except
+                    metrics.errors += 1
+                    logging.warning('%s failed for %s: %s', metrics.name, document.url, error)
+                    if self.job_queue:
+                        self.job_queue.mark_failed(document.url, f'{metrics.name}: {error}')
+                    continue
+                finally:
+                    latency = time.monotonic() - start
+                    metrics.busy_seconds += latency
+                    metrics.max_latency = max(metrics.max_latency, latency)
+                metrics.processed += 1
+                if result is None:
+                    metrics.dropped += 1
+                elif outbox is not None:
+                    await outbox.put(result)
+
+        await asyncio.gather(*(_work() for _ in range(workers)))
+        if outbox is not None:
+            # Stop the workers of the next stage.
+            for _ in range(self.stages[index + 1][2]):
+                await outbox.put(None)
+
+    async def run(self, documents: Iterable[Document]) -> None:
+        """Run all the documents through the pipeline."""
+        queues: List['asyncio.Queue[Optional[Document]]'] = [
+            asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+
+        async def _feed() -> None:
+            for document in documents:
+                await queues[0].put(document)
+            for _ in range(self.stages[0][2]):
+                await queues[0].put(None)
+
+        with futures.ProcessPoolExecutor(max_workers=self.parse_workers) as self._parse_pool:
+            await asyncio.gather(_feed(), *(
+                self._run_stage(index, queues[index], queues[index + 1] if index + 1 < len(queues) else None)
+                for index in range(len(self.stages))))
+        self._parse_pool = None
+
+    def report(self, output: TextIO) -> None:
+        output.write(
+            f'{"stage":<10} {"workers":>7} {"done":>6} {"dropped":>7} {"errors":>6} '
+            f'{"mean s":>8} {"max s":>8} {"max queue":>9}\n')
+        for metrics in self.metrics:
+            stats = metrics.as_dict()
+            output.write(
+                f'{stats["stage"]:<10} {stats["workers"]:>7} {stats["processed"]:>6} {stats["dropped"]:>7} '
+                f'{stats["errors"]:>6} {stats["mean_latency"]:>8} {stats["max_latency"]:>8} '
+                f'{stats["max_queue_depth"]:>9}\n')
+        if self.near_duplicates:
+            output.write(f'{len(self.near_duplicates)} new devices look like existing ones:\n')
+            for name, existing, score in self.near_duplicates:
+                output.write(f'  {name} ~ {existing} ({score:.2f})\n')
+
+
+def read_documents(lines: Iterable[str]) -> Iterator[Document]:
+    """Read documents from lines of "URL [parser]"."""
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        url, *parser = line.split()
+        yield Document(url, parser[0] if parser else None)
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Fetch, parse and merge PDF sources into a Boavizta csv file',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument(
+        'documents', nargs='?', help='File listing the documents to process, "-" for stdin')
+    argparser.add_argument('-m', '--master', help='Existing .csv file to merge the new devices into')
+    argparser.add_argument('-o', '--output', help='Output .csv file')
+    argparser.add_argument('-k', '--key', default='name', help='Name of the field used to find duplicates')
+    argparser.add_argument('--fetch_workers', default=8, type=int, help='Number of concurrent downloads')
+    argparser.add_argument('--parse_workers', default=0, type=int, help='Number of parsing processes (0 for one per CPU)')
+    argparser.add_argument('--queue_size', default=16, type=int, help='Size of the queue between two stages')
+    argparser.add_argument('--metrics', help='Write the per stage metrics as JSON to this file')
+    argparser.add_argument('--queue', help='Job queue to add the documents to and to process the jobs from')
+    argparser.add_argument('--worker', default=jobs.default_worker_name(), help='Name of this worker in the job queue')
+    args = argparser.parse_args(string_args)
+    if not args.documents and not args.queue:
+        argparser.error('Give either documents or a job queue to process')
+    logging.basicConfig(level=logging.INFO)
+
+    master: Dict[str, data.DeviceCarbonFootprint] = {}
+    if args.master:
+        for device in merge_csv.load_csv(args.master):
+            master[merge_csv.get_key(dict(device.data), args.key)] = device
+
+    job_queue = jobs.JobQueue(args.queue) if args.queue else None
+    pipeline = Pipeline(
+        master, key=args.key, fetch_workers=args.fetch_workers,
+        parse_workers=args.parse_workers, queue_size=args.queue_size, job_queue=job_queue, worker=args.worker)
+    if args.documents:
+        documents_file = sys.stdin if args.documents == '-' else open(args.documents, 'rt', encoding='utf-8')
+        with documents_file:
+            documents = list(read_documents(documents_file))
+    if job_queue:
+        if args.documents:
+            job_queue.add_many(jobs.Job(doc.url, doc.parser, jobs.DISCOVERED, 0) for doc in documents)
+        asyncio.run(pipeline.run(
+            Document(job.url, job.parser) for job in job_queue.iter_claims(args.worker)))
+        job_queue.close()
+    else:
+        asyncio.run(pipeline.run(documents))
+
+    if args.output and args.output != '-':
+        with open(args.output, 'w', encoding='utf-8') as output, data.CsvWriter(output) as writer:
+            writer.write_all(master.values())
+    else:
+        with data.CsvWriter(sys.stdout) as writer:
+            writer.write_all(master.values())
+
+    pipeline.report(sys.stderr)
+    if args.metrics:
+        with open(args.metrics, 'wt', encoding='utf-8') as metrics_file:
+            json.dump([metrics.as_dict() for metrics in pipeline.metrics], metrics_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+"""Columnar snapshots of the data files, to load them in milliseconds.
+
+A snapshot is a folder next to the CSV file (e.g. boavizta-data-us.csv.snapshot)
+with one .npy file per column, typed after DeviceCarbonFootprintData: floats
+with NaN for missing values, integers with a mask of the missing values and
+strings dictionary-encoded as codes into the array of their distinct values.
+Numbers which cannot be parsed are missing, and recorded with their text in
+the metadata.
+Unlike .npz archives, .npy files can be memory-mapped, so loading a snapshot
+reads nothing but its metadata until a column is used.
+
+Files in the FR format are read as well, their numbers converted. The
+snapshot is rebuilt transparently whenever the CSV file changes:
+
+    dataset = snapshot.load('boavizta-data-us.csv')
+    dataset.values('gwp_total')
+    dataframe = dataset.to_dataframe()
+"""
+import argparse
+import io
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar, cast
+
+import numpy as np
+
+from tools import convert_csv
+from tools.parsers.lib import data
+
+# Bump when the format of the snapshot changes.
+_VERSION = 3
+_META_FILE = 'meta.json'
+_KINDS = {str: 'str', float: 'float', int: 'int'}
+
+_T = TypeVar('_T')
+
+
+def snapshot_path(csv_path: str) -> str:
+    return f'{csv_path}.snapshot'
+
+
+def _to_float(value: str) -> float:
+    return float(value) if value else math.nan
+
+
+def _to_int(value: str) -> Optional[int]:
+    return int(re.sub(r'\.0*$', '', value)) if value else None
+
+
+def _parse_numbers(
+    texts: List[str], to_number: Callable[[str], _T], missing: _T,
+) -> Tuple[List[_T], List[Tuple[int, str]]]:
+    """Parse the cells of a numeric column, and list the rows and texts of those which are not numbers."""
+    numbers: List[_T] = []
+    malformed: List[Tuple[int, str]] = []
+    for row, text in enumerate(texts):
+        try:
+            numbers.append(to_number(text))
+        except ValueError:
+            numbers.append(missing)
+            malformed.append((row, text))
+    return numbers, malformed
+
+
+class Snapshot:
+    """A memory-mapped columnar snapshot of a data file."""
+
+    def __init__(self, folder: str, meta: Dict[str, Any]) -> None:
+        self.folder = folder
+        self.meta = meta
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return int(self.meta['rows'])
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self.meta['fields'])
+
+    def _array(self, name: str) -> np.ndarray:
+        if name not in self._arrays:
+            path = os.path.join(self.folder, f'{name}.npy')
+            try:
+                self._arrays[name] = np.load(path, mmap_mode='r', allow_pickle=False)
+            except ValueError:
+                # Empty arrays cannot be memory-mapped.
+                self._arrays[name] = np.load(path, allow_pickle=False)
+        return self._arrays[name]
+
+    def _kind(self, field: str) -> str:
+        if field not in self.meta['fields']:
+            raise ValueError(f'DeviceCarbonFootprint has no such field "{field}"')
+        return str(self.meta['fields'][field])
+
+    def codes(self, field: str) -> np.ndarray:
+        """Codes of a string column in its categories, -1 for missing values."""
+        return self._array(f'{field}.codes')
+
+    def categories(self, field: str) -> np.ndarray:
+        """The distinct values of a string column, sorted."""
+        return self._array(f'{field}.categories')
+
+    def missing(self, field: str) -> np.ndarray:
+        """A boolean array telling which values are missing in a column."""
+        kind = self._kind(field)
+        if kind == 'str':
+            return np.asarray(self.codes(field) < 0)
+        if kind == 'float':
+            return np.isnan(self._array(field))
+        return np.asarray(self._array(f'{field}.missing'))
+
+    def malformed(self, field: str) -> Dict[int, str]:
+        """The texts of the cells of a numeric column which are not numbers, by row: their values are missing."""
+        self._kind(field)
+        return {int(row): str(text) for row, text in self.meta['malformed'].get(field, [])}
+
+    def values(self, field: str) -> np.ndarray:
+        """The values of a column: missing strings are empty, missing integers are 0."""
+        if self._kind(field) == 'str':
+            categories = np.append(self.categories(field), '')
+            return categories[self.codes(field)]
+        return self._array(field)
+
+    def devices(self) -> Iterator[data.DeviceCarbonFootprint]:
+        columns = {field: self.values(field).tolist() for field in self.fields}
+        missing = {field: self.missing(field).tolist() for field in self.fields}
+        for index in range(len(self)):
+            yield data.DeviceCarbonFootprint(cast(data.DeviceCarbonFootprintData, {
+                field: columns[field][index] for field in self.fields if not missing[field][index]}))
+
+    def to_dataframe(self) -> Any:
+        """A pandas DataFrame of the snapshot, with categorical string columns."""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+
+        columns: Dict[str, Any] = {}
+        for field in self.fields:
+            kind = self._kind(field)
+            if kind == 'str':
+                columns[field] = pd.Categorical.from_codes(
+                    np.asarray(self.codes(field)), categories=np.asarray(self.categories(field)))
+            elif kind == 'int':
+                columns[field] = pd.arrays.IntegerArray(
+                    np.asarray(self._array(field)), np.asarray(self.missing(field)))
+            else:
+                columns[field] = self._array(field)
+        return pd.DataFrame(columns)
+
+
+def _read_meta(folder: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(folder, _META_FILE), 'rt', encoding='utf-8') as meta_file:
+            meta: Dict[str, Any] = json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == _VERSION else None
+
+
+def _write_meta(folder: str, meta: Dict[str, Any]) -> None:
+    tmp_path = os.path.join(folder, f'{_META_FILE}.{os.getpid()}')
+    with open(tmp_path, 'wt', encoding='utf-8') as meta_file:
+        json.dump(meta, meta_file, indent=2)
+    os.replace(tmp_path, os.path.join(folder, _META_FILE))
+
+
+def build(csv_path: str) -> Snapshot:
+    """Compile a CSV data file into a snapshot next to it."""
+    stat = os.stat(csv_path)
+    with open(csv_path, 'rb') as csv_file:
+        content = csv_file.read()
+    text = io.StringIO(content.decode('utf-8'), newline='')
+    csv_format = convert_csv.detect_format(text)
+    reader = convert_csv.reader(text, csv_format)
+    headers: List[str] = next(reader, [])
+    to_us = convert_csv.RowConverter(headers, csv_format, 'us')
+    rows = [dict(zip(headers, to_us(row))) for row in reader if row and row != headers]
+
+    folder = snapshot_path(csv_path)
+    tmp_folder = f'{folder}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_folder, ignore_errors=True)
+    os.makedirs(tmp_folder)
+    fields: Dict[str, str] = {}
+    malformed: Dict[str, List[Tuple[int, str]]] = {}
+    for field, field_type in data.DeviceCarbonFootprintData.__annotations__.items():
+        kind = fields[field] = _KINDS[field_type]
+        texts = [(row.get(field) or '').strip() for row in rows]
+        arrays: Dict[str, np.ndarray] = {}
+        if kind == 'str':
+            categories = sorted({text for text in texts if text})
+            index = {category: code for code, category in enumerate(categories)}
+            arrays[f'{field}.codes'] = np.array([index.get(text, -1) for text in texts], dtype=np.int32)
+            arrays[f'{field}.categories'] = np.array(categories, dtype=str)
+        elif kind == 'float':
+            floats, malformed[field] = _parse_numbers(texts, _to_float, math.nan)
+            arrays[field] = np.array(floats, dtype=np.float64)
+        else:
+            ints, malformed[field] = _parse_numbers(texts, _to_int, None)
+            arrays[field] = np.array([value or 0 for value in ints], dtype=np.int64)
+            arrays[f'{field}.missing'] = np.array([value is None for value in ints], dtype=bool)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_folder, f'{name}.npy'), array, allow_pickle=False)
+    meta = {
+        'version': _VERSION,
+        'rows': len(rows),
+        'fields': fields,
+        'malformed': {field: cells for field, cells in malformed.items() if cells},
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'md5': data.md5(io.BytesIO(content)),
+    }
+    _write_meta(tmp_folder, meta)
+
+    # Swap the folders: readers of the previous snapshot keep their memory maps.
+    old_folder = f'{folder}.old-{os.getpid()}'
+    if os.path.exists(folder):
+        os.replace(folder, old_folder)
+    os.replace(tmp_folder, folder)
+    shutil.rmtree(old_folder, ignore_errors=True)
+    return Snapshot(folder, meta)
+
+
+def _up_to_date_snapshot(csv_path: str) -> Optional[Snapshot]:
+    folder = snapshot_path(csv_path)
+    meta = _read_meta(folder)
+    if not meta:
+        return None
+    stat = os.stat(csv_path)
+    if (meta['mtime_ns'], meta['size']) == (stat.st_mtime_ns, stat.st_size):
+        return Snapshot(folder, meta)
+    if meta['size'] == stat.st_size and data.md5_file(csv_path) == meta['md5']:
+        # Touched but unchanged.
+        meta['mtime_ns'] = stat.st_mtime_ns
+        _write_meta(folder, meta)
+        return Snapshot(folder, meta)
+    logging.info('%s changed, its snapshot is out of date', csv_path)
+    return None
+
+
+def is_up_to_date(csv_path: str) -> bool:
+    """Whether the snapshot of a CSV data file can be loaded without building it."""
+    return _up_to_date_snapshot(csv_path) is not None
+
+
+def load(csv_path: str) -> Snapshot:
+    """Load the snapshot of a CSV data file, (re)building it if needed.
+
+    The snapshot is valid if the CSV file has the same modification time and
+    size as when it was built, or else the same MD5 hash.
+    """
+    return _up_to_date_snapshot(csv_path) or build(csv_path)
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Build or refresh the columnar snapshots of Boavizta csv files',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument('files', nargs='+', help='.csv files to snapshot')
+    argparser.add_argument('-f', '--force', action='store_true', help='Rebuild even if the snapshots are up to date')
+    args = argparser.parse_args(string_args)
+    for csv_path in args.files:
+        start = time.monotonic()
+        snapshot = build(csv_path) if args.force else load(csv_path)
+        print(f'{snapshot.folder}: {len(snapshot)} rows in {(time.monotonic() - start) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
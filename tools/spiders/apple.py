@@ -10,15 +10,12 @@ Note that extracting the whole info is quite long, so be patient.
 """
 
 import csv
-import io
 import logging
 import time
 from os import link
-from typing import Any, Iterator
+from typing import Any, AsyncIterator, Iterator
 
 from tools.spiders.lib import spider
-from tools.parsers import apple
-from tools.parsers.lib import data
 
 import scrapy
 from scrapy import http
@@ -44,11 +41,9 @@ class AppleSpider(spider.BoaViztaSpider):
                     continue
                 yield scrapy.Request(pdf_url, callback=self.parse_carbon_footprint)
 
-    def parse_carbon_footprint(
+    async def parse_carbon_footprint(
         self, response: http.Response, **unused_kwargs: Any,
-    ) -> Iterator[Any]:
+    ) -> AsyncIterator[Any]:
         """Parse a Apple Product Carbon footprint document."""
-        for device in apple.parse(io.BytesIO(response.body), response.url):
-            device.data['sources'] = response.url
-            device.data['sources_hash']=data.md5(io.BytesIO(response.body))
+        for device in await self.parse_pdf('apple', response):
             yield device.reorder().data
@@ -13,21 +13,14 @@ This spider:
 Note that extracting the whole info is quite long, so be patient.
 """
 
-import io
 import re
 from os import link
-from typing import Any, Iterator
+from typing import Any, AsyncIterator, List
 
+from tools.spiders.lib import browsers
 from tools.spiders.lib import spider
-from tools.parsers import dell_laptop
-from tools.parsers.lib import data
 
 import scrapy
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 
 _INDEX_PAGE_URL = 'https://www.dell.com/en-us/dt/corporate/social-impact/advancing-sustainability/sustainable-products-and-services/product-carbon-footprints.htm'
 
@@ -44,20 +37,16 @@ class DellSpider(spider.BoaViztaSpider):
                   ('Storage', _INDEX_PAGE_URL + "#tab0=4"),
                   ('Thin client', _INDEX_PAGE_URL + "#tab0=5")]
 
+    def _list_tab_pdfs(self, browser: Any, url: str) -> List[str]:
+        browsers.open_page(browser, url, wait_for="//div[@class='list-component']", timeout=50)
+        return browsers.find_links(browser, "//a[contains(@href,'.pdf')]")
+
     def start_requests(self):
-        options = Options()
-        #options.add_argument("--headless")
-        browser = webdriver.Chrome(options=options)
-        pdfs={}
-        for subcategory,url in self.start_urls:
-            browser.get(url)
-            browser.refresh()
-            WebDriverWait(browser, 50).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'div[class=list-component]')))
-            all_pdfs = browser.find_elements(By.XPATH,"//a[contains(@href,'.pdf')]")
-            for i in all_pdfs:
-                url = i.get_attribute("href")
-            pdfs[subcategory] = [i.get_attribute("href") for i in all_pdfs]
-        for subcategory,pdf_group in pdfs.items():
+        # Tabs are explored in parallel by the browsers of the pool.
+        pdfs = self._listing_links(
+            [url for unused_subcategory, url in self.start_urls],
+            lambda urls: browsers.get_pool().map(self._list_tab_pdfs, urls))
+        for (subcategory, unused_url), pdf_group in zip(self.start_urls, pdfs):
             for pdf_link in pdf_group:
                 if (not 'lca-' in pdf_link) and (not 'Statement' in pdf_link) :
                     if (not 'http:' in pdf_link) and (not 'https:' in pdf_link):
@@ -67,13 +56,11 @@ class DellSpider(spider.BoaViztaSpider):
                     yield scrapy.Request(pdf_link, callback=self.parse_carbon_footprint,
                                          cb_kwargs=dict(subcategory=subcategory))
 
-    def parse_carbon_footprint(
+    async def parse_carbon_footprint(
         self, response, subcategory, **unused_kwargs: Any,
-    ) -> Iterator[Any]:
-        for device in dell_laptop.parse(io.BytesIO(response.body), response.url):
+    ) -> AsyncIterator[Any]:
+        for device in await self.parse_pdf('dell_laptop', response):
             device.data['manufacturer'] = "Dell"
-            device.data['sources'] = response.url
-            device.data['sources_hash'] = data.md5(io.BytesIO(response.body))
             device.data['subcategory'] = 'AllInOne' if _ALLINONE_PATTERN.search(device.data['name']) else subcategory
             device.data['category'] = 'Datacenter' if subcategory in ['Server','Storage'] else 'Workplace'
             yield device.reorder().data
@@ -1,12 +1,9 @@
-import io
-from typing import Any, Iterator
-from tools.parsers.lib import data
+from typing import Any, AsyncIterator, Iterator
 
 import scrapy
 from scrapy import http
 
 from tools.spiders.lib import spider
-from tools.parsers import google
 
 _INDEX_PAGE_URL = 'https://sustainability.google/reports/'
 
@@ -74,11 +71,9 @@ class GoogleSpider(spider.BoaViztaSpider):
             self.logger.error("No HTML content found inside main.js.")
 
 
-    def parse_carbon_footprint(
+    async def parse_carbon_footprint(
         self, response: http.Response, **unused_kwargs: Any,
-    ) -> Iterator[Any]:
+    ) -> AsyncIterator[Any]:
         """Parse a Google Product Carbon footprint document."""
-        for device in google.parse(io.BytesIO(response.body), response.url):
-            device.data['sources'] = response.url
-            device.data['sources_hash'] = data.md5(io.BytesIO(response.body))
+        for device in await self.parse_pdf('google', response):
             yield device.reorder().data
@@ -12,20 +12,16 @@ Note that extracting the whole info is quite long, so be patient.
 """
 
 import csv
-import io
 import logging
 import time
 from os import link
-from typing import Any, Iterator
+from typing import Any, AsyncIterator
 
+from tools.spiders.lib import browsers
 from tools.spiders.lib import spider
-from tools.parsers import hpe
-from tools.parsers.lib import data
 
 import scrapy
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
@@ -39,44 +35,43 @@ class DellSpider(spider.BoaViztaSpider):
 
     start_urls = [_INDEX_PAGE_URL]
 
+    def _find_download_link(self, browser: Any, link: str) -> str:
+        browsers.open_page(browser, link, wait_for="//*[@id='downloadPdfLink']")
+        return browser.find_element(By.ID,"downloadPdfLink").get_attribute("href")
+
     def start_requests(self):
-        options = Options()
-        #options.add_argument("--headless")
-        options.add_argument("--incognito")
-        browser = webdriver.Chrome(options=options)
-        pdfs=[]
-        for url in self.start_urls:
-            browser.get(url)
-            WebDriverWait(browser, 30).until(EC.presence_of_element_located((By.CLASS_NAME,"gsr-result-link")))
-            pdf_number=browser.find_element(By.CLASS_NAME,"gsr-list-header").text.replace(" Results for Documents","")
-            click_more=True
-            current=0
-            pdfs=[]
-            while click_more:
-                try:
-                    all_pdfs = browser.find_elements(By.CLASS_NAME,"gsr-result-link")
-                    pdfs.append([i.get_attribute("href") for i in all_pdfs])
-                    if (current + len(all_pdfs)) < int(pdf_number):
-                        browser.find_element(By.CLASS_NAME,"next").click()
-                        time.sleep(15)
-                        current=current+len(all_pdfs)
-                    else:
+        with browsers.get_pool().borrow() as browser:
+            for url in self.start_urls:
+                browsers.open_page(browser, url, wait_for="//*[contains(@class, 'gsr-result-link')]")
+                pdf_number=browser.find_element(By.CLASS_NAME,"gsr-list-header").text.replace(" Results for Documents","")
+                click_more=True
+                current=0
+                pdfs=[]
+                while click_more:
+                    try:
+                        all_pdfs = browser.find_elements(By.CLASS_NAME,"gsr-result-link")
+                        pdfs.append([i.get_attribute("href") for i in all_pdfs])
+                        if (current + len(all_pdfs)) < int(pdf_number):
+                            browser.find_element(By.CLASS_NAME,"next").click()
+                            # Wait for the results of the next page to replace the current ones.
+                            WebDriverWait(browser, 30).until(EC.staleness_of(all_pdfs[0]))
+                            WebDriverWait(browser, 30).until(EC.presence_of_element_located((By.CLASS_NAME,"gsr-result-link")))
+                            current=current+len(all_pdfs)
+                        else:
+                            click_more = False
+                    except TimeoutException:
                         click_more = False
-                except TimeoutException:
-                    click_more = False
-        for pdf_group in pdfs:
-            for link in pdf_group:
-                    browser.get(link)
-                    pdf_link=browser.find_element(By.ID,"downloadPdfLink").get_attribute("href")
-                    if self._should_skip(pdf_link):
-                        continue
-                    yield scrapy.Request(pdf_link, callback=self.parse_carbon_footprint)
+        # Document pages are explored in parallel by the browsers of the pool.
+        pdf_links = browsers.get_pool().map(
+            self._find_download_link, [link for pdf_group in pdfs for link in pdf_group])
+        for pdf_link in pdf_links:
+            if self._should_skip(pdf_link):
+                continue
+            yield scrapy.Request(pdf_link, callback=self.parse_carbon_footprint)
 
-    def parse_carbon_footprint(
+    async def parse_carbon_footprint(
         self, response, **unused_kwargs: Any,
-    ) -> Iterator[Any]:
-        for device in hpe.parse(io.BytesIO(response.body), response.url):
+    ) -> AsyncIterator[Any]:
+        for device in await self.parse_pdf('hpe', response):
             device.data['manufacturer'] = "HP"
-            device.data['sources'] = response.url
-            device.data['sources_hash']=data.md5(io.BytesIO(response.body))
             yield device.reorder().data
@@ -13,18 +13,15 @@ This spider:
 
 Note that extracting the whole info is quite long, so be patient.
 """
-import io
 import json
 import time
-from typing import Any, Iterator
+from typing import Any, AsyncIterator, Iterator
 from urllib import parse
-from tools.parsers.lib import data
 
 import scrapy
 from scrapy import http
 
 from tools.spiders.lib import spider
-from tools.parsers import huawei
 
 
 _INDEX_PAGE_URL = 'https://consumer.huawei.com/en/support/product-environmental-information/'
@@ -38,6 +35,9 @@ class HPSpider(spider.BoaViztaSpider):
 
     start_urls = [_INDEX_PAGE_URL]
 
+    # The JSONP API is slow to answer, be more patient before backing off.
+    crawl_profile = {'target_latency': 5.0}
+
     def _create_list_files_request(self, url: str, product_id: str) -> str:
         timestamp = int(time.time())
         request_data = {
@@ -75,11 +75,9 @@ class HPSpider(spider.BoaViztaSpider):
                     self._create_list_files_request(_LIST_FILES_URL, product['productId']),
                     callback=self.parse_list_models)
 
-    def parse_carbon_footprint(
+    async def parse_carbon_footprint(
         self, response: http.Response, **unused_kwargs: Any,
-    ) -> Iterator[Any]:
+    ) -> AsyncIterator[Any]:
         """Parse a Huwaei Product Carbon footprint document."""
-        for device in huawei.parse(io.BytesIO(response.body), response.url):
-            device.data['sources'] = response.url
-            device.data['sources_hash']=data.md5(io.BytesIO(response.body))
+        for device in await self.parse_pdf('huawei', response):
             yield device.data
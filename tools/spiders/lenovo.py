@@ -13,16 +13,14 @@ This spider:
 Note that extracting the whole info is quite long, so be patient.
 """
 import html
-import io
 import re
-from typing import Any, Iterator
-from tools.parsers.lib import data
+from typing import Any, Iterator, List
 
 import scrapy
 from scrapy import http
 
+from tools.spiders.lib import browsers
 from tools.spiders.lib import spider
-from tools.parsers import lenovo
 
 
 _INDEX_PAGE_URL = 'https://www.lenovo.com/us/en/compliance/eco-declaration'
@@ -111,48 +109,26 @@ _CATEGORIES = {
 #             yield device.reorder().data
 
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-import time
-
 class LenovoSpider(spider.BoaViztaSpider):
     name = 'Lenovo'
     start_urls = [_INDEX_PAGE_URL]
+    # Lenovo documents are served by a CDN which copes well with parallel downloads.
+    crawl_profile = {'max_concurrency': 12}
 
-    def parse(self, response, **unused_kwargs):
-        self.logger.info(f"Visited {response.url}")
-
-        # Set up Selenium browser
-        chrome_options = Options()
-        chrome_options.binary_location = '/Applications/Chromium.app/Contents/MacOS/Chromium'  # adjust if needed
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        browser = webdriver.Chrome(options=chrome_options)
-
-        browser.get(response.url)
-
-        # Wait for JS to load
-        time.sleep(3)
+    def _list_pdfs(self, urls: List[str]) -> List[List[str]]:
+        with browsers.get_pool().borrow() as browser:
+            return [
+                browsers.collect_links(
+                    browser, url, "//a[contains(concat(' ', @class, ' '), ' fbox ')]", cookie_timeout=3)
+                for url in urls]
 
-        # Accept cookies if button exists
-        try:
-            cookie_button = browser.find_element(By.ID, "onetrust-accept-btn-handler")
-            cookie_button.click()
-            time.sleep(1)
-        except Exception:
-            pass  # No cookie banner
-
-        # Get all PDF links
-        links = browser.find_elements(By.CSS_SELECTOR, "a.fbox")
+    def start_requests(self):
+        # The browser loads the landing page itself.
+        links = [link for links in self._listing_links(self.start_urls, self._list_pdfs) for link in links]
 
         self.logger.info(f"Found {len(links)} links!")
-    
-    
 
-        for link in links:
-            href = link.get_attribute("href")
+        for href in links:
             if self._should_skip(href):
                 continue
             yield scrapy.Request(
@@ -160,11 +136,7 @@ class LenovoSpider(spider.BoaViztaSpider):
                 callback=self.parse_carbon_footprint
             )
 
-        browser.quit()
-
-    def parse_carbon_footprint(self, response):
-        for device in lenovo.parse(io.BytesIO(response.body), response.url):
-            device.data['sources'] = response.url
-            device.data['sources_hash'] = data.md5(io.BytesIO(response.body))
+    async def parse_carbon_footprint(self, response):
+        for device in await self.parse_pdf('lenovo', response):
             yield device.reorder().data
 
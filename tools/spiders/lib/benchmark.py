@@ -0,0 +1,100 @@
+"""Benchmark spiders end to end on recorded crawls, without any network.
+
+First record the crawls (see replay.py), then run for instance:
+
+    python -m tools.spiders.lib.benchmark --archive archives tools/spiders/apple.py tools/spiders/dell.py
+
+Each spider runs in its own process, replaying its recorded crawl with the
+given simulated latency. The report gives the parsed PDFs per second, the CPU
+utilisation (of all the spider's processes, relative to the available CPUs)
+and the peak memory.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+
+def run_spider(
+    spider_file: str, archive: str, latency: float = 0, parse_workers: int = 0,
+    extra_settings: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Replay a spider in a sub process and measure it."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        stats_file = os.path.join(tmpdir, 'stats.json')
+        command = [
+            sys.executable, '-m', 'scrapy', 'runspider', spider_file, '-L', 'WARNING',
+            '-s', f'REPLAY_DIR={archive}',
+            '-s', f'REPLAY_LATENCY={latency}',
+            '-s', f'PARSE_WORKERS={parse_workers}',
+            '-s', f'THROUGHPUT_STATS_FILE={stats_file}',
+            '-s', 'AUTOTHROTTLE_ENABLED=0',
+            # Start from an empty source index so that no document is skipped.
+            '-a', f'source_index={os.path.join(tmpdir, "sources.sqlite")}',
+            '-o', os.path.join(tmpdir, 'items.jsonl'),
+        ]
+        for setting in extra_settings or []:
+            command.extend(['-s', setting])
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.getenv('PYTHONPATH')])))
+
+        start = time.monotonic()
+        process = subprocess.Popen(command, env=env)
+        # The usage of this process only (and of the parsing processes it waited for),
+        # not of the previous spiders as with getrusage(RUSAGE_CHILDREN).
+        unused_pid, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.monotonic() - start
+        process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, command)
+
+        with open(stats_file, 'rt', encoding='utf-8') as file:
+            stats = json.load(file)
+
+    cpu_time = usage.ru_utime + usage.ru_stime
+    # ru_maxrss is the peak of the spider's biggest process, in kB on Linux and in bytes on macOS.
+    max_rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return {
+        'spider': spider_file,
+        'seconds': round(elapsed, 2),
+        'pdfs': stats.get('throughput/pdfs', 0),
+        'items': stats.get('item_scraped_count', 0),
+        'pdfs_per_second': round(stats.get('throughput/pdfs', 0) / elapsed, 3),
+        'cpu_utilisation': round(cpu_time / elapsed / (os.cpu_count() or 1), 3),
+        'peak_rss_mb': round(max_rss_mb, 1),
+        'replay_misses': stats.get('replay/miss', 0),
+    }
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Benchmark spiders on recorded crawls',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument('spiders', nargs='+', help='Spider files to benchmark')
+    argparser.add_argument('--archive', required=True, help='Folder containing the recorded crawls')
+    argparser.add_argument('--latency', default=0, type=float, help='Simulated latency of each response, in seconds')
+    argparser.add_argument('--parse_workers', default=0, type=int, help='Number of parsing processes (0 for one per CPU)')
+    argparser.add_argument('-s', '--set', action='append', default=[], help='Extra Scrapy setting NAME=VALUE')
+    argparser.add_argument('--json', action='store_true', help='Output the results as JSON')
+    args = argparser.parse_args(string_args)
+
+    results = [
+        run_spider(spider_file, args.archive, args.latency, args.parse_workers, args.set)
+        for spider_file in args.spiders
+    ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{"spider":<30} {"seconds":>8} {"pdfs":>5} {"items":>6} {"pdfs/s":>7} {"cpu":>6} {"rss MB":>7}')
+    for result in results:
+        print(
+            f'{os.path.basename(result["spider"]):<30} {result["seconds"]:>8} {result["pdfs"]:>5} '
+            f'{result["items"]:>6} {result["pdfs_per_second"]:>7} {result["cpu_utilisation"]:>6.0%} '
+            f'{result["peak_rss_mb"]:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""A pool of reusable headless browsers for the JavaScript driven listing pages.
+
+Spiders and monitoring scripts borrow browsers from the pool instead of
+starting their own Chrome each time:
+
+    links = browsers.get_pool().map(
+        lambda browser, url: browsers.collect_links(browser, url, "//a[contains(@href,'.pdf')]"),
+        urls)
+
+Browsers are headless by default, set BOAVIZTA_BROWSER_HEADLESS=0 to watch
+them, and BOAVIZTA_CHROME_BINARY to use another Chrome/Chromium binary.
+"""
+import atexit
+import contextlib
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from concurrent import futures
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+_T = TypeVar('_T')
+_R = TypeVar('_R')
+
+_COOKIE_BUTTON_ID = 'onetrust-accept-btn-handler'
+
+
+def _default_options(headless: bool, binary_location: Optional[str], user_data_dir: str) -> Options:
+    options = Options()
+    if binary_location:
+        options.binary_location = binary_location
+    if headless:
+        options.add_argument('--headless=new')
+    options.add_argument('--incognito')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--window-size=1920,1080')
+    # A fresh profile per browser, so that parallel browsers do not share state.
+    options.add_argument(f'--user-data-dir={user_data_dir}')
+    return options
+
+
+def _is_alive(browser: webdriver.Chrome) -> bool:
+    try:
+        browser.current_url  # pylint: disable=pointless-statement
+        return True
+    except WebDriverException:
+        return False
+
+
+class BrowserPool:
+    """A fixed size pool of Chrome browsers, started lazily and reused."""
+
+    def __init__(
+        self, size: int = 2, headless: bool = True, binary_location: Optional[str] = None,
+        page_load_timeout: float = 60,
+    ) -> None:
+        self.size = size
+        self.headless = headless
+        self.binary_location = binary_location
+        self.page_load_timeout = page_load_timeout
+        self._idle: 'queue.Queue[webdriver.Chrome]' = queue.Queue()
+        self._all: List[webdriver.Chrome] = []
+        # The profile directory of each browser, removed when it quits.
+        self._profiles: Dict[webdriver.Chrome, str] = {}
+        self._lock = threading.Lock()
+        # At most `size` browsers are borrowed at the same time.
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _start_browser(self) -> webdriver.Chrome:
+        profile = tempfile.mkdtemp(prefix='boavizta-chrome-')
+        try:
+            browser = webdriver.Chrome(options=_default_options(self.headless, self.binary_location, profile))
+        except Exception:
+            shutil.rmtree(profile, ignore_errors=True)
+            raise
+        self._profiles[browser] = profile
+        browser.set_page_load_timeout(self.page_load_timeout)
+        return browser
+
+    def _quit(self, browser: webdriver.Chrome) -> None:
+        with contextlib.suppress(WebDriverException):
+            browser.quit()
+        profile = self._profiles.pop(browser, None)
+        if profile:
+            shutil.rmtree(profile, ignore_errors=True)
+
+    @contextlib.contextmanager
+    def borrow(self) -> Iterator[webdriver.Chrome]:
+        """Borrow a browser for the duration of a with block."""
+        with self._slots:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                browser = self._start_browser()
+                with self._lock:
+                    self._all.append(browser)
+            try:
+                yield browser
+            finally:
+                if _is_alive(browser):
+                    self._idle.put(browser)
+                else:
+                    # The browser crashed, a new one will be started when needed.
+                    with self._lock:
+                        self._all.remove(browser)
+                    self._quit(browser)
+
+    def map(self, func: Callable[[webdriver.Chrome, _T], _R], items: Iterable[_T]) -> List[_R]:
+        """Run func(browser, item) for each item, in parallel on the browsers of the pool."""
+        items = list(items)
+
+        def _run(item: _T) -> _R:
+            with self.borrow() as browser:
+                return func(browser, item)
+
+        with futures.ThreadPoolExecutor(max_workers=min(self.size, len(items)) or 1) as executor:
+            return list(executor.map(_run, items))
+
+    def close(self) -> None:
+        with self._lock:
+            browsers, self._all = self._all, []
+        for browser in browsers:
+            self._quit(browser)
+        self._idle = queue.Queue()
+
+
+_POOL: Optional[BrowserPool] = None
+
+
+def get_pool() -> BrowserPool:
+    """Get the browser pool shared by the whole process."""
+    global _POOL  # pylint: disable=global-statement
+    if _POOL is None:
+        _POOL = BrowserPool(
+            size=int(os.getenv('BOAVIZTA_BROWSER_POOL_SIZE', '3')),
+            headless=os.getenv('BOAVIZTA_BROWSER_HEADLESS', '1') != '0',
+            binary_location=os.getenv('BOAVIZTA_CHROME_BINARY') or None)
+        atexit.register(_POOL.close)
+    return _POOL
+
+
+def open_page(
+    browser: webdriver.Chrome, url: str, wait_for: Optional[str] = None, timeout: float = 30,
+    cookie_timeout: float = 0,
+) -> None:
+    """Load a page in a browser and wait for an element (XPath) to be present.
+
+    With a cookie_timeout, also wait that long for a cookie banner and accept it.
+    """
+    # Go through a blank page so that URLs only differing by their fragment are reloaded.
+    browser.get('about:blank')
+    browser.get(url)
+    if wait_for:
+        WebDriverWait(browser, timeout).until(EC.presence_of_element_located((By.XPATH, wait_for)))
+    if cookie_timeout:
+        accept_cookies(browser, timeout=cookie_timeout)
+
+
+def accept_cookies(browser: webdriver.Chrome, timeout: float) -> None:
+    """Click on the cookie banner if there is one."""
+    try:
+        WebDriverWait(browser, timeout).until(
+            EC.element_to_be_clickable((By.ID, _COOKIE_BUTTON_ID))).click()
+        WebDriverWait(browser, timeout).until(EC.invisibility_of_element_located((By.ID, _COOKIE_BUTTON_ID)))
+    except TimeoutException:
+        pass
+
+
+def find_links(browser: webdriver.Chrome, xpath: str) -> List[str]:
+    """List the href of all links matching an XPath."""
+    return [href for href in (link.get_attribute('href') for link in browser.find_elements(By.XPATH, xpath)) if href]
+
+
+def collect_links(
+    browser: webdriver.Chrome, url: str, xpath: str, wait_for: Optional[str] = None, timeout: float = 30,
+    cookie_timeout: float = 0,
+) -> List[str]:
+    """Open a page and list the href of the links matching an XPath once they are loaded."""
+    open_page(browser, url, wait_for=wait_for or xpath, timeout=timeout, cookie_timeout=cookie_timeout)
+    return find_links(browser, xpath)
+
+
+def click_until_exhausted(
+    browser: webdriver.Chrome, button_xpath: str, item_xpath: str, timeout: float = 30,
+    overlay_id: Optional[str] = None, button_timeout: float = 5,
+) -> int:
+    """Click a "Load More" button until it disappears or stops loading new items.
+
+    Instead of sleeping, wait for the number of items to grow after each click.
+    Returns the final number of items.
+    """
+    def _count() -> int:
+        return len(browser.find_elements(By.XPATH, item_xpath))
+
+    count = _count()
+    while True:
+        if overlay_id:
+            WebDriverWait(browser, timeout).until(EC.invisibility_of_element_located((By.ID, overlay_id)))
+        try:
+            button = WebDriverWait(browser, button_timeout).until(EC.element_to_be_clickable((By.XPATH, button_xpath)))
+        except TimeoutException:
+            return count
+        button.click()
+        try:
+            WebDriverWait(browser, timeout).until(lambda unused: _count() > count)
+        except TimeoutException:
+            return _count()
+        count = _count()
@@ -0,0 +1,168 @@
+"""HTTP cache for the spiders' documents.
+
+Enable it with `-s HTTPCACHE_ENABLED=1`. Responses bodies are stored once per
+content hash (the same md5 as the `sources_hash` column) in a shared folder,
+and each spider keeps a small SQLite index from canonical URLs to hashes. So a
+PDF served under several URLs (e.g. HP GetDocument links with various query
+strings) is stored once.
+
+Cached documents are revalidated with their ETag / Last-Modified validators
+when they have some. Use `-s HTTPCACHE_OFFLINE=1` to only use the cache: no
+revalidation, and requests missing from the cache are ignored.
+
+The links found in listing pages rendered by a browser are cached as well
+(see BoaViztaSpider._listing_links), so an offline crawl needs no browser.
+"""
+import io
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+import scrapy
+from scrapy import http
+from scrapy.extensions.httpcache import RFC2616Policy
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from w3lib.url import canonicalize_url
+
+from tools.parsers.lib import data
+
+
+def is_document(response: http.Response) -> bool:
+    """Whether a response is a carbon footprint document rather than a listing page."""
+    return '.pdf' in response.url.lower() or response.body[:4] == b'%PDF'
+
+
+class PdfCachePolicy(RFC2616Policy):
+    """Cache policy for the spiders.
+
+    Documents are always cached. Other pages (listing pages) follow the
+    RFC2616 rules, so they are only kept when they can be revalidated.
+    """
+
+    def __init__(self, settings: Any) -> None:
+        super().__init__(settings)
+        self.offline = settings.getbool('HTTPCACHE_OFFLINE')
+
+    def should_cache_response(self, response: http.Response, request: scrapy.Request) -> bool:
+        if response.status == 200 and is_document(response):
+            return b'no-store' not in self._parse_cachecontrol(response)
+        return super().should_cache_response(response, request)
+
+    def is_cached_response_fresh(self, cachedresponse: http.Response, request: scrapy.Request) -> bool:
+        if self.offline:
+            return True
+        if is_document(cachedresponse):
+            headers = cachedresponse.headers
+            cc = self._parse_cachecontrol(cachedresponse)
+            if not any(key in headers for key in (b'ETag', b'Last-Modified', b'Expires')) and b'max-age' not in cc:
+                # Nothing to revalidate with: documents are considered immutable.
+                return True
+        return super().is_cached_response_fresh(cachedresponse, request)
+
+    def is_cached_response_valid(
+        self, cachedresponse: http.Response, response: http.Response, request: scrapy.Request,
+    ) -> bool:
+        if self.offline:
+            return True
+        return super().is_cached_response_valid(cachedresponse, response, request)
+
+
+class ContentAddressedCacheStorage:
+    """A Scrapy HTTP cache storage deduplicating bodies by content hash."""
+
+    def __init__(self, settings: Any) -> None:
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'])
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self._db: Optional[sqlite3.Connection] = None
+
+    def open_spider(self, spider: scrapy.Spider) -> None:
+        spider_dir = os.path.join(self.cachedir, spider.name)
+        os.makedirs(spider_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(spider_dir, 'index.sqlite'))
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, '
+            'body_hash TEXT, timestamp REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_body_hash ON responses (body_hash)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS listings (url TEXT PRIMARY KEY, links TEXT, timestamp REAL)')
+        logging.debug('Using content addressed cache storage in %s', self.cachedir)
+
+    def close_spider(self, spider: scrapy.Spider) -> None:
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+    def _key(self, request: scrapy.Request) -> str:
+        return f'{request.method} {canonicalize_url(request.url)}'
+
+    def _blob_path(self, body_hash: str) -> str:
+        return os.path.join(self.cachedir, 'blobs', body_hash[:2], body_hash)
+
+    def retrieve_response(self, spider: scrapy.Spider, request: scrapy.Request) -> Optional[http.Response]:
+        """Return response if present in cache, or None otherwise."""
+        assert self._db is not None
+        row = self._db.execute(
+            'SELECT url, status, headers, body_hash, timestamp FROM responses WHERE key = ?',
+            (self._key(request),)).fetchone()
+        if row is None:
+            return None
+        url, status, raw_headers, body_hash, timestamp = row
+        if 0 < self.expiration_secs < time.time() - timestamp:
+            return None
+        try:
+            with open(self._blob_path(body_hash), 'rb') as blob:
+                body = blob.read()
+        except FileNotFoundError:
+            return None
+        headers = Headers(json.loads(raw_headers))
+        request.meta['cache_timestamp'] = timestamp
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider: scrapy.Spider, request: scrapy.Request, response: http.Response) -> None:
+        """Store the given response in the cache."""
+        assert self._db is not None
+        body_hash = data.md5(io.BytesIO(response.body))
+        blob_path = self._blob_path(body_hash)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            # Write then rename so that a crash never leaves a truncated blob.
+            with open(blob_path + '.tmp', 'wb') as blob:
+                blob.write(response.body)
+            os.replace(blob_path + '.tmp', blob_path)
+        headers: Dict[str, List[str]] = {
+            key.decode('latin1'): [value.decode('latin1') for value in values]
+            for key, values in response.headers.items()
+        }
+        self._db.execute(
+            'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+            (self._key(request), response.url, response.status, json.dumps(headers),
+             body_hash, time.time()))
+        self._db.commit()
+
+    def retrieve_links(self, url: str) -> Optional[List[str]]:
+        """Return the links found in a listing page if present in cache, or None otherwise."""
+        assert self._db is not None
+        row = self._db.execute('SELECT links, timestamp FROM listings WHERE url = ?', (url,)).fetchone()
+        if row is None or 0 < self.expiration_secs < time.time() - row[1]:
+            return None
+        return list(json.loads(row[0]))
+
+    def store_links(self, url: str, links: List[str]) -> None:
+        """Store the links found in a listing page, the URL keeping its fragment (e.g. a tab)."""
+        assert self._db is not None
+        self._db.execute(
+            'INSERT OR REPLACE INTO listings VALUES (?, ?, ?)', (url, json.dumps(links), time.time()))
+        self._db.commit()
+
+    def urls_for_hash(self, body_hash: str) -> List[str]:
+        """List the cached URLs serving a given content."""
+        assert self._db is not None
+        return [url for url, in self._db.execute(
+            'SELECT url FROM responses WHERE body_hash = ?', (body_hash,))]
@@ -0,0 +1,179 @@
+"""Record and replay crawls, to run spiders without any network.
+
+Record a crawl into an archive folder (shared by all spiders):
+
+    PYTHONPATH=. scrapy runspider tools/spiders/apple.py -s REPLAY_RECORD_DIR=archives
+
+Then replay it, optionally simulating the latency of the servers:
+
+    PYTHONPATH=. scrapy runspider tools/spiders/apple.py -s REPLAY_DIR=archives -s REPLAY_LATENCY=0.5
+
+The archive contains all the downloaded responses (stored as in the HTTP
+cache, see cache.py) and the start requests of the spider. The latter are
+replayed instead of calling the spider's start_requests, so the spiders
+discovering their documents with a browser do not need one when replaying.
+
+A crawl is either recorded or replayed: REPLAY_RECORD_DIR is ignored, with a
+warning, when REPLAY_DIR is set.
+"""
+import logging
+import os
+import pickle
+from typing import Any, AsyncIterator, Iterable, Iterator, List, Optional
+
+import scrapy
+from scrapy import http, signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.utils.defer import maybe_deferred_to_future
+from scrapy.utils.request import request_from_dict
+from twisted.internet import reactor, task
+
+from tools.spiders.lib import cache
+
+_START_REQUESTS_FILE = 'start_requests.pickle'
+
+
+class ResponseArchive(cache.ContentAddressedCacheStorage):
+    """The responses of a recorded crawl, stored in a given folder."""
+
+    def __init__(self, path: str) -> None:  # pylint: disable=super-init-not-called
+        self.cachedir = path
+        self.expiration_secs = 0
+        self._db = None
+
+
+def _start_requests_path(folder: str, spider: scrapy.Spider) -> str:
+    return os.path.join(folder, spider.name, _START_REQUESTS_FILE)
+
+
+def _record_dir(settings: Any) -> str:
+    """The folder in which to record the crawl, if it is recorded."""
+    folder = settings.get('REPLAY_RECORD_DIR')
+    if not folder:
+        raise NotConfigured
+    if settings.get('REPLAY_DIR'):
+        logging.warning('A replayed crawl is not recorded: REPLAY_RECORD_DIR is ignored')
+        raise NotConfigured
+    return str(folder)
+
+
+class RecordStartRequestsMiddleware:
+    """A spider middleware recording the start requests in an archive (REPLAY_RECORD_DIR)."""
+
+    def __init__(self, crawler: Any) -> None:
+        self.folder = _record_dir(crawler.settings)
+        self._start_requests: List[scrapy.Request] = []
+        crawler.signals.connect(self._spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler: Any) -> 'RecordStartRequestsMiddleware':
+        return cls(crawler)
+
+    def _spider_closed(self, spider: scrapy.Spider) -> None:
+        path = _start_requests_path(self.folder, spider)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as start_file:
+            pickle.dump([request.to_dict(spider=spider) for request in self._start_requests], start_file)
+
+    def process_start_requests(self, start_requests: Iterable[Any], spider: scrapy.Spider) -> Iterator[Any]:
+        for request in start_requests:
+            if isinstance(request, scrapy.Request):
+                self._start_requests.append(request)
+            yield request
+
+    async def process_start(self, start: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        async for request in start:
+            if isinstance(request, scrapy.Request):
+                self._start_requests.append(request)
+            yield request
+
+
+class ReplayStartRequestsMiddleware:
+    """A spider middleware replaying the start requests of an archive (REPLAY_DIR)."""
+
+    def __init__(self, crawler: Any) -> None:
+        self.folder = crawler.settings.get('REPLAY_DIR')
+        if not self.folder:
+            raise NotConfigured
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler: Any) -> 'ReplayStartRequestsMiddleware':
+        return cls(crawler)
+
+    def _load(self, spider: scrapy.Spider) -> List[scrapy.Request]:
+        with open(_start_requests_path(self.folder, spider), 'rb') as start_file:
+            return [request_from_dict(request, spider=spider) for request in pickle.load(start_file)]
+
+    def process_start_requests(self, start_requests: Iterable[Any], spider: scrapy.Spider) -> Iterator[Any]:
+        # Do not even iterate the spider's start requests: they might need a browser.
+        yield from self._load(spider)
+
+    async def process_start(self, start: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        for request in self._load(self.crawler.spider):
+            yield request
+
+
+class RecordMiddleware:
+    """A downloader middleware recording the responses in an archive (REPLAY_RECORD_DIR)."""
+
+    def __init__(self, crawler: Any) -> None:
+        self.archive = ResponseArchive(_record_dir(crawler.settings))
+        crawler.signals.connect(self._spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self._spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler: Any) -> 'RecordMiddleware':
+        return cls(crawler)
+
+    def _spider_opened(self, spider: scrapy.Spider) -> None:
+        self.archive.open_spider(spider)
+
+    def _spider_closed(self, spider: scrapy.Spider) -> None:
+        self.archive.close_spider(spider)
+        logging.info('Crawl recorded in %s', self.archive.cachedir)
+
+    def process_response(
+        self, request: scrapy.Request, response: http.Response, spider: scrapy.Spider,
+    ) -> http.Response:
+        self.archive.store_response(spider, request, response)
+        return response
+
+
+class ReplayMiddleware:
+    """A downloader middleware serving the responses of an archive (REPLAY_DIR).
+
+    Each response is served after REPLAY_LATENCY seconds, requests missing from
+    the archive are ignored.
+    """
+
+    def __init__(self, crawler: Any) -> None:
+        path = crawler.settings.get('REPLAY_DIR')
+        if not path:
+            raise NotConfigured
+        self.archive = ResponseArchive(path)
+        self.latency = crawler.settings.getfloat('REPLAY_LATENCY')
+        self.crawler = crawler
+        crawler.signals.connect(self._spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self._spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler: Any) -> 'ReplayMiddleware':
+        return cls(crawler)
+
+    def _spider_opened(self, spider: scrapy.Spider) -> None:
+        self.archive.open_spider(spider)
+
+    def _spider_closed(self, spider: scrapy.Spider) -> None:
+        self.archive.close_spider(spider)
+
+    async def process_request(self, request: scrapy.Request, spider: scrapy.Spider) -> Optional[http.Response]:
+        response = self.archive.retrieve_response(spider, request)
+        if response is None:
+            self.crawler.stats.inc_value('replay/miss')
+            raise IgnoreRequest(f'Not in the replay archive: {request.url}')
+        self.crawler.stats.inc_value('replay/hit')
+        if self.latency:
+            await maybe_deferred_to_future(task.deferLater(reactor, self.latency, lambda: None))
+        response.flags.append('replay')
+        return response
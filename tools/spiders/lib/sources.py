@@ -0,0 +1,210 @@
+"""A persistent index of the known sources, shared by spiders and monitoring tools.
+
+The index is a small SQLite file which maps known documents by:
+ - normalized URL (scheme, host case, query order and fragments do not matter),
+ - file name within a site (e.g. the same PDF served by several Lenovo CDN hosts),
+ - content hash (the `sources_hash` column).
+
+CSV files and blacklists are only re-read when they changed since the last
+sync, and spiders add their new sources as soon as the items are scraped.
+Sources scraped by previous runs are only skipped when asked for (e.g. to
+resume a crawl), and can be forgotten:
+
+    python -m tools.spiders.lib.sources --forget-scraped
+
+To check a list of URLs from a monitoring script:
+
+    python -m tools.spiders.lib.sources --existing boavizta-data-us.csv urls.txt
+"""
+import argparse
+import csv
+import functools
+import logging
+import os
+import posixpath
+import sqlite3
+import sys
+import uuid
+from typing import Any, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import tldextract
+
+DEFAULT_INDEX = os.path.join('.scrapy', 'sources.sqlite')
+# Prefix of the origin of the sources added by spiders, followed by the id of their run.
+SCRAPED = 'scraped'
+# Use the public suffix list shipped with tldextract, without any network access.
+_EXTRACT = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL so that trivial variants of a source share the same key."""
+    parts = urlsplit(url.strip())
+    scheme = 'https' if parts.scheme in ('', 'http', 'https') else parts.scheme
+    netloc = parts.netloc.lower()
+    if netloc.endswith(':443') or netloc.endswith(':80'):
+        netloc = netloc.rsplit(':', 1)[0]
+    path = parts.path.rstrip('/') or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+@functools.lru_cache(maxsize=1024)
+def _site(host: str) -> str:
+    """The registered domain of a host, e.g. apple.co.uk for www.apple.co.uk, or the host itself."""
+    extracted = _EXTRACT(host)
+    if not extracted.domain or not extracted.suffix:
+        return host
+    return f'{extracted.domain}.{extracted.suffix}'
+
+
+def _site_and_basename(url: str) -> Tuple[str, str]:
+    parts = urlsplit(url.strip())
+    # Only keep the registered domain so that CDN hosts of the same site match.
+    site = _site(parts.netloc.lower().split(':')[0])
+    return site, posixpath.basename(parts.path)
+
+
+class SourceIndex:
+    """The index of the sources which were already scraped or blacklisted.
+
+    The sources added during a run are always skipped by that run. Sources
+    added by previous runs are only skipped with skip_scraped: otherwise a new
+    crawl would skip everything the previous ones scraped.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX, skip_scraped: bool = False) -> None:
+        self.run_origin = f'{SCRAPED}:{uuid.uuid4().hex}'
+        # Filter of the sources to consider.
+        self._known = '1' if skip_scraped else f"(origin NOT LIKE '{SCRAPED}%' OR origin = '{self.run_origin}')"
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS sources (
+                url TEXT PRIMARY KEY, site TEXT, basename TEXT, sources_hash TEXT, origin TEXT);
+            CREATE INDEX IF NOT EXISTS sources_basename ON sources (basename, site);
+            CREATE INDEX IF NOT EXISTS sources_hash ON sources (sources_hash);
+            CREATE INDEX IF NOT EXISTS sources_origin ON sources (origin);
+            CREATE TABLE IF NOT EXISTS blacklist (basename TEXT PRIMARY KEY, origin TEXT);
+            CREATE TABLE IF NOT EXISTS synced_files (path TEXT PRIMARY KEY, mtime REAL, size INTEGER);
+        ''')
+
+    def close(self) -> None:
+        self._db.commit()
+        self._db.close()
+
+    def _is_synced(self, path: str) -> bool:
+        stat = os.stat(path)
+        row = self._db.execute(
+            'SELECT mtime, size FROM synced_files WHERE path = ?', (os.path.abspath(path),)).fetchone()
+        return row is not None and tuple(row) == (stat.st_mtime, stat.st_size)
+
+    def _mark_synced(self, path: str) -> None:
+        stat = os.stat(path)
+        self._db.execute(
+            'INSERT OR REPLACE INTO synced_files VALUES (?, ?, ?)',
+            (os.path.abspath(path), stat.st_mtime, stat.st_size))
+
+    def sync_csv(self, path: str) -> None:
+        """Load the sources of a dataset CSV file, if it changed since last time."""
+        if self._is_synced(path):
+            return
+        origin = os.path.abspath(path)
+        with self._db:
+            self._db.execute('DELETE FROM sources WHERE origin = ?', (origin,))
+            with open(path, 'rt', encoding='utf-8') as csv_file:
+                for row in csv.DictReader(csv_file):
+                    if row.get('sources'):
+                        self._add(row['sources'], row.get('sources_hash') or None, origin)
+            self._mark_synced(path)
+        logging.info('Source index synced with %s', path)
+
+    def sync_blacklist(self, path: str) -> None:
+        """Load a blacklist file (one file name per line), if it changed since last time."""
+        if self._is_synced(path):
+            return
+        origin = os.path.abspath(path)
+        with self._db:
+            self._db.execute('DELETE FROM blacklist WHERE origin = ?', (origin,))
+            with open(path, 'rt', encoding='utf-8') as blacklist_file:
+                self._db.executemany(
+                    'INSERT OR IGNORE INTO blacklist VALUES (?, ?)',
+                    ((line.strip(), origin) for line in blacklist_file if line.strip()))
+            self._mark_synced(path)
+
+    def _add(self, url: str, sources_hash: Optional[str], origin: str) -> None:
+        site, basename = _site_and_basename(url)
+        self._db.execute(
+            'INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)',
+            (normalize_url(url), site, basename, sources_hash, origin))
+
+    def add(self, url: str, sources_hash: Optional[str] = None, origin: Optional[str] = None) -> None:
+        """Record a new source, scraped by the current run if no origin is given."""
+        with self._db:
+            self._add(url, sources_hash, origin or self.run_origin)
+
+    def forget_scraped(self) -> int:
+        """Remove the sources added by spiders, and return how many they were."""
+        with self._db:
+            return self._db.execute('DELETE FROM sources WHERE origin LIKE ?', (f'{SCRAPED}%',)).rowcount
+
+    def why_skip(self, url: str) -> Optional[str]:
+        """Explain why a source should not be scraped again, or None if it should."""
+        site, basename = _site_and_basename(url)
+        if self._db.execute('SELECT 1 FROM blacklist WHERE basename = ?', (basename,)).fetchone():
+            return 'blacklisted'
+        if self._db.execute(
+                f'SELECT 1 FROM sources WHERE url = ? AND {self._known}', (normalize_url(url),)).fetchone():
+            return 'already existing'
+        if basename and self._db.execute(
+                f'SELECT 1 FROM sources WHERE basename = ? AND site = ? AND {self._known}',
+                (basename, site)).fetchone():
+            return 'already existing under another URL'
+        return None
+
+    def urls_for_hash(self, sources_hash: str) -> List[str]:
+        """List the known URLs of a document given its content hash."""
+        return [url for url, in self._db.execute(
+            f'SELECT url FROM sources WHERE sources_hash = ? AND {self._known}', (sources_hash,))]
+
+
+class SourceIndexPipeline:
+    """A Scrapy item pipeline recording the sources of scraped items in the spider's index."""
+
+    def process_item(self, item: Any, spider: Any) -> Any:
+        index = getattr(spider, 'source_index', None)
+        if index is not None and item.get('sources'):
+            index.add(item['sources'], item.get('sources_hash') or None)
+        return item
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Print the URLs which are not in the source index yet',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument('urls', nargs='?', help='File with one URL per line, defaults to stdin')
+    argparser.add_argument('--index', default=DEFAULT_INDEX, help='Path to the source index')
+    argparser.add_argument('-e', '--existing', action='append', default=[], help='Dataset .csv file to sync first')
+    argparser.add_argument('-b', '--blacklist', action='append', default=[], help='Blacklist file to sync first')
+    argparser.add_argument('--skip-scraped', action='store_true', help='Also filter out the URLs scraped by spiders')
+    argparser.add_argument('--forget-scraped', action='store_true', help='Remove the URLs scraped by spiders from the index and exit')
+    args = argparser.parse_args(string_args)
+    index = SourceIndex(args.index, skip_scraped=args.skip_scraped)
+    if args.forget_scraped:
+        print(f'{index.forget_scraped()} scraped sources forgotten')
+        index.close()
+        return
+    for existing in args.existing:
+        index.sync_csv(existing)
+    for blacklist in args.blacklist:
+        index.sync_blacklist(blacklist)
+    lines: Iterable[str] = open(args.urls, 'rt', encoding='utf-8') if args.urls else sys.stdin
+    for line in lines:
+        if line.strip() and not index.why_skip(line):
+            print(line.strip())
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,19 @@
-import csv
+import io
 import logging
-from typing import Any, Optional
-from scrapy.extensions.httpcache import DummyPolicy
-import os
-from urllib.parse import urlparse
+from concurrent import futures
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
 
 import scrapy
+from scrapy import http
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet import defer, reactor
+from twisted.python import failure
+
+from tools import jobs
+from tools.parsers.lib import data
+from tools.parsers.lib import loader
+from tools.spiders.lib import cache
+from tools.spiders.lib import sources
 
 
 class BoaViztaSpider(scrapy.Spider):
@@ -14,37 +22,185 @@ class BoaViztaSpider(scrapy.Spider):
         'USER_AGENT': (
             'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 '
             '(KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'),
-        'CONCURRENT_REQUESTS' : 1
+        # PDFs are parsed in a process pool (see parse_pdf) so downloads do not
+        # wait for parsing. Per domain concurrency starts low and is then tuned
+        # from the observed latencies and errors, see tools.spiders.lib.throttle.
+        'CONCURRENT_REQUESTS_PER_DOMAIN' : 2,
+        'AUTOTHROTTLE_ENABLED': True,
+        'AUTOTHROTTLE_TARGET_CONCURRENCY': 2.0,
+        'AUTOTHROTTLE_MAX_DELAY': 30.0,
+        'ADAPTIVE_CONCURRENCY_ENABLED': True,
+        'ADAPTIVE_CONCURRENCY_MAX': 8,
+        'ADAPTIVE_CONCURRENCY_TARGET_LATENCY': 2.0,
+        'THROUGHPUT_STATS_ENABLED': True,
+        'DOWNLOADER_MIDDLEWARES': {
+            'tools.spiders.lib.throttle.AdaptiveConcurrencyMiddleware': 880,
+            # Record (REPLAY_RECORD_DIR) or replay (REPLAY_DIR) crawls, never both, see replay.py.
+            'tools.spiders.lib.replay.RecordMiddleware': 950,
+            'tools.spiders.lib.replay.ReplayMiddleware': 960,
+        },
+        'SPIDER_MIDDLEWARES': {
+            'tools.spiders.lib.replay.RecordStartRequestsMiddleware': 10,
+            'tools.spiders.lib.replay.ReplayStartRequestsMiddleware': 11,
+        },
+        'ITEM_PIPELINES': {
+            'tools.spiders.lib.sources.SourceIndexPipeline': 900,
+        },
+        'EXTENSIONS': {
+            'tools.spiders.lib.throttle.ThroughputStats': 500,
+        },
+        # Used when the cache is enabled with -s HTTPCACHE_ENABLED=1.
+        'HTTPCACHE_POLICY': 'tools.spiders.lib.cache.PdfCachePolicy',
+        'HTTPCACHE_STORAGE': 'tools.spiders.lib.cache.ContentAddressedCacheStorage',
+        # Number of processes parsing PDFs, defaults to the number of CPUs.
+        'PARSE_WORKERS': 0,
     }
-    class CachePolicy(DummyPolicy):
-        def should_cache_response(self, response, request):
-            if '.pdf' in response.url:
-                return True
-            else:
-                return False
+    # Per spider overrides of the adaptive concurrency settings
+    # (min_concurrency, max_concurrency, target_latency).
+    crawl_profile: Dict[str, Any] = {}
+
+    CachePolicy = cache.PdfCachePolicy
 
-    def __init__(self, existing: Optional[str] = None, blacklist: Optional[str] = None, *args: Any, **kwargs: Any) -> None:
+    @classmethod
+    def update_settings(cls, settings: Any) -> None:
+        super().update_settings(settings)
+        if settings.getbool('HTTPCACHE_OFFLINE'):
+            # Cache-only mode: never hit the network.
+            settings.set('HTTPCACHE_ENABLED', True, priority='spider')
+            settings.set('HTTPCACHE_IGNORE_MISSING', True, priority='spider')
+
+    def __init__(
+        self, existing: Optional[str] = None, blacklist: Optional[str] = None,
+        source_index: str = sources.DEFAULT_INDEX, job_queue: Optional[str] = None,
+        skip_scraped: Optional[str] = None, *args: Any, **kwargs: Any,
+    ) -> None:
         super().__init__(*args, **kwargs)
-        self._existing_sources = set()
-        self._existing_blacklist = set()
+        self._parse_pool: Optional[futures.ProcessPoolExecutor] = None
+        # The index is shared between runs and spiders (pass another path with -a source_index=filename).
+        # Sources scraped by previous runs are only skipped with -a skip_scraped=1.
+        self.source_index = sources.SourceIndex(
+            source_index, skip_scraped=bool(skip_scraped) and skip_scraped != '0')
         if existing:
             # Load existing sources from CSV file (pass in argument with -a existing=filename.csv).
-            with open(existing, 'rt', encoding='utf-8') as existing_file:
-                reader = csv.DictReader(existing_file)
-                for row in reader:
-                    if row.get('sources'):
-                        self._existing_sources.add(os.path.basename(urlparse(row['sources']).path))
+            self.source_index.sync_csv(existing)
         if blacklist:
             # Load existing files to blacklist
-            with open(blacklist, 'rt', encoding='utf-8') as blacklist_file:
-                for line in blacklist_file:
-                    self._existing_blacklist.add(line.strip())
+            self.source_index.sync_blacklist(blacklist)
+        # Record the progress and results of the crawl, so that they survive an
+        # interruption (pass a path with -a job_queue=filename, see tools/jobs.py).
+        self.job_queue = jobs.JobQueue(job_queue) if job_queue else None
+
+    async def start(self) -> AsyncIterator[Any]:
+        # Scrapy 2.13 and later no longer call start_requests.
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self) -> Iterator[scrapy.Request]:
+        for url in self.start_urls:
+            yield scrapy.Request(url, dont_filter=True)
+
+    def _listing_links(self, urls: List[str], browse: Callable[[List[str]], List[List[str]]]) -> List[List[str]]:
+        """The links found by browse in each listing page, rendered by a browser.
+
+        With the HTTP cache, the links are cached as the documents are: an
+        offline crawl (HTTPCACHE_OFFLINE) reads them from the cache and never
+        starts a browser, listings missing from the cache are skipped.
+        """
+        if not self.settings.getbool('HTTPCACHE_ENABLED'):
+            return browse(urls)
+        storage = cache.ContentAddressedCacheStorage(self.settings)
+        storage.open_spider(self)
+        try:
+            if self.settings.getbool('HTTPCACHE_OFFLINE'):
+                links = [storage.retrieve_links(url) for url in urls]
+                for url, url_links in zip(urls, links):
+                    if url_links is None:
+                        logging.warning('Listing missing from the cache: %s', url)
+                return [url_links or [] for url_links in links]
+            browsed = browse(urls)
+            for url, url_links in zip(urls, browsed):
+                storage.store_links(url, url_links)
+            return browsed
+        finally:
+            storage.close_spider(self)
 
     def _should_skip(self, source: str) -> bool:
-        if os.path.basename(urlparse(source).path) in self._existing_sources:
-            logging.info('Source already existing: %s', source)
-            return True
-        if os.path.basename(urlparse(source).path) in self._existing_blacklist:
-            logging.info('Source is blacklisted: %s', source)
+        reason = self.source_index.why_skip(source)
+        if not reason and self.job_queue:
+            job = self.job_queue.get(source)
+            if job and job.state == jobs.PARSED:
+                reason = 'already parsed in the job queue'
+            elif not job:
+                self.job_queue.add(source)
+        if reason:
+            logging.info('Source %s: %s', reason, source)
             return True
         return False
+
+    @staticmethod
+    def _job_url(response: http.Response) -> str:
+        """The URL under which the document was queued by _should_skip: the one before any redirect."""
+        return str(response.meta.get('redirect_urls', [response.url])[0])
+
+    def _defer_parse(self, parser_name: str, response: http.Response) -> defer.Deferred:
+        """Submit a document to the parsing pool and get a deferred on its result."""
+        if self._parse_pool is None:
+            self._parse_pool = futures.ProcessPoolExecutor(
+                max_workers=self.settings.getint('PARSE_WORKERS') or None)
+        future = self._parse_pool.submit(loader.parse_bytes, parser_name, response.body, response.url)
+        deferred: defer.Deferred = defer.Deferred()
+
+        def _fire(done: futures.Future) -> None:
+            # Called from the pool's management thread: hand the result back to the reactor.
+            error = done.exception()
+            if error:
+                reactor.callFromThread(deferred.errback, failure.Failure(error))  # type: ignore [attr-defined]
+            else:
+                reactor.callFromThread(deferred.callback, done.result())  # type: ignore [attr-defined]
+
+        future.add_done_callback(_fire)
+        return deferred
+
+    async def parse_pdf(self, parser_name: str, response: http.Response) -> List[data.DeviceCarbonFootprint]:
+        """Parse a downloaded document with one of the tools.parsers modules.
+
+        The parsing (pdfminer, OpenCV, tesseract) runs in a separate process so
+        the reactor keeps downloading other documents in the meantime. Only the
+        hashing of the document stays in the reactor: it tells whether the
+        document needs parsing at all.
+        """
+        sources_hash = data.md5(io.BytesIO(response.body))
+        job_url = self._job_url(response)
+        known_urls = self.source_index.urls_for_hash(sources_hash)
+        if known_urls:
+            logging.info('Source already existing as %s: %s', known_urls[0], response.url)
+            self.source_index.add(response.url, sources_hash)
+            if self.job_queue:
+                self.job_queue.mark_parsed(job_url, [])
+            return []
+        if self.job_queue:
+            self.job_queue.add(job_url, parser_name)
+            self.job_queue.mark_downloaded(job_url, sources_hash)
+        try:
+            devices = await maybe_deferred_to_future(self._defer_parse(parser_name, response))
+        except Exception as error:
+            if self.job_queue:
+                self.job_queue.mark_failed(job_url, f'parse: {error}')
+            raise
+        results = []
+        for device_data in devices:
+            device = data.DeviceCarbonFootprint(device_data)
+            device.data['sources'] = response.url
+            device.data['sources_hash'] = sources_hash
+            results.append(device)
+        if self.job_queue:
+            self.job_queue.mark_parsed(job_url, [device.data for device in results], parser_name)
+        return results
+
+    def closed(self, reason: str) -> None:
+        self.source_index.close()
+        if self.job_queue:
+            self.job_queue.close()
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(cancel_futures=True)
+            self._parse_pool = None
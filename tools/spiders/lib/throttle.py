@@ -0,0 +1,163 @@
+"""Crawl profile helpers: adaptive per-domain concurrency and throughput stats.
+
+Both components are enabled by default in BoaViztaSpider.custom_settings. A
+spider can tune them with its `crawl_profile` attribute, e.g.
+
+    crawl_profile = {'max_concurrency': 8, 'target_latency': 1.0}
+"""
+import json
+import logging
+import time
+from typing import Any, Dict
+
+import scrapy
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+
+# Statuses meaning that the server wants us to slow down.
+_BACKOFF_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AdaptiveConcurrencyMiddleware:
+    """A downloader middleware adjusting the concurrency of each download slot.
+
+    This is an AIMD loop complementing AutoThrottle (which only tunes delays):
+     - every full "round" of fast successful responses on a domain adds one
+       concurrent request, up to a polite ceiling,
+     - slow responses remove one concurrent request,
+     - errors and throttling statuses halve the concurrency.
+    """
+
+    def __init__(self, crawler: Any) -> None:
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_CONCURRENCY_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.min_concurrency = settings.getint('ADAPTIVE_CONCURRENCY_MIN', 1)
+        self.max_concurrency = settings.getint('ADAPTIVE_CONCURRENCY_MAX', 8)
+        self.target_latency = settings.getfloat('ADAPTIVE_CONCURRENCY_TARGET_LATENCY', 2.0)
+        self._successes: Dict[str, int] = {}
+        crawler.signals.connect(self._spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self._spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler: Any) -> 'AdaptiveConcurrencyMiddleware':
+        return cls(crawler)
+
+    def _spider_opened(self, spider: scrapy.Spider) -> None:
+        profile = getattr(spider, 'crawl_profile', {})
+        self.min_concurrency = profile.get('min_concurrency', self.min_concurrency)
+        self.max_concurrency = profile.get('max_concurrency', self.max_concurrency)
+        self.target_latency = profile.get('target_latency', self.target_latency)
+
+    def _spider_closed(self, spider: scrapy.Spider) -> None:
+        stats = self.crawler.stats
+        for key, slot in self.crawler.engine.downloader.slots.items():
+            stats.set_value(f'adaptive_concurrency/{key}/final', slot.concurrency)
+
+    def _get_slot(self, request: scrapy.Request) -> Any:
+        downloader = self.crawler.engine.downloader
+        key = downloader.get_slot_key(request)
+        return key, downloader.slots.get(key)
+
+    def _set_concurrency(self, key: str, slot: Any, concurrency: int) -> None:
+        concurrency = max(self.min_concurrency, min(self.max_concurrency, concurrency))
+        if concurrency != slot.concurrency:
+            logging.debug('Concurrency for %s: %d -> %d', key, slot.concurrency, concurrency)
+            slot.concurrency = concurrency
+        self._successes[key] = 0
+        self.crawler.stats.max_value(f'adaptive_concurrency/{key}/max', concurrency)
+
+    def process_response(
+        self, request: scrapy.Request, response: scrapy.http.Response, spider: scrapy.Spider,
+    ) -> scrapy.http.Response:
+        key, slot = self._get_slot(request)
+        if slot is None:
+            return response
+        latency = request.meta.get('download_latency')
+        if response.status in _BACKOFF_STATUSES:
+            self.crawler.stats.inc_value(f'adaptive_concurrency/{key}/errors')
+            self._set_concurrency(key, slot, slot.concurrency // 2)
+        elif latency is not None and latency > 2 * self.target_latency:
+            self._set_concurrency(key, slot, slot.concurrency - 1)
+        elif latency is not None and latency <= self.target_latency:
+            self._successes[key] = self._successes.get(key, 0) + 1
+            if self._successes[key] >= slot.concurrency:
+                self._set_concurrency(key, slot, slot.concurrency + 1)
+        return response
+
+    def process_exception(
+        self, request: scrapy.Request, exception: Exception, spider: scrapy.Spider,
+    ) -> None:
+        key, slot = self._get_slot(request)
+        if slot is None:
+            return
+        self.crawler.stats.inc_value(f'adaptive_concurrency/{key}/errors')
+        self._set_concurrency(key, slot, slot.concurrency // 2)
+
+
+class ThroughputStats:
+    """An extension publishing crawl throughput stats.
+
+    At close, it sets throughput/pdfs_per_minute, throughput/bytes_per_second
+    and throughput/queue_depth_max in the crawler stats, and logs them. They
+    are also written as JSON to THROUGHPUT_STATS_FILE if set.
+    """
+
+    def __init__(self, crawler: Any) -> None:
+        if not crawler.settings.getbool('THROUGHPUT_STATS_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.interval = crawler.settings.getfloat('THROUGHPUT_STATS_INTERVAL', 10.0)
+        self.stats_file = crawler.settings.get('THROUGHPUT_STATS_FILE')
+        self._start = 0.0
+        self._pdfs = 0
+        self._bytes = 0
+        self._queue_task: Any = None
+        crawler.signals.connect(self._spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self._response_received, signal=signals.response_received)
+        crawler.signals.connect(self._spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler: Any) -> 'ThroughputStats':
+        return cls(crawler)
+
+    def _spider_opened(self, spider: scrapy.Spider) -> None:
+        self._start = time.monotonic()
+        self._queue_task = task.LoopingCall(self._sample_queue)
+        self._queue_task.start(self.interval, now=False)
+
+    def _sample_queue(self) -> None:
+        slot = getattr(self.crawler.engine, '_slot', None) or getattr(self.crawler.engine, 'slot', None)
+        if slot is None:
+            return
+        depth = len(slot.scheduler) + len(self.crawler.engine.downloader.active)
+        self.crawler.stats.max_value('throughput/queue_depth_max', depth)
+        self.crawler.stats.set_value('throughput/queue_depth', depth)
+
+    def _response_received(self, response: scrapy.http.Response, request: scrapy.Request, spider: scrapy.Spider) -> None:
+        self._bytes += len(response.body)
+        if response.body[:4] == b'%PDF':
+            self._pdfs += 1
+
+    def _spider_closed(self, spider: scrapy.Spider) -> None:
+        if self._queue_task and self._queue_task.running:
+            self._queue_task.stop()
+        self._sample_queue()
+        elapsed = max(time.monotonic() - self._start, 1e-6)
+        stats = self.crawler.stats
+        stats.set_value('throughput/pdfs', self._pdfs)
+        stats.set_value('throughput/pdfs_per_minute', round(self._pdfs * 60 / elapsed, 2))
+        stats.set_value('throughput/bytes_per_second', round(self._bytes / elapsed))
+        logging.info(
+            'Throughput: %d PDFs in %.0fs (%.2f PDFs/min, %.0f bytes/s), max queue depth %s',
+            self._pdfs, elapsed, self._pdfs * 60 / elapsed, self._bytes / elapsed,
+            stats.get_value('throughput/queue_depth_max', 0))
+        if self.stats_file:
+            with open(self.stats_file, 'wt', encoding='utf-8') as stats_file:
+                json.dump({
+                    key: value for key, value in stats.get_stats().items()
+                    if key.startswith(('throughput/', 'item_scraped_count', 'replay/'))
+                }, stats_file, indent=2)
@@ -14,20 +14,16 @@ Note that extracting the whole info is quite long, so be patient.
 """
 
 import csv
-import io
 import logging
 import time
 from os import link
-from typing import Any, Iterator
+from typing import Any, AsyncIterator
 
+from tools.spiders.lib import browsers
 from tools.spiders.lib import spider
-from tools.parsers import microsoft
-from tools.parsers.lib import data
 
 import scrapy
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
@@ -40,37 +36,31 @@ class DellSpider(spider.BoaViztaSpider):
     start_urls = [_INDEX_PAGE_URL]
 
     def start_requests(self):
-        options = Options()
-        options.add_argument("--headless")
-        options.add_argument("--incognito")
-        browser = webdriver.Chrome(options=options)
         pdfs=[]
-        for url in self.start_urls:
-            browser.get(url)
-            browser.find_element(By.XPATH,"//a[contains(@href, 'confirmation.aspx')]").click()
-            WebDriverWait(browser, 10).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'td[class=co1]'))
+        with browsers.get_pool().borrow() as browser:
+            for url in self.start_urls:
+                browsers.open_page(browser, url, wait_for="//a[contains(@href, 'confirmation.aspx')]")
+                browser.find_element(By.XPATH,"//a[contains(@href, 'confirmation.aspx')]").click()
+                WebDriverWait(browser, 10).until(
+                    EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'td[class=co1]'))
+                    )
+                browser.find_element(By.XPATH,"//input[contains(@aria-label, '.pdf')]").click()
+                browser.find_element(By.XPATH,"//a[@class='mscom-link button next']").click()
+                WebDriverWait(browser, 10).until(
+                    EC.presence_of_element_located((By.XPATH, "//a[text()='click here to download manually']"))
                 )
-            browser.find_element(By.XPATH,"//input[contains(@aria-label, '.pdf')]").click()
-            browser.find_element(By.XPATH,"//a[@class='mscom-link button next']").click()
-            WebDriverWait(browser, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//a[text()='click here to download manually']"))
-            )
 
-            browser.find_element(By.XPATH,"//a[text()='click here to download manually']").click()
-            all_pdfs = browser.find_elements(By.XPATH,"//a[contains(@href, '.pdf')]")
-            pdfs.append(i.get_attribute("href") for i in all_pdfs)
+                browser.find_element(By.XPATH,"//a[text()='click here to download manually']").click()
+                pdfs.append(browsers.find_links(browser, "//a[contains(@href, '.pdf')]"))
         for pdf_group in pdfs:
             for pdf_link in pdf_group:
                     if self._should_skip(pdf_link):
                         continue
                     yield scrapy.Request(pdf_link, callback=self.parse_carbon_footprint)
 
-    def parse_carbon_footprint(
+    async def parse_carbon_footprint(
         self, response, **unused_kwargs: Any,
-    ) -> Iterator[Any]:
-        for device in microsoft.parse(io.BytesIO(response.body), response.url):
+    ) -> AsyncIterator[Any]:
+        for device in await self.parse_pdf('microsoft', response):
             device.data['manufacturer'] = "Microsoft"
-            device.data['sources'] = response.url
-            device.data['sources_hash']=data.md5(io.BytesIO(response.body))
             yield device.reorder().data
@@ -0,0 +1,189 @@
+"""A SQLite working store for the carbon footprint data.
+
+The table schema is generated from DeviceCarbonFootprintData, with indexes on
+the fields used for lookups, so that finding or updating a device does not
+need to scan the whole CSV. Rows loaded from a CSV keep their original text,
+so exporting an unchanged store gives back the very same bytes, in the US or
+FR format.
+
+    python -m tools.store data.sqlite load boavizta-data-us.csv
+    python -m tools.store data.sqlite upsert new_hp.csv
+    python -m tools.store data.sqlite find --manufacturer HP --category Workplace
+    python -m tools.store data.sqlite export -o boavizta-data-us.csv
+    python -m tools.store data.sqlite export --format fr -o boavizta-data-fr.csv
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Optional, TextIO, Tuple, cast
+
+from tools import convert_csv, merge_csv
+from tools.parsers.lib import data
+
+_FIELDS = list(data.DeviceCarbonFootprintData.__annotations__)
+_SQL_TYPES = {str: 'TEXT', float: 'REAL', int: 'INTEGER'}
+_INDEXED_FIELDS = ('manufacturer', 'name', 'category', 'sources_hash')
+
+
+def _create_table_sql() -> str:
+    columns = ', '.join(
+        f'{field} {_SQL_TYPES[field_type]}'
+        for field, field_type in data.DeviceCarbonFootprintData.__annotations__.items())
+    # raw holds the values as text, as they are in the US CSV.
+    return f'CREATE TABLE IF NOT EXISTS devices (id INTEGER PRIMARY KEY, {columns}, raw TEXT NOT NULL)'
+
+
+class DeviceStore:
+    """Devices stored in a SQLite database, in the order of the CSV file."""
+
+    def __init__(self, path: str = ':memory:') -> None:
+        self._db = sqlite3.connect(path)
+        self._db.execute(_create_table_sql())
+        for field in _INDEXED_FIELDS:
+            self._db.execute(
+                f'CREATE INDEX IF NOT EXISTS devices_{field} ON devices ({field} COLLATE NOCASE)')
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __len__(self) -> int:
+        return int(self._db.execute('SELECT COUNT(*) FROM devices').fetchone()[0])
+
+    def _row_values(self, device: data.DeviceCarbonFootprint, raw: List[str]) -> List[Any]:
+        values = [device.data.get(field) for field in _FIELDS]
+        return [None if value == '' else value for value in values] + [json.dumps(raw)]
+
+    def load_csv(self, csv_file: TextIO) -> int:
+        """Append all the devices of a US formatted CSV file, return their number."""
+        reader = csv.reader(csv_file)
+        headers = next(reader)
+        if headers != _FIELDS:
+            raise ValueError(f'Unexpected CSV headers: {headers}')
+        decode = data.RowDecoder(headers)
+        placeholders = ', '.join('?' * (len(_FIELDS) + 1))
+        with self._db:
+            cursor = self._db.executemany(
+                f'INSERT INTO devices ({", ".join(_FIELDS)}, raw) VALUES ({placeholders})',
+                (self._row_values(decode(row), row) for row in reader))
+        return cursor.rowcount
+
+    def _to_device(self, row: Tuple[Any, ...]) -> data.DeviceCarbonFootprint:
+        return data.DeviceCarbonFootprint(cast(data.DeviceCarbonFootprintData, {
+            field: value for field, value in zip(_FIELDS, row) if value is not None and value != ''}))
+
+    def find(self, **criteria: str) -> List[data.DeviceCarbonFootprint]:
+        """Find the devices matching all the given field values (case insensitive)."""
+        unknown_fields = set(criteria) - set(_FIELDS)
+        if unknown_fields:
+            raise ValueError(f'DeviceCarbonFootprint has no such fields {unknown_fields}')
+        where = ' AND '.join(f'{field} = ? COLLATE NOCASE' for field in criteria) or '1'
+        return [
+            self._to_device(row) for row in self._db.execute(
+                f'SELECT {", ".join(_FIELDS)} FROM devices WHERE {where} ORDER BY id',
+                tuple(criteria.values()))]
+
+    def devices(self) -> Iterator[data.DeviceCarbonFootprint]:
+        for row in self._db.execute(f'SELECT {", ".join(_FIELDS)} FROM devices ORDER BY id'):
+            yield self._to_device(row)
+
+    def upsert(
+        self, devices: Iterable[data.DeviceCarbonFootprint], key: str = 'name',
+        conflict: Literal['keep2nd', 'interactive'] = 'keep2nd', verbose: int = 0,
+    ) -> Tuple[int, int]:
+        """Add or update devices, return the numbers of added and updated ones.
+
+        A device with the same key as a stored one is merged into it with
+        DeviceCarbonFootprint.merge, giving priority to the new values as in
+        merge_csv. Updated rows keep the original text of unchanged values.
+        """
+        if key not in _FIELDS:
+            raise ValueError(f'DeviceCarbonFootprint has no such field "{key}"')
+        added = updated = 0
+        with self._db:
+            for device in devices:
+                device = device.reorder()
+                existing = self._db.execute(
+                    f'SELECT id, {", ".join(_FIELDS)}, raw FROM devices WHERE {key} = ? COLLATE NOCASE '
+                    'ORDER BY id LIMIT 1', (device.get(key),)).fetchone()
+                if not existing:
+                    raw, unused_fr_row = data.CsvWriter.format(device)
+                    self._db.execute(
+                        f'INSERT INTO devices ({", ".join(_FIELDS)}, raw) VALUES ({", ".join("?" * (len(_FIELDS) + 1))})',
+                        self._row_values(device, raw))
+                    added += 1
+                    continue
+                old_device = self._to_device(existing[1:-1])
+                merged, unused_report, unused_conflicts = data.DeviceCarbonFootprint.merge(
+                    old_device, device, conflict=conflict, verbose=verbose)
+                old_raw = json.loads(existing[-1])
+                merged_raw, unused_fr_row = data.CsvWriter.format(merged)
+                raw = [
+                    old_raw[index] if merged.get(field) == old_device.get(field) else merged_raw[index]
+                    for index, field in enumerate(_FIELDS)]
+                self._db.execute(
+                    f'UPDATE devices SET {", ".join(f"{field} = ?" for field in _FIELDS)}, raw = ? WHERE id = ?',
+                    self._row_values(merged, raw) + [existing[0]])
+                updated += 1
+        return added, updated
+
+    def export_csv(self, output: TextIO, csv_format: Literal['us', 'fr'] = 'us') -> None:
+        """Write all the devices as in boavizta-data-us.csv or boavizta-data-fr.csv."""
+        writer = convert_csv.writer(output, csv_format)
+        to_format = convert_csv.RowConverter(_FIELDS, 'us', csv_format)
+        writer.writerow(_FIELDS)
+        for (raw,) in self._db.execute('SELECT raw FROM devices ORDER BY id'):
+            writer.writerow(to_format(json.loads(raw)))
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Query and update a SQLite store of Boavizta data',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument('store', help='SQLite file of the store')
+    commands = argparser.add_subparsers(dest='command', required=True)
+    load_command = commands.add_parser('load', help='Load a US formatted .csv file into an empty store')
+    load_command.add_argument('file', help='.csv file to load')
+    upsert_command = commands.add_parser('upsert', help='Merge the devices of a .csv file into the store')
+    upsert_command.add_argument('file', help='.csv file with new devices')
+    upsert_command.add_argument('-k', '--key', default='name', help='Name of the field used to find duplicates')
+    upsert_command.add_argument('-i', '--interactive', action='store_true', help='Ask user how ot resolve conflicts')
+    upsert_command.add_argument('-v', '--verbose', default=0, type=int, help='Verbosity level of the merges')
+    find_command = commands.add_parser('find', help='Print the devices matching the given fields as CSV')
+    for field in _INDEXED_FIELDS:
+        find_command.add_argument(f'--{field}')
+    export_command = commands.add_parser('export', help='Export the store as a .csv file')
+    export_command.add_argument('--format', default='us', choices=('us', 'fr'), help='CSV format')
+    export_command.add_argument('-o', '--output', help='Output .csv file')
+    args = argparser.parse_args(string_args)
+
+    store = DeviceStore(args.store)
+    if args.command == 'load':
+        if len(store):
+            argparser.error(f'{args.store} is not empty')
+        with open(args.file, 'rt', encoding='utf-8') as csv_file:
+            print(f'{store.load_csv(csv_file)} devices loaded')
+    elif args.command == 'upsert':
+        added, updated = store.upsert(
+            merge_csv.load_csv(args.file), key=args.key,
+            conflict='interactive' if args.interactive else 'keep2nd', verbose=args.verbose)
+        print(f'{added} devices added, {updated} devices updated')
+    elif args.command == 'find':
+        criteria: Dict[str, str] = {
+            field: getattr(args, field) for field in _INDEXED_FIELDS if getattr(args, field)}
+        with data.CsvWriter(sys.stdout) as writer:
+            writer.write_all(store.find(**criteria))
+    elif args.command == 'export':
+        if args.output and args.output != '-':
+            # The FR file uses the csv module's default \r\n line endings.
+            with open(args.output, 'w', encoding='utf-8', newline='') as output:
+                store.export_csv(output, args.format)
+        else:
+            store.export_csv(sys.stdout, args.format)
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
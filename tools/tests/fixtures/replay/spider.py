@@ -0,0 +1,34 @@
+"""A spider crawling the local listing of this folder, to test the record and replay of crawls.
+
+Run it with -a root=file:///path/to/this/folder.
+"""
+import io
+from typing import Any, Iterator
+
+import scrapy
+from scrapy import http
+
+from tools.parsers.lib import data
+from tools.spiders.lib import spider
+
+
+class ListingSpider(spider.BoaViztaSpider):
+
+    name = 'listing'
+
+    root = ''
+
+    def start_requests(self) -> Iterator[scrapy.Request]:
+        yield scrapy.Request(f'{self.root}/listing.html', callback=self.parse)
+
+    def parse(self, response: http.Response, **unused_kwargs: Any) -> Iterator[scrapy.Request]:
+        for link in response.css('a::attr(href)').getall():
+            if link.endswith('.pdf'):
+                yield scrapy.Request(response.urljoin(link), callback=self.parse_carbon_footprint)
+
+    def parse_carbon_footprint(self, response: http.Response, **unused_kwargs: Any) -> Iterator[Any]:
+        yield {
+            'name': response.body.decode().split(' of ')[-1].strip(),
+            'sources': response.url,
+            'sources_hash': data.md5(io.BytesIO(response.body)),
+        }
@@ -0,0 +1,83 @@
+"""Tests for the audit of the electricity factors."""
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from tools import audit
+from tools import snapshot
+from tools.parsers.lib import electricity
+
+_HEADERS = 'manufacturer,name,report_date,gwp_total,gwp_use_ratio,yearly_tec,lifetime,comment\n'
+
+
+class FixElectricityFactorTest(unittest.TestCase):
+
+    def test_fixes(self) -> None:
+        fixes = electricity.fix_electricity_factor(
+            [300, 300, 300, 300, math.nan],
+            # Factors: 0.823 (0.686 over 6 years), 0.42, 0.6, 0.2 and unknown.
+            [0.343, 0.14, 0.4, 0.2, 0.2],
+            [25, 25, 50, 25, 25],
+            [5, 4, 4, 12, 4])
+        self.assertEqual([True, False, False, False, False], fixes.fixed_lifetime.tolist())
+        self.assertEqual([6, 4, 4, 12, 4], fixes.lifetime.tolist())
+        self.assertEqual([False, True, False, False, False], fixes.fixed_gwp_total.tolist())
+        self.assertEqual([300, 375, 300, 300], [round(value, 6) for value in fixes.gwp_total[:4]])
+        self.assertTrue(math.isnan(fixes.gwp_total[4]))
+
+
+class AuditTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.csv_path = os.path.join(tmpdir, 'data.csv')
+
+    def _write(self, content: str) -> None:
+        with open(self.csv_path, 'wt', encoding='utf-8', newline='') as csv_file:
+            csv_file.write(content)
+
+    def test_audit_and_apply(self) -> None:
+        self._write(
+            _HEADERS +
+            'HP,EliteBook,2021,300,0.343,25,5.0,\n'
+            'Dell,Latitude,2020,300,0.14,25,4,checked\n'
+            'HP,ProBook,2021,300,0.343,25,5.0,fixed gwp_total\n'
+            '\n'
+            'Apple,iPad,2019,100,,,,\n')
+        dataset = snapshot.load(self.csv_path)
+        # Only the HP rows are audited by default.
+        self.assertEqual([True, False, False, False], audit.audit(dataset).fixed().tolist())
+        self.assertEqual([False, True, False, False], audit.audit(dataset, ['dell']).fixed().tolist())
+        fixes = audit.audit(dataset, ['HP', 'Dell'])
+        self.assertEqual([True, True, False, False], fixes.fixed().tolist())
+        self.assertEqual(
+            [('EliteBook', [electricity.FIXED_LIFETIME]), ('Latitude', [electricity.FIXED_GWP_TOTAL])],
+            [(row['name'], row['fixes']) for row in audit.report(dataset, fixes)])
+
+        content = audit.apply(self.csv_path, fixes)
+        self.assertEqual(
+            _HEADERS +
+            'HP,EliteBook,2021,300,0.343,25,6.0,fixed lifetime\n'
+            'Dell,Latitude,2020,375,0.14,25,4,checked fixed gwp_total\n'
+            'HP,ProBook,2021,300,0.343,25,5.0,fixed gwp_total\n'
+            '\n'
+            'Apple,iPad,2019,100,,,,\n',
+            content)
+
+        # A second audit has nothing left to fix.
+        self._write(content)
+        self.assertFalse(audit.audit(snapshot.load(self.csv_path), ['HP', 'Dell']).fixed().any())
+
+    def test_apply_fr(self) -> None:
+        self._write(_HEADERS.replace(',', ';').replace('\n', '\r\n') + 'HP;EliteBook;2021;300;0,14;25;4;\r\n')
+        audit.main([self.csv_path, '-o', self.csv_path])
+        with open(self.csv_path, 'rt', encoding='utf-8', newline='') as csv_file:
+            self.assertEqual('HP;EliteBook;2021;375;0,14;25;4;fixed gwp_total\r\n', csv_file.read().split('\r\n', 1)[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
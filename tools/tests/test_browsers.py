@@ -0,0 +1,65 @@
+"""Tests for the browser pool, against local HTML fixtures.
+
+They are skipped when no Chrome browser can be started.
+"""
+import os
+import unittest
+
+from selenium.common.exceptions import WebDriverException
+
+from tools.spiders.lib import browsers
+
+_FIXTURES_URL = 'file://' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'browsers')
+
+
+class BrowserPoolTest(unittest.TestCase):
+
+    pool: browsers.BrowserPool
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.pool = browsers.BrowserPool(size=2)
+        try:
+            with cls.pool.borrow():
+                pass
+        except WebDriverException as error:
+            cls.pool.close()
+            raise unittest.SkipTest(f'Chrome is not available: {error}')
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.pool.close()
+
+    def test_collect_links(self) -> None:
+        with self.pool.borrow() as browser:
+            links = browsers.collect_links(
+                browser, f'{_FIXTURES_URL}/listing.html', "//a[contains(@href, '.pdf')]", cookie_timeout=1)
+        self.assertEqual(['https://example.com/pcf-0-0.pdf', 'https://example.com/pcf-0-1.pdf'], links)
+
+    def test_click_until_exhausted(self) -> None:
+        with self.pool.borrow() as browser:
+            browsers.open_page(browser, f'{_FIXTURES_URL}/listing.html', wait_for="//li")
+            count = browsers.click_until_exhausted(
+                browser, "//a[text()='Load More']", "//a[contains(@href, '.pdf')]", timeout=5, button_timeout=1)
+        self.assertEqual(6, count)
+
+    def test_map_reuses_browsers(self) -> None:
+        urls = [f'{_FIXTURES_URL}/listing.html#{i}' for i in range(4)]
+        results = self.pool.map(
+            lambda browser, url: len(browsers.collect_links(browser, url, "//a[contains(@href, '.pdf')]")),
+            urls)
+        self.assertEqual([2, 2, 2, 2], results)
+        self.assertLessEqual(len(self.pool._all), 2)  # pylint: disable=protected-access
+
+    def test_close_removes_profiles(self) -> None:
+        pool = browsers.BrowserPool(size=1)
+        with pool.borrow():
+            profiles = list(pool._profiles.values())  # pylint: disable=protected-access
+        self.assertEqual(1, len(profiles))
+        self.assertTrue(os.path.isdir(profiles[0]))
+        pool.close()
+        self.assertFalse(os.path.exists(profiles[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+"""Tests for the HTTP cache of the spiders' documents."""
+import io
+import os
+import tempfile
+import unittest
+from typing import Any, Dict, List
+
+import scrapy
+from scrapy import http
+from scrapy.settings import Settings
+
+from tools.parsers.lib import data
+from tools.spiders.lib import cache
+from tools.spiders.lib import spider
+
+_PDF = b'%PDF-1.4 carbon footprint'
+
+
+class _Spider(spider.BoaViztaSpider):
+    name = 'test'
+
+
+class ContentAddressedCacheStorageTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.cachedir = tmpdir.name
+        self.storage = cache.ContentAddressedCacheStorage(Settings({
+            'HTTPCACHE_DIR': self.cachedir, 'HTTPCACHE_EXPIRATION_SECS': 0}))
+        self.spider = scrapy.Spider('test')
+        self.storage.open_spider(self.spider)
+        self.addCleanup(self.storage.close_spider, self.spider)
+
+    def _store(self, url: str, body: bytes = _PDF, headers: Dict[str, str] = {}) -> None:
+        self.storage.store_response(
+            self.spider, scrapy.Request(url), http.Response(url, body=body, headers=headers))
+
+    def _blobs(self) -> int:
+        return sum(len(files) for unused_dir, unused_dirs, files in os.walk(os.path.join(self.cachedir, 'blobs')))
+
+    def test_same_body_stored_once(self) -> None:
+        self._store('https://example.com/GetDocument?docname=a&lang=en')
+        self._store('https://example.com/pcf/a.pdf')
+        self.assertEqual(1, self._blobs())
+        body_hash = data.md5(io.BytesIO(_PDF))
+        self.assertEqual(
+            ['https://example.com/GetDocument?docname=a&lang=en', 'https://example.com/pcf/a.pdf'],
+            sorted(self.storage.urls_for_hash(body_hash)))
+        for url in ('https://example.com/GetDocument?docname=a&lang=en', 'https://example.com/pcf/a.pdf'):
+            response = self.storage.retrieve_response(self.spider, scrapy.Request(url))
+            assert response
+            self.assertEqual(_PDF, response.body)
+            self.assertEqual(url, response.url)
+
+        self._store('https://example.com/pcf/b.pdf', body=b'%PDF-1.4 another footprint')
+        self.assertEqual(2, self._blobs())
+
+    def test_listing_links(self) -> None:
+        self.assertIsNone(self.storage.retrieve_links('https://example.com/pcf.htm#tab0=0'))
+        self.storage.store_links('https://example.com/pcf.htm#tab0=0', ['https://example.com/a.pdf'])
+        self.storage.store_links('https://example.com/pcf.htm#tab0=1', [])
+        self.assertEqual(['https://example.com/a.pdf'], self.storage.retrieve_links('https://example.com/pcf.htm#tab0=0'))
+        self.assertEqual([], self.storage.retrieve_links('https://example.com/pcf.htm#tab0=1'))
+
+    def test_canonical_url_key(self) -> None:
+        self._store('https://example.com/GetDocument?lang=en&docname=a#page=2')
+        response = self.storage.retrieve_response(
+            self.spider, scrapy.Request('https://example.com/GetDocument?docname=a&lang=en'))
+        assert response
+        self.assertEqual(_PDF, response.body)
+        self.assertIsNone(self.storage.retrieve_response(
+            self.spider, scrapy.Request('https://example.com/GetDocument?docname=b&lang=en')))
+
+    def test_headers(self) -> None:
+        self._store('https://example.com/a.pdf', headers={'ETag': '"v1"', 'Content-Type': 'application/pdf'})
+        request = scrapy.Request('https://example.com/a.pdf')
+        response = self.storage.retrieve_response(self.spider, request)
+        assert response
+        self.assertEqual(b'"v1"', response.headers[b'ETag'])
+        self.assertIsInstance(response, http.Response)
+        self.assertIn('cache_timestamp', request.meta)
+
+    def test_missing_blob(self) -> None:
+        self._store('https://example.com/a.pdf')
+        body_hash = data.md5(io.BytesIO(_PDF))
+        os.remove(os.path.join(self.cachedir, 'blobs', body_hash[:2], body_hash))
+        self.assertIsNone(self.storage.retrieve_response(self.spider, scrapy.Request('https://example.com/a.pdf')))
+
+
+class PdfCachePolicyTest(unittest.TestCase):
+
+    def _policy(self, **settings: Any) -> cache.PdfCachePolicy:
+        return cache.PdfCachePolicy(Settings(settings))
+
+    def _cached(self, headers: Dict[str, str]) -> http.Response:
+        return http.Response('https://example.com/a.pdf', body=_PDF, headers=headers)
+
+    def test_documents_are_cached(self) -> None:
+        request = scrapy.Request('https://example.com/a.pdf')
+        self.assertTrue(self._policy().should_cache_response(self._cached({}), request))
+        self.assertFalse(self._policy().should_cache_response(
+            self._cached({'Cache-Control': 'no-store'}), request))
+        # Listing pages follow RFC2616: no validator, not kept.
+        page = http.Response('https://example.com/listing', body=b'<html></html>')
+        self.assertFalse(self._policy().should_cache_response(page, scrapy.Request(page.url)))
+
+    def test_immutable_documents(self) -> None:
+        request = scrapy.Request('https://example.com/a.pdf')
+        self.assertTrue(self._policy().is_cached_response_fresh(self._cached({}), request))
+        self.assertNotIn(b'If-None-Match', request.headers)
+
+    def test_revalidate_etag(self) -> None:
+        policy = self._policy()
+        cached = self._cached({'ETag': '"v1"', 'Date': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+        request = scrapy.Request('https://example.com/a.pdf')
+        self.assertFalse(policy.is_cached_response_fresh(cached, request))
+        self.assertEqual(b'"v1"', request.headers[b'If-None-Match'])
+        not_modified = http.Response(request.url, status=304)
+        self.assertTrue(policy.is_cached_response_valid(cached, not_modified, request))
+        modified = http.Response(request.url, status=200, body=b'%PDF-1.4 new version')
+        self.assertFalse(policy.is_cached_response_valid(cached, modified, request))
+
+    def test_revalidate_last_modified(self) -> None:
+        policy = self._policy()
+        cached = self._cached({
+            'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT', 'Date': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+        request = scrapy.Request('https://example.com/a.pdf')
+        self.assertFalse(policy.is_cached_response_fresh(cached, request))
+        self.assertEqual(b'Mon, 01 Jan 2024 00:00:00 GMT', request.headers[b'If-Modified-Since'])
+        self.assertTrue(policy.is_cached_response_valid(cached, http.Response(request.url, status=304), request))
+
+    def test_offline(self) -> None:
+        settings = Settings({'HTTPCACHE_OFFLINE': True})
+        _Spider.update_settings(settings)
+        self.assertTrue(settings.getbool('HTTPCACHE_ENABLED'))
+        self.assertTrue(settings.getbool('HTTPCACHE_IGNORE_MISSING'))
+
+        policy = cache.PdfCachePolicy(settings)
+        cached = self._cached({'ETag': '"v1"', 'Date': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+        request = scrapy.Request('https://example.com/a.pdf')
+        self.assertTrue(policy.is_cached_response_fresh(cached, request))
+        self.assertNotIn(b'If-None-Match', request.headers)
+
+    def test_online(self) -> None:
+        settings = Settings()
+        _Spider.update_settings(settings)
+        self.assertFalse(settings.getbool('HTTPCACHE_ENABLED'))
+        self.assertFalse(settings.getbool('HTTPCACHE_IGNORE_MISSING'))
+
+
+
+class ListingLinksTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+        self.browsed: List[str] = []
+
+    def _spider(self, **settings: Any) -> _Spider:
+        spider_settings = Settings({'HTTPCACHE_DIR': os.path.join(self.tmpdir, 'cache'), **settings})
+        _Spider.update_settings(spider_settings)
+        test_spider = _Spider(source_index=os.path.join(self.tmpdir, 'sources.sqlite'))
+        self.addCleanup(test_spider.closed, 'finished')
+        test_spider.settings = spider_settings
+        return test_spider
+
+    def _browse(self, urls: List[str]) -> List[List[str]]:
+        self.browsed.extend(urls)
+        return [[f'{url}/a.pdf'] for url in urls]
+
+    def test_offline(self) -> None:
+        urls = ['https://example.com/pcf.htm#tab0=0', 'https://example.com/pcf.htm#tab0=1']
+        self.assertEqual(
+            [[f'{url}/a.pdf'] for url in urls],
+            self._spider(HTTPCACHE_ENABLED=True)._listing_links(urls, self._browse))
+        self.assertEqual(urls, self.browsed)
+
+        # No browser: the links come from the cache, missing listings are skipped.
+        offline = self._spider(HTTPCACHE_OFFLINE=True)
+        with self.assertLogs(level='WARNING'):
+            links = offline._listing_links(urls + ['https://example.com/other.htm'], self._browse)
+        self.assertEqual([[f'{url}/a.pdf'] for url in urls] + [[]], links)
+        self.assertEqual(urls, self.browsed)
+
+    def test_without_cache(self) -> None:
+        self._spider()._listing_links(['https://example.com/pcf.htm'], self._browse)
+        self._spider()._listing_links(['https://example.com/pcf.htm'], self._browse)
+        self.assertEqual(['https://example.com/pcf.htm'] * 2, self.browsed)
+
+
+if __name__ == '__main__':
+    unittest.main()
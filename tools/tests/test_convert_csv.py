@@ -0,0 +1,43 @@
+"""Tests for the conversion between the US and FR formats."""
+import io
+import unittest
+
+from tools import convert_csv
+
+_US = (
+    'name,gwp_total,sources,number_cpu\n'
+    'iPad 10.2-inch,100.5,https://apple.com/iPad_10.2.pdf,2\n'
+    'Latitude 5.5,,,\n'
+)
+_FR = (
+    'name;gwp_total;sources;number_cpu\r\n'
+    'iPad 10.2-inch;100,5;https://apple.com/iPad_10.2.pdf;2\r\n'
+    'Latitude 5.5;;;\r\n'
+)
+
+
+class ConvertTest(unittest.TestCase):
+
+    def test_both_formats_in_one_read(self) -> None:
+        us_output = io.StringIO()
+        fr_output = io.StringIO()
+        count = convert_csv.convert(io.StringIO(_US), {'us': us_output, 'fr': fr_output}, chunk_size=1)
+        self.assertEqual(2, count)
+        self.assertEqual(_US, us_output.getvalue())
+        self.assertEqual(_FR, fr_output.getvalue())
+
+    def test_fr_to_us(self) -> None:
+        us_output = io.StringIO()
+        convert_csv.convert(io.StringIO(_FR), {'us': us_output})
+        self.assertEqual(_US, us_output.getvalue())
+
+    def test_check(self) -> None:
+        self.assertEqual([], convert_csv.check(io.StringIO(_US), io.StringIO(_FR)))
+        out_of_sync = _FR.replace('100,5', '100,6').replace('Latitude 5.5;;;\r\n', '')
+        self.assertEqual(
+            ['line 2: gwp_total differ', 'line 3: missing row in the fr file'],
+            convert_csv.check(io.StringIO(_US), io.StringIO(out_of_sync)))
+
+
+if __name__ == '__main__':
+    unittest.main()
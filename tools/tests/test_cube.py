@@ -0,0 +1,128 @@
+"""Tests for the aggregate cubes of data files."""
+import json
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from tools import cube
+from tools.parsers.lib import data
+
+_CSV = (
+    data.DeviceCarbonFootprint.csv_headers().replace('\r\n', '\n') +
+    'Apple,iPad,Workplace,Tablet,100,,,,,April 2021,,,,0.8,,,,,,,,,,,,,,,,,,\n'
+    'Apple,iMac,Workplace,Desktop,500,,,,,2021-2-6,,,,0.5,,,,,,,,,,,,,,,,,,\n'
+    'Dell,Latitude 5420,Workplace,Laptop,,,,,,May 2020,,,,,,,,,,,,,,,,,,,,,,\n'
+    'Dell,Latitude 5430,Workplace,Laptop,300,,,,,May 2022,,,,,,,,,,,,,,,,,,,,,,\n'
+)
+
+
+class QuantileSketchTest(unittest.TestCase):
+
+    def test_relative_accuracy(self) -> None:
+        values = np.random.default_rng(0).lognormal(6, 1, size=10000)
+        sketch = cube.QuantileSketch()
+        sketch.add_values(values)
+        for fraction in (0.1, 0.5, 0.9, 0.99):
+            expected = np.quantile(values, fraction, method='lower')
+            self.assertLess(abs(sketch.quantile(fraction) - expected) / expected, 0.02, fraction)
+
+    def test_add_remove(self) -> None:
+        sketch = cube.QuantileSketch()
+        sketch.add_values(np.array([0., 10., 20.]))
+        sketch.remove(20.)
+        sketch.remove(0.)
+        self.assertEqual(sketch.quantile(1), sketch.quantile(0))
+        self.assertAlmostEqual(10, sketch.quantile(0.5), delta=0.1)
+
+
+class CubeTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.csv_path = os.path.join(tmpdir, 'data.csv')
+        with open(self.csv_path, 'wt', encoding='utf-8') as csv_file:
+            csv_file.write(_CSV)
+
+    def test_rollup(self) -> None:
+        data_cube = cube.build(self.csv_path)
+        metrics = data_cube.rollup()
+        self.assertEqual(3, metrics['gwp_total'].count)
+        self.assertEqual(300, metrics['gwp_total'].mean)
+        self.assertEqual((100, 500), (metrics['gwp_total'].min, metrics['gwp_total'].max))
+        self.assertEqual(2, metrics['gwp_manufacturing_ratio'].count)
+        self.assertEqual(330, metrics['gwp_manufacturing'].total)
+        self.assertEqual(2, data_cube.rollup(manufacturer='Apple', year=['2020', '2021'])['gwp_total'].count)
+        self.assertEqual(0, data_cube.rollup(year='2020')['gwp_total'].count)
+        self.assertEqual(['2021', '2022'], list(data_cube.breakdown('year')))
+        with self.assertRaises(ValueError):
+            data_cube.rollup(color='red')
+
+    def test_same_as_devices(self) -> None:
+        data_cube = cube.Cube(('gwp_total', 'gwp_manufacturing_ratio'))
+        for device in data.DeviceCarbonFootprint.from_csv(self.csv_path):
+            data_cube.add(device)
+        self.assertEqual(
+            json.dumps(cube.build(self.csv_path, ('gwp_total', 'gwp_manufacturing_ratio')).to_json()),
+            json.dumps(data_cube.to_json()))
+
+    def test_update(self) -> None:
+        data_cube = cube.build(self.csv_path)
+        imac, = [device for device in data.DeviceCarbonFootprint.from_csv(self.csv_path) if device.get('name') == 'iMac']
+        new_data = imac.data.copy()
+        new_data['gwp_total'] = 400
+        new_imac = data.DeviceCarbonFootprint(new_data)
+        data_cube.update([imac], [new_imac])
+        metrics = data_cube.rollup(manufacturer='Apple')['gwp_total']
+        self.assertEqual((2, 500, 100, 400), (metrics.count, metrics.total, metrics.min, metrics.max))
+
+        data_cube.update([new_imac], [])
+        self.assertEqual(1, len(data_cube.breakdown('subcategory', manufacturer='Apple')))
+
+    def test_exact_bounds(self) -> None:
+        stats = cube.Stats()
+        stats.add_values(np.array([0., 0., 10., 20.]))
+        stats.remove(0.)
+        self.assertEqual((0, 20), (stats.min, stats.max))
+        stats.remove(20.)
+        self.assertEqual(0, stats.min)
+        self.assertTrue(math.isnan(stats.max))
+        self.assertFalse(stats.exact_bounds)
+        self.assertAlmostEqual(10, stats.quantile(1), delta=0.2)
+
+    def test_recompute_lost_bounds(self) -> None:
+        devices = data.DeviceCarbonFootprint.from_csv(self.csv_path)
+        other_ipad = data.DeviceCarbonFootprint(dict(devices[0].data, name='iPad Air', gwp_total=120))
+        devices.append(other_ipad)
+        data_cube = cube.Cube()
+        for device in devices:
+            data_cube.add(device)
+        # The max of the iPads' cell is removed.
+        lost_bounds = data_cube.update([other_ipad], [])
+        self.assertEqual({('Apple', 'Workplace', 'Tablet', '2021')}, lost_bounds)
+        self.assertTrue(math.isnan(data_cube.rollup(manufacturer='Apple')['gwp_total'].max))
+
+        data_cube.recompute(lost_bounds, devices[:-1])
+        self.assertEqual(json.dumps(cube.build(self.csv_path).to_json()), json.dumps(data_cube.to_json()))
+        metrics = data_cube.rollup(manufacturer='Apple')['gwp_total']
+        self.assertEqual((100, 500), (metrics.min, metrics.max))
+
+    def test_saved_until_changed(self) -> None:
+        self.assertEqual(3, cube.load(self.csv_path).rollup()['gwp_total'].count)
+        self.assertIsNotNone(cube.read_cubes(self.csv_path))
+
+        with open(self.csv_path, 'at', encoding='utf-8') as csv_file:
+            csv_file.write('HP,Elite,Workplace,Laptop,200,,,,,,,,,,,,,,,,,,,,,,,,,,,\n')
+        self.assertIsNone(cube.read_cubes(self.csv_path))
+        metrics = cube.load(self.csv_path).rollup()['gwp_total']
+        self.assertEqual(4, metrics.count)
+        self.assertTrue(math.isclose(275, metrics.mean))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Tests for the data of the dashboard."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from tools import dashboard
+from tools.parsers.lib import data
+
+_CSV = (
+    data.DeviceCarbonFootprint.csv_headers().replace('\r\n', '\n') +
+    'Apple,iPad,Workplace,Tablet,100,0.1500,,3,WW,,,abc,,0.8,,,10.2,,,,2,,,Manual,,,,,,,,\n'
+    'Dell,Latitude 5420,Workplace,Laptop,n/a,,,,,,,def,,,,,,,,,,,,Manual,,,,,,,,\n'
+    'HP,Elite G8,Workplace,Laptop,300,,,,,,,ghi,,,,,,,,,,,,Manual,,,,,,,,\n'
+)
+
+
+class LoadTablesTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.csv_path = os.path.join(tmpdir, 'data.csv')
+        with open(self.csv_path, 'wt', encoding='utf-8') as csv_file:
+            csv_file.write(_CSV)
+
+    def test_tables(self) -> None:
+        tables = dashboard.load_tables(self.csv_path)
+        self.assertEqual(['Apple', 'HP'], tables['filtered_df']['manufacturer'].tolist())
+        self.assertEqual(['Apple'], tables['complete_df']['manufacturer'].tolist())
+        self.assertEqual('float64', str(tables['complete_df']['gwp_manufacturing_ratio'].dtype))
+        self.assertAlmostEqual(80, tables['complete_df']['gwp_manufacturing'].iloc[0])
+
+    def test_reload_when_changed(self) -> None:
+        tables = dashboard.load_tables(self.csv_path)
+        self.assertIs(tables, dashboard.load_tables(self.csv_path))
+
+        with open(self.csv_path, 'at', encoding='utf-8') as csv_file:
+            csv_file.write('Lenovo,ThinkPad,Workplace,Laptop,200,,,,,,,jkl,,,,,,,,,,,,Manual,,,,,,,,\n')
+        self.assertEqual(
+            ['Apple', 'HP', 'Lenovo'], dashboard.load_tables(self.csv_path)['filtered_df']['manufacturer'].tolist())
+
+
+    def test_query_table(self) -> None:
+        with open(self.csv_path, 'at', encoding='utf-8') as csv_file:
+            csv_file.write('HP,EliteBook 840,Workplace,Laptop,200,,,,,,,jkl,,,,,,,,,,,,Manual,,,,,,,,\n')
+        page, total = dashboard.query_table(self.csv_path, 'filtered_df', columns=['name', 'gwp_total'])
+        self.assertEqual(3, total)
+        self.assertEqual(['name', 'gwp_total'], list(page.columns))
+
+        query = dashboard.TableQuery(search='ELITE', sort_by='gwp_total', ascending=False)
+        page, total = dashboard.query_table(self.csv_path, 'filtered_df', query, page=0, page_size=1)
+        self.assertEqual((2, ['Elite G8']), (total, page['name'].tolist()))
+        page, total = dashboard.query_table(self.csv_path, 'filtered_df', query, page=1, page_size=1)
+        self.assertEqual((2, ['EliteBook 840']), (total, page['name'].tolist()))
+
+        query = dashboard.TableQuery(filters=(('manufacturer', ('Apple', 'Dell')),), sort_by='gwp_manufacturing_ratio')
+        page, total = dashboard.query_table(self.csv_path, 'filtered_df', query)
+        self.assertEqual(['iPad'], page['name'].tolist())
+
+        # Missing values come last in both orders.
+        for ascending in (True, False):
+            query = dashboard.TableQuery(sort_by='gwp_manufacturing_ratio', ascending=ascending)
+            self.assertEqual('iPad', dashboard.query_table(self.csv_path, 'filtered_df', query)[0]['name'].iloc[0])
+
+
+    def test_federate(self) -> None:
+        folder = os.path.dirname(self.csv_path)
+        fr_path = os.path.join(folder, 'data-fr.csv')
+        with open(fr_path, 'wt', encoding='utf-8') as fr_file:
+            fr_file.write(
+                data.DeviceCarbonFootprint.csv_headers().replace(',', ';') +
+                'HP;Elite G8;Workplace;Laptop;310,5;;;;;;;ghi;;;;;;;;;;;;Manual;;;;;;;;\r\n'
+                'HP;ProBook;Workplace;Laptop;250;;;;;;;mno;;;;;;;;;;;;Manual;;;;;;;;\r\n')
+        empty_path = os.path.join(folder, 'empty.csv')
+        with open(empty_path, 'wt', encoding='utf-8') as empty_file:
+            empty_file.write(data.DeviceCarbonFootprint.csv_headers())
+
+        dataframe = dashboard.load_dataframe([self.csv_path, fr_path, empty_path])
+        self.assertEqual(
+            [('Apple', 'data.csv'), ('Dell', 'data.csv'), ('HP', 'data-fr.csv'), ('HP', 'data-fr.csv')],
+            list(zip(dataframe['manufacturer'], dataframe['source'])))
+        # The newest file wins.
+        self.assertEqual([310.5, 250], dataframe['gwp_total'].tolist()[2:])
+        self.assertEqual('category', str(dataframe['name'].dtype))
+        self.assertEqual(3, dashboard.load_cubes([self.csv_path, fr_path, empty_path])['filtered_df'].rollup()['gwp_total'].count)
+        page, total = dashboard.query_table(
+            [self.csv_path, fr_path], 'filtered_df', dashboard.TableQuery(filters=(('source', ('data-fr.csv',)),)))
+        self.assertEqual((2, ['Elite G8', 'ProBook']), (total, page['name'].tolist()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""Tests for the decoding and encoding of carbon footprint data."""
+import io
+import os
+import tempfile
+import unittest
+
+from tools.parsers.lib import data
+
+
+class RowDecoderTest(unittest.TestCase):
+
+    def test_same_as_from_text(self) -> None:
+        row = {'name': 'iPad', 'gwp_total': '100', 'number_cpu': '2.0', 'height': '', 'comment': 'ok'}
+        decode = data.RowDecoder(list(row))
+        self.assertEqual(data.DeviceCarbonFootprint.from_text(row).data, decode(list(row.values())).data)
+        self.assertEqual({'name': 'iPad', 'gwp_total': 100.0, 'number_cpu': 2, 'comment': 'ok'}, decode(list(row.values())).data)
+
+    def test_short_row_and_unknown_columns(self) -> None:
+        decode = data.RowDecoder(['color', 'name', 'gwp_total'])
+        self.assertEqual({'name': 'iPad'}, decode(['red', 'iPad']).data)
+
+    def test_conversion_error(self) -> None:
+        decode = data.RowDecoder(['name', 'gwp_total'])
+        with self.assertRaisesRegex(ValueError, 'converting "gwp_total": "n/a"'):
+            decode(['iPad', 'n/a'])
+
+    def test_from_csv_with_cleaners(self) -> None:
+        with tempfile.NamedTemporaryFile('wt', suffix='.csv', delete=False) as csv_file:
+            csv_file.write('name,memory\nLatitude,16GB\nOptiplex,\n')
+        self.addCleanup(os.remove, csv_file.name)
+        devices = data.DeviceCarbonFootprint.from_csv(
+            csv_file.name, cleaners={'memory': lambda memory: memory.replace('GB', '')})
+        self.assertEqual(
+            [{'name': 'Latitude', 'memory': 16.0}, {'name': 'Optiplex'}],
+            [device.data for device in devices])
+
+
+class CsvWriterTest(unittest.TestCase):
+
+    devices = [
+        data.DeviceCarbonFootprint({'manufacturer': 'HP', 'name': 'Elite, "G8";', 'gwp_total': 310.5, 'number_cpu': 2}),
+        data.DeviceCarbonFootprint({'name': ' iPad ', 'screen_size': 10.2, 'comment': 'ok'}),
+    ]
+
+    def test_same_as_csv_rows(self) -> None:
+        us_file = io.StringIO()
+        fr_file = io.StringIO()
+        with data.CsvWriter(us_file, fr_file, chunk_size=1) as writer:
+            writer.write_all(self.devices)
+        self.assertEqual(
+            data.DeviceCarbonFootprint.csv_headers() +
+            ''.join(device.reorder().as_csv_row() for device in self.devices),
+            us_file.getvalue())
+        self.assertEqual(
+            data.DeviceCarbonFootprint.csv_headers('fr') +
+            ''.join(device.reorder().as_csv_row('fr') for device in self.devices),
+            fr_file.getvalue())
+        self.assertIn(';310,5;', fr_file.getvalue())
+        self.assertEqual(2, writer.rows)
+
+    def test_buffered_until_flush(self) -> None:
+        us_file = io.StringIO()
+        writer = data.CsvWriter(us_file, headers=False, lineterminator='\n')
+        writer.write_all(self.devices)
+        self.assertEqual('', us_file.getvalue())
+        writer.flush()
+        self.assertEqual(['HP', 'Elite G8', ''], us_file.getvalue().splitlines()[0].split(',')[:3])
+
+
+class MergeSortedTest(unittest.TestCase):
+
+    headers = ['manufacturer', 'name', 'gwp_total']
+
+    def test_sort_key(self) -> None:
+        key = data.row_sort_key(self.headers)
+        self.assertEqual(('hp', 'elite', '', '', ''), key(['HP', 'Elite', '300']))
+        self.assertEqual(('dell', '', '', '', ''), key(['Dell']))
+
+    def test_insert_new_rows(self) -> None:
+        key = data.row_sort_key(self.headers)
+        rows = [['Apple', 'iMac', '1'], ['Dell', 'Latitude', '2'], ['HP', 'Elite', '3']]
+        self.assertTrue(data.is_sorted(rows, key))
+        merged = data.merge_sorted(rows, [['lenovo', 'ThinkPad', '4'], ['Dell', 'latitude', '5'], ['Acer', 'Aspire', '6']], key)
+        self.assertEqual(['6', '1', '2', '5', '3', '4'], [row[2] for row in merged])
+        self.assertTrue(data.is_sorted(merged, key))
+        self.assertFalse(data.is_sorted(list(reversed(merged)), key))
+
+    def test_unsorted_rows_keep_their_order(self) -> None:
+        key = data.row_sort_key(self.headers)
+        rows = [['HP', 'Elite', '1'], ['Apple', 'iMac', '2'], ['Dell', 'Latitude', '3']]
+        merged = data.merge_sorted(rows, [['Lenovo', 'ThinkPad', '4'], ['Dell', 'Inspiron', '5'], ['Acer', 'Aspire', '6']], key)
+        self.assertEqual(['6', '5', '1', '2', '3', '4'], [row[2] for row in merged])
+
+
+if __name__ == '__main__':
+    unittest.main()
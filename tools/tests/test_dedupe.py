@@ -0,0 +1,97 @@
+"""Tests for the detection of near-duplicate devices."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from tools import dedupe
+from tools.parsers.lib import data
+
+
+def _entry(row: int, manufacturer: str, name: str, gwp_total: float) -> dedupe.Entry:
+    return dedupe.Entry('test.csv', row, data.DeviceCarbonFootprint({
+        'manufacturer': manufacturer, 'name': name, 'gwp_total': gwp_total}))
+
+
+class DedupeTest(unittest.TestCase):
+
+    def test_normalize_name(self) -> None:
+        self.assertEqual('13in macbook air m1 cpu 256gb 2020', dedupe.normalize_name('13-inch MacBook Air (M1 CPU) 256GB - 2020'))
+        self.assertEqual('ipad 10.2in', dedupe.normalize_name('iPad 10.2”'))
+
+    def test_clusters(self) -> None:
+        entries = [
+            _entry(1, 'Apple', '13-inch MacBook Air (M1 CPU) 256GB - 2020', 161),
+            _entry(2, 'Apple', '13 inch MacBook Air M1 256GB', 160),
+            # Another model.
+            _entry(3, 'Apple', '13-inch MacBook Air (M1 CPU) 512GB - 2020', 161),
+            # Another footprint.
+            _entry(4, 'Apple', '13-inch MacBook Air (M1 CPU) 256GB', 200),
+            # Another manufacturer.
+            _entry(5, 'Dell', '13 inch MacBook Air M1 256GB', 160),
+            _entry(6, 'Dell', 'Latitude  5420', 300),
+            _entry(7, 'dell', 'latitude 5420', 310),
+        ]
+        clusters, nb_compared = dedupe.find_clusters(entries)
+        self.assertEqual(
+            [[1, 2], [6, 7]],
+            sorted([entry.row for entry in cluster.entries] for cluster in clusters))
+        self.assertLess(nb_compared, len(entries) * (len(entries) - 1) // 2)
+
+    def test_trigram_candidates(self) -> None:
+        entries = [
+            _entry(1, 'Dell', 'Latitude  5420', 300),
+            _entry(2, 'dell', 'latitude 5420', 310),
+            # Another variant.
+            _entry(3, 'Dell', 'Latitude 5420 2-in-1', 305),
+            _entry(4, 'Dell', 'PowerEdge R740', 300),
+            _entry(5, 'HP', 'Latitude 5420', 300),
+        ]
+        clusters, nb_compared = dedupe.find_clusters(entries, candidates_from='trigram')
+        self.assertEqual([[1, 2]], [[entry.row for entry in cluster.entries] for cluster in clusters])
+        self.assertEqual(3, nb_compared)
+
+    def test_load_entries(self) -> None:
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        csv_path = os.path.join(tmpdir, 'data.csv')
+        with open(csv_path, 'wt', encoding='utf-8') as csv_file:
+            csv_file.write(
+                'manufacturer,name,gwp_total\n'
+                'Dell,Latitude 5420,300\n'
+                # Headers repeated by a concatenated export.
+                'manufacturer,name,gwp_total\n'
+                'Dell,Latitude 5430,310\n')
+        self.assertEqual(
+            [(2, 'Latitude 5420'), (4, 'Latitude 5430')],
+            [(entry.row, entry.device.get('name')) for entry in dedupe.load_entries([csv_path])])
+
+    def test_variants(self) -> None:
+        pairs = [
+            ('Apple', 'iPhone 13 mini', 'iPhone 13'),
+            ('Apple', 'iPhone 13 Pro 1TB', 'iPhone 13 Pro Max 1TB'),
+            ('Apple', 'iPhone 14 Plus', 'iPhone 14 Pro'),
+            ('Dell', 'Latitude 3190 2-In-1', 'Latitude 3190'),
+        ]
+        for manufacturer, name1, name2 in pairs:
+            for candidates_from in ('lsh', 'trigram'):
+                clusters, unused_nb_compared = dedupe.find_clusters(
+                    [_entry(1, manufacturer, name1, 100), _entry(2, manufacturer, name2, 100)],
+                    threshold=0., candidates_from=candidates_from)  # type: ignore [arg-type]
+                self.assertEqual([], clusters, msg=f'{name1} / {name2} ({candidates_from})')
+        # Generic words do not make variants.
+        clusters, unused_nb_compared = dedupe.find_clusters(
+            [_entry(1, 'Apple', 'iPhone 13 with 128GB', 64), _entry(2, 'Apple', 'iPhone 13 128GB', 64)])
+        self.assertEqual(1, len(clusters))
+
+    def test_lsh_index(self) -> None:
+        index = dedupe.LshIndex()
+        index.add('dell', 0, dedupe.shingles('latitude 5420'))
+        index.add('dell', 1, dedupe.shingles('latitude 5420 2 in 1'))
+        index.add('dell', 2, dedupe.shingles('poweredge r740'))
+        index.add('hp', 3, dedupe.shingles('latitude 5420'))
+        self.assertEqual({(0, 1)}, index.candidates())
+
+
+if __name__ == '__main__':
+    unittest.main()
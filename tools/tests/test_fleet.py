@@ -0,0 +1,88 @@
+"""Tests for the footprint of an inventory of devices."""
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from tools import fleet
+from tools import snapshot
+
+_DATA = (
+    'manufacturer,name,report_date,gwp_total,gwp_use_ratio,gwp_manufacturing_ratio,gwp_transport_ratio,'
+    'gwp_eol_ratio,memory,hard_drive\n'
+    'HP,EliteBook 840 G8 Notebook PC,2021,300,0.2,0.75,0.04,0.01,16,SSD 512GB\n'
+    'HP,EliteBook 840 G8 Notebook PC,2021,280,0.2,0.75,0.04,0.01,8,SSD 256GB\n'
+    'HP,EliteBook 850 G8 Notebook PC,2021,320,0.2,0.75,0.04,0.01,,\n'
+    'Dell,Latitude 7420,March 2021,250,0.25,0.7,,,,\n'
+    'Dell,Latitude 7420,May 2020,240,0.25,0.7,,,,\n'
+    'Dell,Latitude 7410,May 2020,230,0.25,0.7,,,,\n'
+)
+
+
+class FootprintTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.data_path = os.path.join(tmpdir, 'data.csv')
+        with open(self.data_path, 'wt', encoding='utf-8') as data_file:
+            data_file.write(_DATA)
+        self.inventory_path = os.path.join(tmpdir, 'inventory.csv')
+        with open(self.inventory_path, 'wt', encoding='utf-8') as inventory_file:
+            inventory_file.write(
+                'manufacturer,model,count,memory,storage\n'
+                'HP,EliteBook 840 G8,10,8GB,\n'
+                'HP,EliteBook 840 G8,5,,512 GB\n'
+                'Dell,Latitude 7420,2,,\n'
+                'Apple,iPad,3,,\n')
+        self.output_path = os.path.join(tmpdir, 'footprint.csv')
+
+    def test_footprint(self) -> None:
+        inventory = fleet.read_inventory(self.inventory_path)
+        self.assertTrue(math.isnan(inventory.memory[1]))
+        result = fleet.footprint(snapshot.load(self.data_path), inventory)
+        # The configuration chooses between devices, else the most recent report.
+        self.assertEqual([1, 0, 3, -1], result.rows.tolist())
+        self.assertEqual([2800, 1500, 500], result.footprints['gwp_total'][:3].tolist())
+        self.assertEqual([2100, 1125, 350], result.footprints['gwp_manufacturing'][:3].tolist())
+        self.assertTrue(math.isnan(result.footprints['gwp_transport'][2]))
+
+        summary = fleet.summarize(inventory, result)
+        self.assertEqual({'lines': 2, 'devices': 15}, summary['fuzzy'])
+        self.assertEqual({'lines': 1, 'devices': 3}, summary['unmatched'])
+        self.assertEqual(4800, summary['total']['gwp_total'])
+        self.assertEqual(15, summary['known']['gwp_transport'])
+
+    def test_configurations(self) -> None:
+        with open(self.data_path, 'at', encoding='utf-8') as data_file:
+            data_file.write(
+                'Apple,iPhone 13 Pro 128GB,2021,69,,,,,,\n'
+                'Apple,iPhone 13 Pro 1TB,2021,112,,,,,,\n'
+                'Apple,iPhone 13 Pro Max 1TB,2021,117,,,,,,\n'
+                'Apple,iPhone 14 with 128GB,2022,61,,,,,,\n')
+        with open(self.inventory_path, 'wt', encoding='utf-8') as inventory_file:
+            inventory_file.write(
+                'manufacturer,model,count,memory,storage\n'
+                'Apple,iPhone 13 Pro,4,,\n'
+                'Apple,iPhone 13 Pro,2,,1 TB\n'
+                'Apple,iPhone 13,1,,\n'
+                'Apple,iPhone 14 128GB,1,,\n')
+        result = fleet.footprint(snapshot.load(self.data_path), fleet.read_inventory(self.inventory_path))
+        # Neither the closest configuration, nor another variant of the model.
+        self.assertEqual([-1, 7, -1, 9], result.rows.tolist())
+
+    def test_main(self) -> None:
+        fleet.main([self.inventory_path, '--data', self.data_path, '-o', self.output_path])
+        with open(self.output_path, 'rt', encoding='utf-8') as output:
+            lines = output.read().splitlines()
+        self.assertEqual(
+            'manufacturer,model,count,memory,storage,matched_manufacturer,matched_name,match,score,'
+            'gwp_total,gwp_manufacturing,gwp_use,gwp_transport,gwp_eol', lines[0])
+        self.assertEqual('Dell,Latitude 7420,2,,,Dell,Latitude 7420,exact,1.000,500.0,350.0,125.0,,', lines[3])
+        self.assertEqual('Apple,iPad,3,,,,,,,,,,,', lines[4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,18 @@
 """Check that data files have the right format."""
 import csv
 import io
+import json
 import os
 import unittest
 
+from tools import convert_csv
+from tools import validate
 from tools.parsers.lib import data
 
 _DATA_FOLDER = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 _DATA_FILE = os.path.join(_DATA_FOLDER, 'boavizta-data-us.csv')
+_FR_DATA_FILE = os.path.join(_DATA_FOLDER, 'boavizta-data-fr.csv')
+_VALIDATION_BASELINE = os.path.join(_DATA_FOLDER, 'tools', 'validation_baseline.json')
 
 
 class FormatsTest(unittest.TestCase):
@@ -24,12 +29,18 @@ class FormatsTest(unittest.TestCase):
             self.data_content.endswith('\n'), msg='Data file needs to end with a trailing newline')
 
     def test_read_format(self) -> None:
-        reader = csv.DictReader(io.StringIO(self.data_content))
-        for row in reader:
-            print(row)
-            data.DeviceCarbonFootprint.from_text(row)
-
-    # TODO(pascal): Check that fr and us formats are in sync.
+        devices = data.DeviceCarbonFootprint.from_csv(_DATA_FILE)
+        self.assertEqual(len(list(csv.reader(io.StringIO(self.data_content)))) - 1, len(devices))
+
+    def test_fr_in_sync(self) -> None:
+        with open(_DATA_FILE, 'rt', encoding='utf-8', newline='') as us_file, \
+                open(_FR_DATA_FILE, 'rt', encoding='utf-8', newline='') as fr_file:
+            self.assertEqual([], convert_csv.check(us_file, fr_file))
+
+    def test_no_new_errors(self) -> None:
+        with open(_VALIDATION_BASELINE, 'rt', encoding='utf-8') as baseline_file:
+            known = validate.known_anomalies(json.load(baseline_file))
+        self.assertEqual([], validate.new_errors(validate.validate(_DATA_FILE), known))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,106 @@
+"""Tests for the submission of new data to GitHub, against a fake GitHub API."""
+import contextlib
+import importlib.abc
+import importlib.util
+import io
+import os
+import tempfile
+import unittest
+from typing import Any
+
+from tools import convert_csv
+from tools.parsers.lib import data
+
+_TOOL_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'generate-gh-pr')
+_HEADERS = 'manufacturer,name,category,gwp_total\n'
+
+
+def _us_content(rows: str) -> str:
+    """A data file in the US format with the given rows (with _HEADERS' columns)."""
+    with tempfile.NamedTemporaryFile('wt', suffix='.csv', delete=False) as csv_file:
+        csv_file.write(_HEADERS + rows)
+    devices = data.DeviceCarbonFootprint.from_csv(csv_file.name)
+    os.remove(csv_file.name)
+    output = io.StringIO()
+    with data.CsvWriter(output, lineterminator='\n') as writer:
+        writer.write_all(devices)
+    return output.getvalue()
+
+
+def _load_module(name: str, filename: str) -> Any:
+    """Load a module of the tool, typed as Any since its file name is not importable."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(_TOOL_FOLDER, filename))
+    assert spec and isinstance(spec.loader, importlib.abc.Loader)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+fake_github = _load_module('fake_github', 'fake_github.py')
+generate_gh_pr = _load_module('generate_gh_pr', 'generate-gh-pr.py')
+
+
+class GenerateGhPrTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._start_github('Apple,iPad,Workplace,100.0\nHP,Elite 800,,300.5\n')
+        with tempfile.NamedTemporaryFile('wt', suffix='.csv', delete=False) as new_data:
+            new_data.write(_HEADERS + 'HP,Elite 600,Workplace,250.0\nDell,Latitude 5420,Workplace,280.5\nHP,Z2,Workplace,400.0\n')
+        self.addCleanup(os.remove, new_data.name)
+        self.new_data = new_data.name
+
+    def _start_github(self, rows: str) -> None:
+        """Start a fake GitHub whose data files have the given rows."""
+        us_content = _us_content(rows)
+        fr_output = io.StringIO()
+        convert_csv.convert(io.StringIO(us_content), {'fr': fr_output})
+        self.github = fake_github.FakeGitHub({
+            'boavizta-data-us.csv': us_content.encode('utf-8'),
+            'boavizta-data-fr.csv': fr_output.getvalue().encode('utf-8'),
+        })
+        self.addCleanup(self.github.stop)
+        self.url = self.github.start()
+
+    def _submit(self, batch: str) -> str:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            generate_gh_pr.main([
+                '--access_token', 'fake', '--github_url', self.url, '--batch', batch,
+                '--seconds_between_requests', '0', '--seconds_between_writes', '0', self.new_data])
+        return output.getvalue()
+
+    def test_batch_by_manufacturer(self) -> None:
+        self.assertIn('2 PRs created for 3 devices', self._submit('manufacturer'))
+        self.assertEqual(
+            ['Add 2 new HP devices', 'Add 1 new Dell devices'], [pull['title'] for pull in self.github.pulls])
+        us_content = self.github.file_content('Add-2-new-HP-devices', 'boavizta-data-us.csv').decode('utf-8')
+        self.assertEqual(
+            _us_content('Apple,iPad,Workplace,100.0\nHP,Elite 600,Workplace,250.0\nHP,Elite 800,,300.5\nHP,Z2,Workplace,400.0\n'),
+            us_content)
+        fr_content = self.github.file_content('Add-2-new-HP-devices', 'boavizta-data-fr.csv').decode('utf-8')
+        self.assertEqual([], convert_csv.check(io.StringIO(us_content), io.StringIO(fr_content, newline='')))
+        self.assertIn('250,0', fr_content)
+        # The base files are fetched once, and each PR has one commit per file.
+        self.assertEqual(1, self.github.requests['get_blob'])
+        self.assertEqual(4, self.github.requests['create_commit'])
+
+        # Existing branches are skipped.
+        self.assertIn('0 PRs created', self._submit('manufacturer'))
+
+    def test_unsorted_base(self) -> None:
+        self.github.stop()
+        self._start_github('HP,Elite 800,,300.5\nApple,iPad,Workplace,100.0\n')
+        self._submit('manufacturer')
+        # The existing rows do not move.
+        self.assertEqual(
+            _us_content('HP,Elite 600,Workplace,250.0\nHP,Elite 800,,300.5\nApple,iPad,Workplace,100.0\nHP,Z2,Workplace,400.0\n'),
+            self.github.file_content('Add-2-new-HP-devices', 'boavizta-data-us.csv').decode('utf-8'))
+
+    def test_one_pr_per_device(self) -> None:
+        self.assertIn('3 PRs created for 3 devices', self._submit('device'))
+        self.assertEqual('Add new Latitude 5420 Workplace', self.github.pulls[1]['title'])
+        self.assertEqual('main', self.github.pulls[1]['base'])
+
+
+if __name__ == '__main__':
+    unittest.main()
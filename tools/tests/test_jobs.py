@@ -0,0 +1,122 @@
+"""Tests for the persistent job queue."""
+import asyncio
+import io
+import os
+import tempfile
+import unittest
+
+import scrapy
+from scrapy import http
+
+from tools import jobs
+from tools.parsers.lib import data
+from tools.spiders.lib import spider
+
+
+class JobQueueTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'jobs.sqlite')
+        self.queue = jobs.JobQueue(self.path)
+        self.addCleanup(self.queue.close)
+
+    def test_add(self) -> None:
+        self.assertTrue(self.queue.add('https://www.apple.com/a.pdf', 'apple'))
+        self.assertFalse(self.queue.add('https://www.apple.com/a.pdf'))
+        self.assertEqual(1, self.queue.add_many([
+            jobs.Job('https://www.apple.com/a.pdf', None, jobs.DISCOVERED, 0),
+            jobs.Job('https://www.apple.com/b.pdf', None, jobs.DISCOVERED, 0),
+        ]))
+        self.assertEqual(
+            jobs.Job('https://www.apple.com/a.pdf', 'apple', jobs.DISCOVERED, 0),
+            self.queue.get('https://www.apple.com/a.pdf'))
+        self.assertEqual(2, self.queue.counts()[jobs.DISCOVERED])
+
+    def test_concurrent_workers(self) -> None:
+        for index in range(5):
+            self.queue.add(f'https://www.apple.com/{index}.pdf')
+        other_queue = jobs.JobQueue(self.path)
+        self.addCleanup(other_queue.close)
+
+        first = self.queue.claim('first', limit=3)
+        second = other_queue.claim('second', limit=3)
+        self.assertEqual(3, len(first))
+        self.assertEqual(2, len(second))
+        self.assertFalse({job.url for job in first} & {job.url for job in second})
+        self.assertEqual([], self.queue.claim('third'))
+
+    def test_resume(self) -> None:
+        self.queue.add('https://www.apple.com/a.pdf', 'apple')
+        self.queue.add('https://www.apple.com/b.pdf', 'apple')
+        self.queue.add('https://www.apple.com/c.pdf', 'apple')
+        # A worker dies while processing its jobs.
+        self.queue.claim('crashed', limit=3, lease_seconds=-1)
+
+        # Its lease expired: another worker takes over.
+        job_a, job_b, job_c = self.queue.claim('worker', limit=3)
+        self.queue.mark_parsed(job_a.url, [{'manufacturer': 'Apple', 'name': 'iPad'}])
+        self.queue.mark_failed(job_b.url, 'parse: boom')
+        self.queue.mark_downloaded(job_c.url, 'abc')
+
+        # Only the failed job is retried, until it runs out of attempts.
+        self.assertEqual([job_b.url], [job.url for job in self.queue.claim('worker', limit=3, max_attempts=3)])
+        self.queue.mark_failed(job_b.url, 'parse: boom')
+        self.assertEqual([], self.queue.claim('worker', max_attempts=3))
+        self.assertEqual(1, self.queue.retry_failed())
+        self.assertEqual([job_b.url], [job.url for job in self.queue.claim('worker')])
+
+        self.assertEqual(
+            [{'manufacturer': 'Apple', 'name': 'iPad'}],
+            [device.data for device in self.queue.parsed_devices()])
+
+    def test_renew(self) -> None:
+        self.queue.add('https://www.apple.com/a.pdf', 'apple')
+        self.queue.add('https://www.apple.com/b.pdf', 'apple')
+        job_a, job_b = self.queue.claim('worker', limit=2, lease_seconds=-1)
+        # Expired but not taken over yet.
+        self.assertTrue(self.queue.renew(job_a.url, 'worker'))
+        self.assertEqual([job_b.url], [job.url for job in self.queue.claim('other')])
+        self.assertFalse(self.queue.renew(job_b.url, 'worker'))
+        # Released jobs have nothing to renew.
+        self.queue.mark_parsed(job_a.url, [])
+        self.assertTrue(self.queue.renew(job_a.url, 'worker'))
+        self.assertTrue(self.queue.renew('https://www.apple.com/unknown.pdf', 'worker'))
+
+
+
+class _Spider(spider.BoaViztaSpider):
+    name = 'test'
+
+
+class SpiderJobsTest(unittest.TestCase):
+
+    def test_redirected_document(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        test_spider = _Spider(
+            source_index=os.path.join(tmpdir.name, 'sources.sqlite'), job_queue=os.path.join(tmpdir.name, 'jobs.sqlite'))
+        self.addCleanup(test_spider.closed, 'finished')
+        self.assertFalse(test_spider._should_skip('https://www.hp.com/GetDocument?docname=a'))
+        body = b'%PDF-1.4 carbon footprint'
+        # Already parsed from another URL.
+        test_spider.source_index.add('https://www.hp.com/a-copy.pdf', data.md5(io.BytesIO(body)))
+
+        request = scrapy.Request(
+            'https://cdn.hp.com/a.pdf', meta={'redirect_urls': ['https://www.hp.com/GetDocument?docname=a']})
+        response = http.Response(request.url, body=body, request=request)
+        self.assertEqual([], asyncio.run(test_spider.parse_pdf('hp_workplace', response)))
+
+        assert test_spider.job_queue
+        job = test_spider.job_queue.get('https://www.hp.com/GetDocument?docname=a')
+        assert job
+        self.assertEqual(jobs.PARSED, job.state)
+        self.assertIsNone(test_spider.job_queue.get('https://cdn.hp.com/a.pdf'))
+        # A resumed crawl does not download it again.
+        self.assertTrue(test_spider._should_skip('https://www.hp.com/GetDocument?docname=a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
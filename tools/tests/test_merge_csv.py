@@ -0,0 +1,155 @@
+"""Tests for the merge of data files."""
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from tools import cube
+from tools import merge_csv
+
+_HEADERS = 'manufacturer,name,gwp_total,memory\n'
+
+
+class IncrementalMergeTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.folder = tmpdir.name
+        self.manifest = os.path.join(self.folder, 'manifest.json')
+        self._write('master.csv', 'HP,Elite 800,300.0,\nDell,Latitude 5420,250.0,16GB\nDell,Optiplex 3000,,8\n')
+
+    def _write(self, filename: str, rows: str) -> str:
+        with open(os.path.join(self.folder, filename), 'wt', encoding='utf-8') as csv_file:
+            csv_file.write(_HEADERS + rows)
+        return os.path.join(self.folder, filename)
+
+    def _merge(self, *args: str) -> str:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            merge_csv.main(list(args))
+        return output.getvalue()
+
+    def _check_same_as_full_merge(self, filenames: list) -> str:
+        full_output = os.path.join(self.folder, 'full.csv')
+        incremental_output = os.path.join(self.folder, 'incremental.csv')
+        self._merge(*filenames, '-o', full_output)
+        report = self._merge(*filenames, '-m', self.manifest, '-o', incremental_output)
+        with open(full_output, 'rb') as full_file, open(incremental_output, 'rb') as incremental_file:
+            self.assertEqual(full_file.read(), incremental_file.read())
+        return report
+
+    def test_incremental_merge(self) -> None:
+        master = os.path.join(self.folder, 'master.csv')
+        batch = self._write('batch.csv', 'Dell,latitude 5420,251.0,\nApple,iPad,100.0,\n')
+        self.assertIn('4 keys merged again, 0 removed, 0 unchanged', self._check_same_as_full_merge([master, batch]))
+        self.assertIn('0 keys merged again, 0 removed, 4 unchanged', self._check_same_as_full_merge([master, batch]))
+
+        self._write('batch.csv', 'Dell,latitude 5420,251.0,\nApple,iPad Air,120.0,\n')
+        self.assertIn('1 keys merged again, 1 removed, 3 unchanged', self._check_same_as_full_merge([master, batch]))
+
+        # A new batch only merges its own keys.
+        other_batch = self._write('other.csv', 'HP,Elite 800,301.0,\n')
+        self.assertIn('2 keys merged again, 1 removed, 1 unchanged', self._check_same_as_full_merge([master, other_batch]))
+
+    def test_output_is_next_input(self) -> None:
+        master = os.path.join(self.folder, 'master.csv')
+        batch = self._write('batch.csv', 'Apple,iPad,100.0,\n')
+        self._merge(master, batch, '-m', self.manifest, '-o', master)
+        batch = self._write('batch.csv', 'Apple,iPad,100.0,\nApple,iPhone,70.0,\n')
+        full_output = os.path.join(self.folder, 'full.csv')
+        self._merge(master, batch, '-o', full_output)
+        self.assertIn('1 keys merged again, 0 removed, 4 unchanged', self._merge(master, batch, '-m', self.manifest, '-o', master))
+        with open(full_output, 'rb') as full_file, open(master, 'rb') as master_file:
+            self.assertEqual(full_file.read(), master_file.read())
+
+    def test_batches_absorbed_in_turn(self) -> None:
+        master = os.path.join(self.folder, 'master.csv')
+        full_output = os.path.join(self.folder, 'full.csv')
+        batches = [
+            self._write('batch1.csv', 'Apple,iPad,100.0,\nDell,Latitude 5420,251.0,\n'),
+            self._write('batch2.csv', 'Apple,iPhone,70.0,\n'),
+            self._write('batch3.csv', 'Apple,iPad,100.0,\nApple,Watch,30.0,\n'),
+        ]
+        self._merge(master, batches[0], '-m', self.manifest, '-o', master)
+        with open(self.manifest, 'rt', encoding='utf-8') as manifest_file:
+            first_keys = json.load(manifest_file)['files'][master]['keys']
+
+        for batch, nb_merged in zip(batches[1:], (1, 2)):
+            self._merge(master, batch, '-o', full_output)
+            # The keys of the batches absorbed before are not merged again.
+            self.assertIn(
+                f'{nb_merged} keys merged again, 0 removed',
+                self._merge(master, batch, '-m', self.manifest, '-o', master))
+            with open(full_output, 'rb') as full_file, open(master, 'rb') as master_file:
+                self.assertEqual(full_file.read(), master_file.read())
+        with open(self.manifest, 'rt', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+        self.assertEqual(master, manifest['absorbed_into'])
+        self.assertLessEqual(set(first_keys), set(manifest['files'][master]['keys']))
+
+    def test_summary_of_whole_output(self) -> None:
+        master = os.path.join(self.folder, 'master.csv')
+        batch = self._write('batch.csv', 'Dell,latitude 5420,251.0,\nApple,iPad,100.0,\n')
+        output = os.path.join(self.folder, 'merged.csv')
+        full_report = self._merge(master, batch, '-o', output)
+        self._merge(master, batch, '-m', self.manifest, '-o', output)
+        report = self._merge(master, batch, '-m', self.manifest, '-o', output)
+        self.assertIn('0 keys merged again', report)
+        # The stats cover all the rows, not only the merged ones.
+        self.assertIn('Number of singletons: [2, 1]', report)
+        self.assertEqual(full_report[full_report.index('Number of'):], report[report.index('Number of'):])
+
+    def test_sort_unsorted_master(self) -> None:
+        master = os.path.join(self.folder, 'master.csv')
+        batch = self._write('batch.csv', 'Dell,latitude 5420,251.0,\nApple,iPad,100.0,\nLenovo,ThinkPad,200.0,\n')
+        output = os.path.join(self.folder, 'merged.csv')
+        for incremental in (False, True):
+            self._merge(master, batch, '-s', '-o', output, *(['-m', self.manifest] if incremental else []))
+            with open(output, 'rt', encoding='utf-8') as output_file:
+                names = [line.split(',')[1] for line in output_file.read().splitlines()[1:]]
+            # The rows of the master are not sorted: they do not move.
+            self.assertEqual(['iPad', 'Elite 800', 'latitude 5420', 'Optiplex 3000', 'ThinkPad'], names)
+
+    def test_next_batch(self) -> None:
+        master = os.path.join(self.folder, 'master.csv')
+        batch = self._write('batch1.csv', 'Apple,iPad,100.0,\nDell,Latitude 5420,251.0,\n')
+        self._merge(master, batch, '-m', self.manifest, '-o', master)
+        # The rows of the previous batch are in the master already.
+        next_batch = self._write('batch2.csv', 'Apple,iPhone,70.0,\n')
+        full_output = os.path.join(self.folder, 'full.csv')
+        self._merge(master, next_batch, '-o', full_output)
+        self.assertIn(
+            '1 keys merged again, 0 removed, 4 unchanged', self._merge(master, next_batch, '-m', self.manifest, '-o', master))
+        with open(full_output, 'rb') as full_file, open(master, 'rb') as master_file:
+            self.assertEqual(full_file.read(), master_file.read())
+
+    def test_update_cubes(self) -> None:
+        master = os.path.join(self.folder, 'master.csv')
+        output = os.path.join(self.folder, 'merged.csv')
+        batch = self._write('batch.csv', 'Apple,iPad,100.0,\n')
+        self._merge(master, batch, '-m', self.manifest, '-o', output)
+        self.assertEqual(650, cube.load(output).rollup()['gwp_total'].total)
+
+        batch = self._write('batch.csv', 'Apple,iPad,120.0,\nApple,iPhone,70.0,\n')
+        self._merge(master, batch, '-m', self.manifest, '-o', output)
+        cubes = cube.read_cubes(output)
+        assert cubes
+        self.assertEqual(json.dumps(cube.build(output).to_json()), json.dumps(cubes[('gwp_total',)].to_json()))
+        self.assertEqual(740, cubes[('gwp_total',)].rollup()['gwp_total'].total)
+
+        # The max of the Dell devices is replaced: it is found again in the other rows.
+        self._write('batch.csv', 'Dell,Latitude 7420,400.0,\n')
+        self._merge(master, batch, '-m', self.manifest, '-o', output)
+        self._write('batch.csv', 'Dell,Latitude 7420,200.0,\n')
+        self._merge(master, batch, '-m', self.manifest, '-o', output)
+        cubes = cube.read_cubes(output)
+        assert cubes
+        self.assertEqual(json.dumps(cube.build(output).to_json()), json.dumps(cubes[('gwp_total',)].to_json()))
+        self.assertEqual(250, cubes[('gwp_total',)].rollup(manufacturer='Dell')['gwp_total'].max)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Tests for the index of device names."""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from tools import name_index
+
+
+class NameIndexTest(unittest.TestCase):
+
+    index = name_index.from_columns(
+        ['HP', 'HP', 'Dell', 'Dell', 'Dell', 'dell', 'Apple'],
+        ['EliteBook 840 G8 Notebook PC', 'EliteBook 850 G8 Notebook PC', 'Latitude 7420', 'Latitude 7410',
+         'Latitude 7420 2-in-1', 'LATITUDE 7420', 'Apple Watch SE'])
+
+    def test_search(self) -> None:
+        self.assertEqual(
+            [('Latitude 7420', 1., [2, 5]), ('Latitude 7420 2-in-1', 0.65, [4])],
+            [(hit.name, round(hit.score, 2), hit.rows) for hit in self.index.search('Dell', 'latitude-7420', k=2)])
+        # Only the names of the manufacturer.
+        self.assertEqual([], self.index.search('Lenovo', 'Latitude 7420'))
+        self.assertEqual(
+            ['Latitude 7420'], [hit.name for hit in self.index.search('Dell', 'Latitude 7420', threshold=0.9)])
+
+    def test_match(self) -> None:
+        self.assertEqual(name_index.Match('exact', 1., [2, 5]), self.index.match('Dell Inc.', 'Dell Latitude 7420'))
+        self.assertEqual([6], self.index.match('Apple', 'Watch SE').rows)
+        match = self.index.match('HP', 'HP EliteBook 840 G8')
+        self.assertEqual(('fuzzy', [0]), (match.kind, match.rows))
+        self.assertGreater(match.score, name_index.DEFAULT_THRESHOLD)
+
+    def test_no_match(self) -> None:
+        # Another model number, another manufacturer or another device.
+        self.assertEqual([], self.index.match('Dell', 'Latitude 7430').rows)
+        self.assertEqual([], self.index.match('Lenovo', 'Latitude 7420').rows)
+        self.assertEqual([], self.index.match('HP', 'Z2 Mini G9').rows)
+
+    def test_variants(self) -> None:
+        index = name_index.from_columns(['Apple'] * 5 + ['HP'], [
+            'iPhone 13 Pro 128GB', 'iPhone 13 Pro 1TB', 'iPhone 13 Pro Max 1TB', 'iPhone 13 mini with 128GB',
+            'iPhone 13 with 128GB', 'EliteBook 840 Aero G8 Notebook PC'])
+        # All the configurations of the model.
+        self.assertEqual([0, 1], index.match('Apple', 'iPhone 13 Pro').rows)
+        self.assertEqual([2], index.match('Apple', 'iPhone 13 Pro Max').rows)
+        self.assertEqual([4], index.match('Apple', 'iPhone 13 128GB').rows)
+        self.assertEqual([3], index.match('Apple', 'iPhone 13 mini 128GB').rows)
+        # Another variant.
+        self.assertEqual([], index.match('HP', 'EliteBook 840 G8').rows)
+
+    def test_add(self) -> None:
+        index = name_index.from_columns(['Dell'], ['Latitude 7420'])
+        self.assertEqual([], index.match('Dell', 'Latitude 5420').rows)
+        index.add('Dell', 'Latitude 5420', 1)
+        self.assertEqual([1], index.match('Dell', 'Latitude 5420').rows)
+        self.assertEqual(2, len(index))
+
+    def test_json(self) -> None:
+        saved = json.loads(json.dumps(self.index.to_json()))
+        index = name_index.NameIndex.from_json(saved)
+        self.assertEqual(saved, json.loads(json.dumps(index.to_json())))
+        self.assertEqual(self.index.search('HP', 'EliteBook G8'), index.search('HP', 'EliteBook G8'))
+        self.assertEqual(
+            self.index.match('Dell', 'Latitude 7420 2 in 1 laptop'), index.match('Dell', 'Latitude 7420 2 in 1 laptop'))
+        index.add('Dell', 'Latitude 7430', 7)
+        self.assertEqual([7], index.match('Dell', 'latitude-7430').rows)
+
+
+class LoadTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.csv_path = os.path.join(tmpdir, 'data.csv')
+        self._write('manufacturer,name\nDell,Latitude 7420\n')
+
+    def _write(self, content: str) -> None:
+        with open(self.csv_path, 'wt', encoding='utf-8') as csv_file:
+            csv_file.write(content)
+
+    def test_saved_until_changed(self) -> None:
+        self.assertIsNone(name_index.read_index(self.csv_path))
+        self.assertEqual([0], name_index.load(self.csv_path).match('Dell', 'Latitude 7420').rows)
+        saved = name_index.read_index(self.csv_path)
+        self.assertIsNotNone(saved)
+
+        self._write('manufacturer,name\nHP,EliteBook 840\nDell,Latitude 7420\n')
+        self.assertIsNone(name_index.read_index(self.csv_path))
+        self.assertEqual([1], name_index.load(self.csv_path).match('Dell', 'Latitude 7420').rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Tests for the staged refresh pipeline."""
+import asyncio
+import os
+import tempfile
+import unittest
+from typing import Dict
+
+from tools import jobs
+from tools import pipeline
+from tools.parsers.lib import data
+
+_TESTDATA_FOLDER = os.path.join(os.path.dirname(__file__), 'testdata')
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_classify(self) -> None:
+        self.assertEqual('lenovo', pipeline.classify('https://psref.lenovo.com/syspool/Sys/PDF/pcf.pdf'))
+        self.assertEqual('hp_workplace', pipeline.classify('https://h20195.www2.hp.com/v2/GetDocument.aspx?docname=c1'))
+        self.assertIsNone(pipeline.classify('https://www.example.com/report.pdf'))
+
+    def test_validate(self) -> None:
+        device = data.DeviceCarbonFootprint({
+            'manufacturer': 'Apple', 'name': 'iPad', 'gwp_total': 100.0, 'gwp_use_ratio': 0.2})
+        self.assertEqual([], pipeline.validate(device))
+        device.data['gwp_use_ratio'] = 20.0
+        del device.data['name']
+        self.assertEqual(
+            ['missing name', 'gwp_use_ratio out of [0, 1]: 20.0'], pipeline.validate(device))
+
+    def test_run(self) -> None:
+        pdf_file = os.path.join(_TESTDATA_FOLDER, 'apple', '13-inch-macbookair.pdf')
+        master = {
+            'macbook air (m1 2020) with 256gb': data.DeviceCarbonFootprint({
+                'manufacturer': 'Apple', 'name': 'MacBook Air (M1 2020) with 256GB',
+                'gwp_total': 150.0, 'weight': 1.29}),
+        }
+        runner = pipeline.Pipeline(master, parse_workers=1, queue_size=1)
+        asyncio.run(runner.run(pipeline.read_documents([
+            f'{pdf_file} apple',
+            # Same document under another name: only parsed once.
+            f'{pdf_file} apple',
+            'missing.pdf apple',
+        ])))
+
+        self.assertEqual(['macbook air (m1 2020) with 256gb'], list(master))
+        device = master['macbook air (m1 2020) with 256gb']
+        # New values take priority, missing ones are kept.
+        self.assertEqual(161.0, device.get('gwp_total'))
+        self.assertEqual(1.29, device.get('weight'))
+        self.assertEqual(data.md5_file(pdf_file), device.get('sources_hash'))
+
+        metrics = {stats['stage']: stats for stats in (m.as_dict() for m in runner.metrics)}
+        self.assertEqual(1, metrics['fetch']['errors'])
+        self.assertEqual(1, metrics['hash']['dropped'])
+        self.assertEqual(1, metrics['merge']['processed'])
+
+    def test_parse_failure(self) -> None:
+        pdf_file = os.path.join(_TESTDATA_FOLDER, 'apple', '13-inch-macbookair.pdf')
+        master: Dict[str, data.DeviceCarbonFootprint] = {}
+        runner = pipeline.Pipeline(master, parse_workers=1)
+        # Not a parser module.
+        asyncio.run(runner.run(pipeline.read_documents([f'{pdf_file} lib'])))
+        self.assertEqual(1, runner.metrics[3].errors)
+        # The same document is parsed under another name.
+        asyncio.run(runner.run(pipeline.read_documents([f'{pdf_file} apple'])))
+        self.assertEqual(['macbook air (m1 2020) with 256gb'], list(master))
+
+    def test_lease_lost(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            queue = jobs.JobQueue(os.path.join(tmpdir, 'jobs.sqlite'))
+            self.addCleanup(queue.close)
+            queue.add('missing.pdf', 'apple')
+            claimed = queue.claim('worker', lease_seconds=-1)
+            # The lease expired while the job was waiting: another worker took it over.
+            queue.claim('other')
+            runner = pipeline.Pipeline({}, job_queue=queue, worker='worker')
+            asyncio.run(runner.run(pipeline.Document(job.url, job.parser) for job in claimed))
+        self.assertEqual(1, runner.metrics[0].dropped)
+        self.assertEqual(0, runner.metrics[0].errors)
+
+    def test_near_duplicates(self) -> None:
+        master = {
+            'latitude 7420': data.DeviceCarbonFootprint({'manufacturer': 'Dell', 'name': 'Latitude 7420'}),
+        }
+        runner = pipeline.Pipeline(master)
+        document = pipeline.Document('report.pdf')
+        document.devices = [
+            data.DeviceCarbonFootprint({'manufacturer': 'Dell', 'name': 'Latitude-7420'}),
+            data.DeviceCarbonFootprint({'manufacturer': 'Dell', 'name': 'Latitude 5420'}),
+            data.DeviceCarbonFootprint({'manufacturer': 'Dell', 'name': 'latitude 5420'}),
+        ]
+        asyncio.run(runner._merge(document))  # pylint: disable=protected-access
+        self.assertEqual([('Latitude-7420', 'Latitude 7420', 1.)], runner.near_duplicates)
+        self.assertEqual(['latitude 7420', 'latitude-7420', 'latitude 5420'], list(master))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Tests for the record and replay of crawls, and the offline benchmark.
+
+The crawls run in sub processes, like in the benchmark, on the local listing
+of fixtures/replay.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from typing import Any, Dict, List
+
+from scrapy.exceptions import NotConfigured
+from scrapy.settings import Settings
+
+from tools.spiders.lib import benchmark
+from tools.spiders.lib import replay
+
+_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'replay')
+_SPIDER = os.path.join(_FIXTURES, 'spider.py')
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _Crawler:
+
+    def __init__(self, settings: Dict[str, Any]) -> None:
+        self.settings = Settings(settings)
+
+
+def _crawl(tmpdir: str, root: str, *settings: str) -> List[Dict[str, Any]]:
+    """Run the fixture spider and return its items."""
+    items_file = os.path.join(tmpdir, 'items.jsonl')
+    if os.path.exists(items_file):
+        os.remove(items_file)
+    command = [
+        sys.executable, '-m', 'scrapy', 'runspider', _SPIDER, '-L', 'ERROR',
+        '-s', 'AUTOTHROTTLE_ENABLED=0',
+        '-a', f'root={root}',
+        '-a', f'source_index={os.path.join(tmpdir, "sources.sqlite")}',
+        '-o', items_file,
+    ]
+    for setting in settings:
+        command.extend(['-s', setting])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [_ROOT, os.getenv('PYTHONPATH')])))
+    subprocess.run(command, check=True, env=env, cwd=tmpdir)
+    with open(items_file, 'rt', encoding='utf-8') as items:
+        return sorted((json.loads(line) for line in items), key=lambda item: item['name'])
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+        self.archive = os.path.join(self.tmpdir, 'archives')
+        # A copy of the site, removed once recorded.
+        self.site = os.path.join(self.tmpdir, 'site')
+        shutil.copytree(_FIXTURES, self.site)
+
+    def test_record_and_replay(self) -> None:
+        recorded = _crawl(self.tmpdir, f'file://{self.site}', f'REPLAY_RECORD_DIR={self.archive}')
+        self.assertEqual(['device 1', 'device 2'], [item['name'] for item in recorded])
+        self.assertTrue(os.path.exists(os.path.join(self.archive, 'listing', 'start_requests.pickle')))
+
+        shutil.rmtree(self.site)
+        # The start requests come from the archive, not from the spider's root.
+        replayed = _crawl(self.tmpdir, 'file:///nowhere', f'REPLAY_DIR={self.archive}')
+        self.assertEqual(recorded, replayed)
+
+    def test_benchmark_latency(self) -> None:
+        _crawl(self.tmpdir, f'file://{self.site}', f'REPLAY_RECORD_DIR={self.archive}')
+        shutil.rmtree(self.site)
+
+        result = benchmark.run_spider(_SPIDER, self.archive, latency=0.5, extra_settings=['AUTOTHROTTLE_ENABLED=0'])
+        self.assertEqual(2, result['pdfs'])
+        self.assertEqual(2, result['items'])
+        self.assertEqual(0, result['replay_misses'])
+        # The listing, then the documents.
+        self.assertGreaterEqual(result['seconds'], 1.)
+
+    def test_benchmark_peak_memory(self) -> None:
+        _crawl(self.tmpdir, f'file://{self.site}', f'REPLAY_RECORD_DIR={self.archive}')
+        # A bigger process, which ended before the spider started.
+        subprocess.run([sys.executable, '-c', 'bytearray(1024 ** 3)'], check=True)
+
+        result = benchmark.run_spider(_SPIDER, self.archive, extra_settings=['AUTOTHROTTLE_ENABLED=0'])
+        self.assertGreater(result['peak_rss_mb'], 0)
+        self.assertLess(result['peak_rss_mb'], 1024)
+
+    def test_record_or_replay(self) -> None:
+        crawler = _Crawler({'REPLAY_RECORD_DIR': self.archive, 'REPLAY_DIR': self.archive})
+        with self.assertLogs(level='WARNING'):
+            with self.assertRaises(NotConfigured):
+                replay.RecordMiddleware(crawler)
+        with self.assertRaises(NotConfigured):
+            replay.RecordStartRequestsMiddleware(crawler)
+
+
+if __name__ == '__main__':
+    unittest.main()
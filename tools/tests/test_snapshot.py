@@ -0,0 +1,77 @@
+"""Tests for the columnar snapshots of data files."""
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from tools import snapshot
+from tools.parsers.lib import data
+
+_CSV = (
+    data.DeviceCarbonFootprint.csv_headers().replace('\r\n', '\n') +
+    'Apple,iPad,Workplace,Tablet,100,0.1500,,3,WW,,,abc,,,,,10.2,,,,2,,,Manual,,,,,,,,\n'
+    'Dell,Latitude 5420,Workplace,Laptop,n/a,,,,,,,def,,,,,,,,,,,,Manual,,,,,,,,\n'
+)
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.csv_path = os.path.join(tmpdir, 'data.csv')
+        self._write(_CSV)
+
+    def _write(self, content: str) -> None:
+        with open(self.csv_path, 'wt', encoding='utf-8') as csv_file:
+            csv_file.write(content)
+
+    def test_columns(self) -> None:
+        dataset = snapshot.load(self.csv_path)
+        self.assertEqual(2, len(dataset))
+        self.assertEqual(['Apple', 'Dell'], dataset.categories('manufacturer').tolist())
+        self.assertEqual(['Workplace', 'Workplace'], dataset.values('category').tolist())
+        self.assertEqual([0, -1], dataset.codes('use_location').tolist())
+        gwp_total = dataset.values('gwp_total')
+        self.assertEqual(100, gwp_total[0])
+        self.assertTrue(math.isnan(gwp_total[1]))
+        self.assertEqual([False, True], dataset.missing('number_cpu').tolist())
+        self.assertEqual(
+            data.DeviceCarbonFootprint.from_text(dict(zip(
+                data.DeviceCarbonFootprintData.__annotations__, _CSV.splitlines()[1].split(',')))).data,
+            next(dataset.devices()).data)
+
+    def test_malformed_numbers(self) -> None:
+        self._write(_CSV.replace(',3,WW', ',three,WW'))
+        dataset = snapshot.load(self.csv_path)
+        self.assertEqual({1: 'n/a'}, dataset.malformed('gwp_total'))
+        self.assertEqual({0: 'three'}, dataset.malformed('lifetime'))
+        self.assertEqual([True, True], dataset.missing('lifetime').tolist())
+        self.assertEqual({}, dataset.malformed('gwp_use_ratio'))
+        # Still known once the snapshot is loaded from disk.
+        self.assertEqual({1: 'n/a'}, snapshot.load(self.csv_path).malformed('gwp_total'))
+
+    def test_rebuild(self) -> None:
+        self.assertEqual(['Apple', 'Dell'], snapshot.load(self.csv_path).categories('manufacturer').tolist())
+
+        # Touched only: the snapshot is still valid.
+        os.utime(self.csv_path, ns=(0, 0))
+        self.assertEqual(2, len(snapshot.load(self.csv_path)))
+
+        self._write(_CSV.replace('Dell', 'HP'))
+        self.assertEqual(['Apple', 'HP'], snapshot.load(self.csv_path).categories('manufacturer').tolist())
+
+
+    def test_fr_format(self) -> None:
+        self._write(
+            _CSV.replace(',', ';').replace('0.1500', '0,1500').replace('10.2', '10,2') +
+            data.DeviceCarbonFootprint.csv_headers().replace(',', ';'))
+        dataset = snapshot.load(self.csv_path)
+        self.assertEqual(2, len(dataset))
+        self.assertEqual([0.15, 10.2], [dataset.values('gwp_use_ratio')[0], dataset.values('screen_size')[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Tests for the source index shared by spiders."""
+import os
+import tempfile
+import unittest
+
+from tools.spiders.lib import sources
+
+
+class SourceIndexTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.index = sources.SourceIndex(os.path.join(self.tmpdir.name, 'sources.sqlite'))
+        self.addCleanup(self.index.close)
+
+    def _write(self, name: str, content: str) -> str:
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'wt', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_normalize_url(self) -> None:
+        self.assertEqual(
+            sources.normalize_url('https://www.example.com/doc.pdf?b=2&a=1'),
+            sources.normalize_url('http://WWW.example.com/doc.pdf?a=1&b=2#page=3'))
+
+    def test_existing_csv(self) -> None:
+        self.index.sync_csv(self._write('data.csv', (
+            'manufacturer,sources,sources_hash\n'
+            'Lenovo,https://psref.lenovo.com/pcf/t14.pdf,abc\n')))
+        self.assertTrue(self.index.why_skip('https://psref.lenovo.com/pcf/t14.pdf'))
+        # Same file name on another host of the same site.
+        self.assertTrue(self.index.why_skip('https://static.lenovo.com/pcf/t14.pdf'))
+        # Same file name on another manufacturer's site.
+        self.assertIsNone(self.index.why_skip('https://www.dell.com/pcf/t14.pdf'))
+        self.assertEqual(['https://psref.lenovo.com/pcf/t14.pdf'], self.index.urls_for_hash('abc'))
+
+    def test_blacklist(self) -> None:
+        self.index.sync_blacklist(self._write('blacklist', 'pcf-lca-whitepaper.pdf\n'))
+        self.assertEqual('blacklisted', self.index.why_skip('https://dell.com/x/pcf-lca-whitepaper.pdf'))
+
+    def test_add(self) -> None:
+        self.assertIsNone(self.index.why_skip('https://www.apple.com/mba.pdf'))
+        self.index.add('https://www.apple.com/mba.pdf', 'def')
+        self.assertTrue(self.index.why_skip('https://www.apple.com/mba.pdf'))
+        self.assertEqual(['https://www.apple.com/mba.pdf'], self.index.urls_for_hash('def'))
+
+    def test_public_suffix(self) -> None:
+        self.index.add('https://www.apple.co.uk/pcf/mba.pdf', 'ghi')
+        self.assertTrue(self.index.why_skip('https://images.apple.co.uk/pcf/mba.pdf'))
+        # Another site under the same public suffix.
+        self.assertIsNone(self.index.why_skip('https://www.dell.co.uk/pcf/mba.pdf'))
+        self.assertIsNone(self.index.why_skip('https://www.huawei.com.cn/pcf/mba.pdf'))
+
+    def test_previous_runs(self) -> None:
+        path = os.path.join(self.tmpdir.name, 'runs.sqlite')
+        index = sources.SourceIndex(path)
+        index.add('https://www.apple.com/mba.pdf', 'def')
+        self.assertTrue(index.why_skip('https://www.apple.com/mba.pdf'))
+        index.close()
+
+        # Sources scraped by a previous run are scraped again by default.
+        index = sources.SourceIndex(path)
+        self.assertIsNone(index.why_skip('https://www.apple.com/mba.pdf'))
+        self.assertEqual([], index.urls_for_hash('def'))
+        index.close()
+
+        index = sources.SourceIndex(path, skip_scraped=True)
+        self.assertTrue(index.why_skip('https://www.apple.com/mba.pdf'))
+        self.assertEqual(['https://www.apple.com/mba.pdf'], index.urls_for_hash('def'))
+        self.assertEqual(1, index.forget_scraped())
+        self.assertIsNone(index.why_skip('https://www.apple.com/mba.pdf'))
+        index.close()
+
+    def test_forget_scraped_keeps_existing(self) -> None:
+        self.index.sync_csv(self._write('data.csv', (
+            'manufacturer,sources,sources_hash\n'
+            'Lenovo,https://psref.lenovo.com/pcf/t14.pdf,abc\n')))
+        self.index.add('https://psref.lenovo.com/pcf/t15.pdf', 'def')
+        self.assertEqual(1, self.index.forget_scraped())
+        self.assertTrue(self.index.why_skip('https://psref.lenovo.com/pcf/t14.pdf'))
+        self.assertIsNone(self.index.why_skip('https://psref.lenovo.com/pcf/t15.pdf'))
+
+
+if __name__ == '__main__':
+    unittest.main()
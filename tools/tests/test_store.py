@@ -0,0 +1,61 @@
+"""Tests for the SQLite working store."""
+import io
+import os
+import unittest
+
+from tools import store
+from tools.parsers.lib import data
+
+_DATA_FOLDER = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+_CSV = (
+    data.DeviceCarbonFootprint.csv_headers().replace('\r\n', '\n') +
+    'Apple,iPad,Workplace,Tablet,100,0.1500,,3,WW,,,abc,,,,,10.2,,,,,,,Manual,,,,,,,,\n'
+    'Dell,Latitude 5420,Workplace,Laptop,300,,,,,,,def,,,,,,,,,,,,Manual,,,,,,,,\n'
+)
+
+
+class DeviceStoreTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.store = store.DeviceStore()
+        self.addCleanup(self.store.close)
+
+    def _export(self, csv_format: str = 'us') -> str:
+        output = io.StringIO()
+        self.store.export_csv(output, csv_format)  # type: ignore [arg-type]
+        return output.getvalue()
+
+    def test_export_data_files(self) -> None:
+        with open(os.path.join(_DATA_FOLDER, 'boavizta-data-us.csv'), 'rt', encoding='utf-8') as us_file:
+            self.store.load_csv(us_file)
+        for csv_format in ('us', 'fr'):
+            with open(os.path.join(_DATA_FOLDER, f'boavizta-data-{csv_format}.csv'), 'rb') as data_file:
+                self.assertEqual(data_file.read(), self._export(csv_format).encode('utf-8'), msg=csv_format)
+
+    def test_find(self) -> None:
+        self.store.load_csv(io.StringIO(_CSV))
+        self.assertEqual(2, len(self.store))
+        devices = self.store.find(manufacturer='apple', category='Workplace')
+        self.assertEqual(['iPad'], [device.get('name') for device in devices])
+        self.assertEqual(0.15, devices[0].get('gwp_use_ratio'))
+        self.assertEqual([], self.store.find(sources_hash='xyz'))
+        with self.assertRaises(ValueError):
+            self.store.find(color='red')
+
+    def test_upsert(self) -> None:
+        self.store.load_csv(io.StringIO(_CSV))
+        added, updated = self.store.upsert([
+            data.DeviceCarbonFootprint({'manufacturer': 'Apple', 'name': 'IPAD', 'gwp_total': 110.0}),
+            data.DeviceCarbonFootprint({'manufacturer': 'HP', 'name': 'Elite, x360', 'gwp_total': 250.0}),
+        ])
+        self.assertEqual((1, 1), (added, updated))
+        self.assertEqual(
+            _CSV.replace('iPad,Workplace,Tablet,100,', 'IPAD,Workplace,Tablet,110.0,') +
+            'HP,Elite x360,,,250.0,,,,,,,,,,,,,,,,,,,,,,,,,,,\n',
+            self._export())
+
+
+if __name__ == '__main__':
+    unittest.main()
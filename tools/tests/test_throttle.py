@@ -0,0 +1,167 @@
+"""Tests for the adaptive concurrency of the spiders, with fake downloader slots."""
+import json
+import os
+import tempfile
+import unittest
+from typing import Any, Dict, Optional
+
+import scrapy
+from scrapy import http
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.settings import Settings
+from scrapy.signalmanager import SignalManager
+from scrapy.statscollectors import MemoryStatsCollector
+
+from tools.spiders.lib import throttle
+
+
+class _Slot:
+
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency = concurrency
+
+
+class _Downloader:
+
+    def __init__(self) -> None:
+        self.slots: Dict[str, _Slot] = {}
+        self.active: set = set()
+
+    def get_slot_key(self, request: scrapy.Request) -> str:
+        return request.url.split('/')[2]
+
+
+class _Engine:
+
+    def __init__(self) -> None:
+        self.downloader = _Downloader()
+
+
+class _Crawler:
+
+    def __init__(self, settings: Dict[str, Any]) -> None:
+        self.settings = Settings(settings)
+        self.signals = SignalManager()
+        self.stats = MemoryStatsCollector(self)  # type: ignore [arg-type]
+        self.engine = _Engine()
+
+
+class AdaptiveConcurrencyTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.crawler = _Crawler({
+            'ADAPTIVE_CONCURRENCY_ENABLED': True,
+            'ADAPTIVE_CONCURRENCY_MIN': 1,
+            'ADAPTIVE_CONCURRENCY_MAX': 4,
+            'ADAPTIVE_CONCURRENCY_TARGET_LATENCY': 1.0,
+        })
+        self.middleware = throttle.AdaptiveConcurrencyMiddleware.from_crawler(self.crawler)
+        self.spider = scrapy.Spider('test')
+        self.slot = self.crawler.engine.downloader.slots['example.com'] = _Slot(2)
+
+    def _respond(self, status: int = 200, latency: Optional[float] = 0.1) -> None:
+        request = scrapy.Request('https://example.com/doc.pdf')
+        if latency is not None:
+            request.meta['download_latency'] = latency
+        response = http.Response(request.url, status=status, request=request)
+        self.assertIs(response, self.middleware.process_response(request, response, self.spider))
+
+    def test_disabled(self) -> None:
+        with self.assertRaises(NotConfigured):
+            throttle.AdaptiveConcurrencyMiddleware(_Crawler({}))
+
+    def test_additive_increase(self) -> None:
+        # One more concurrent request after a full round of fast responses.
+        self._respond()
+        self.assertEqual(2, self.slot.concurrency)
+        self._respond()
+        self.assertEqual(3, self.slot.concurrency)
+        for unused_index in range(3):
+            self._respond()
+        self.assertEqual(4, self.slot.concurrency)
+        self.assertEqual(4, self.crawler.stats.get_value('adaptive_concurrency/example.com/max'))
+
+    def test_max_concurrency(self) -> None:
+        self.slot.concurrency = 4
+        for unused_index in range(10):
+            self._respond()
+        self.assertEqual(4, self.slot.concurrency)
+
+    def test_multiplicative_decrease(self) -> None:
+        self.slot.concurrency = 4
+        self._respond(status=429)
+        self.assertEqual(2, self.slot.concurrency)
+        self._respond(status=503)
+        self.assertEqual(1, self.slot.concurrency)
+        self.assertEqual(2, self.crawler.stats.get_value('adaptive_concurrency/example.com/errors'))
+
+    def test_min_concurrency(self) -> None:
+        self.slot.concurrency = 1
+        self._respond(status=503)
+        self._respond(latency=10.)
+        self.assertEqual(1, self.slot.concurrency)
+
+    def test_exception(self) -> None:
+        self.slot.concurrency = 4
+        self.middleware.process_exception(scrapy.Request('https://example.com/doc.pdf'), IOError(), self.spider)
+        self.assertEqual(2, self.slot.concurrency)
+
+    def test_slow_latency(self) -> None:
+        self.slot.concurrency = 3
+        self._respond(latency=2.5)
+        self.assertEqual(2, self.slot.concurrency)
+        # Between the target and twice the target: no change.
+        self._respond(latency=1.5)
+        self._respond(latency=1.5)
+        self._respond(latency=None)
+        self.assertEqual(2, self.slot.concurrency)
+
+    def test_slow_latency_resets_round(self) -> None:
+        self.slot.concurrency = 3
+        self._respond()
+        self._respond()
+        self._respond(latency=2.5)
+        self._respond()
+        self.assertEqual(2, self.slot.concurrency)
+
+    def test_unknown_slot(self) -> None:
+        request = scrapy.Request('https://other.example.org/doc.pdf', meta={'download_latency': 0.1})
+        response = http.Response(request.url, request=request)
+        self.assertIs(response, self.middleware.process_response(request, response, self.spider))
+
+    def test_crawl_profile(self) -> None:
+        self.spider.crawl_profile = {'max_concurrency': 2}  # type: ignore [attr-defined]
+        self.crawler.signals.send_catch_log(signals.spider_opened, spider=self.spider)
+        for unused_index in range(5):
+            self._respond()
+        self.assertEqual(2, self.slot.concurrency)
+        self.crawler.signals.send_catch_log(signals.spider_closed, spider=self.spider)
+        self.assertEqual(2, self.crawler.stats.get_value('adaptive_concurrency/example.com/final'))
+
+
+class ThroughputStatsTest(unittest.TestCase):
+
+    def test_stats(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            stats_file = os.path.join(tmpdir, 'stats.json')
+            crawler = _Crawler({'THROUGHPUT_STATS_ENABLED': True, 'THROUGHPUT_STATS_FILE': stats_file})
+            extension = throttle.ThroughputStats.from_crawler(crawler)
+            spider = scrapy.Spider('test')
+            extension._start = 1.  # pylint: disable=protected-access
+            for body in (b'%PDF-1.4 document', b'<html></html>', b'%PDF-1.7'):
+                request = scrapy.Request('https://example.com/doc')
+                crawler.signals.send_catch_log(
+                    signals.response_received, response=http.Response(request.url, body=body),
+                    request=request, spider=spider)
+            crawler.signals.send_catch_log(signals.spider_closed, spider=spider)
+            with open(stats_file, 'rt', encoding='utf-8') as file:
+                saved = json.load(file)
+        self.assertEqual(2, saved['throughput/pdfs'])
+        self.assertIn('throughput/pdfs_per_minute', saved)
+        self.assertIn('throughput/bytes_per_second', saved)
+
+
+if __name__ == '__main__':
+    unittest.main()
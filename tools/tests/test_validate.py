@@ -0,0 +1,107 @@
+"""Tests for the consistency rules of the data files."""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from tools import validate
+from tools.parsers.lib import data
+
+_HEADERS = (
+    'manufacturer,name,report_date,gwp_total,gwp_use_ratio,yearly_tec,lifetime,gwp_error_ratio,'
+    'gwp_manufacturing_ratio,gwp_transport_ratio,gwp_eol_ratio,gwp_electronics_ratio,gwp_battery_ratio,'
+    'gwp_hdd_ratio,gwp_ssd_ratio,gwp_othercomponents_ratio\n')
+
+
+class ValidateTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def _validate(self, *rows: str) -> dict:
+        csv_path = os.path.join(self.tmpdir, 'data.csv')
+        with open(csv_path, 'wt', encoding='utf-8') as csv_file:
+            csv_file.write(_HEADERS + ''.join(f'{row}\n' for row in rows))
+        return validate.validate(csv_path)
+
+    def _flagged(self, report: dict) -> dict:
+        return {
+            rule_report['rule']: [row['row'] for row in rule_report['rows']]
+            for rule_report in report['rules'] if rule_report['count']}
+
+    def test_consistent_rows(self) -> None:
+        report = self._validate(
+            'HP,EliteBook,2021,300,0.2,25,4,0.1,0.7,0.05,0.05,0.4,0.1,,0.1,0.1',
+            # Transport and end of life not reported.
+            'Dell,Latitude,2020,250,0.25,20,4,,0.7,0,0,,,,,',
+            'Apple,iPad,2019,100,,,,,,,,,,,,')
+        self.assertEqual(3, report['rows'])
+        self.assertEqual({}, self._flagged(report))
+
+    def test_rules(self) -> None:
+        report = self._validate(
+            'HP,EliteBook,2021,-3,0.2,25,4,0.1,0.7,0.05,0.05,0.4,0.1,,0.1,0.1',
+            'HP,ProBook,2021,300,0.2,25,4,1.5,7.7,0.05,0.05,,,,,',
+            'Dell,Latitude,2020,250,0.2,20,4,,0.7,0.05,0.02,,,,,',
+            'Dell,Precision,2020,250,0.25,20,4,,0.5,0,0,0.4,0.2,,,',
+            'Dell,OptiPlex,2020,250,0.7,20,4,,,0,0,0.4,0.2,0,0,0',
+            'Lenovo,ThinkPad,2022,300,0.2,2000,4,,0.8,0,0,,,,,')
+        self.assertEqual({
+            'gwp_total_positive': [0],
+            'ratio_range': [1],
+            'phase_ratios_sum': [1, 2],
+            'components_in_manufacturing': [3],
+            'components_without_manufacturing': [4],
+            'error_ratio_range': [1],
+            'electricity_factor': [0, 4, 5],
+        }, self._flagged(report))
+
+        ratio_range = report['rules'][2]
+        self.assertEqual('error', ratio_range['severity'])
+        self.assertEqual(
+            {'row': 1, 'manufacturer': 'HP', 'name': 'ProBook', 'report_date': '2021', 'gwp_manufacturing_ratio': 7.7},
+            {field: value for field, value in ratio_range['rows'][0].items() if field in (
+                'row', 'gwp_manufacturing_ratio') + validate.KEY_FIELDS})
+        self.assertIsNone(ratio_range['rows'][0]['gwp_hdd_ratio'])
+        # The report is JSON.
+        self.assertEqual(report['rules'], json.loads(json.dumps(report))['rules'])
+
+    def test_malformed_numbers(self) -> None:
+        report = self._validate(
+            'HP,EliteBook,2021,300,0.2,25,4,0.1,0.7,0.05,0.05,0.4,0.1,,0.1,0.1',
+            'HP,ProBook,2021,n/a,0.2,25,four,,0.7,0.05,0.05,,,,,')
+        self.assertEqual({'malformed_number': [1]}, self._flagged(report))
+        malformed_number = report['rules'][0]
+        self.assertEqual('error', malformed_number['severity'])
+        self.assertEqual({'gwp_total': 'n/a', 'lifetime': 'four'}, malformed_number['rows'][0]['malformed'])
+
+    def test_new_errors(self) -> None:
+        baseline = self._validate('HP,ProBook,2021,300,0.2,25,4,,7.7,0.05,0.05,,,,,')
+        known = validate.known_anomalies([baseline])
+        report = self._validate(
+            'Dell,Latitude,2020,-1,,,,,,,,,,,,',
+            'HP,ProBook,2021,300,0.2,25,4,,7.7,0.05,0.05,,,,,',
+            'Lenovo,ThinkPad,2022,300,0.2,250,4,,0.8,0,0,,,,,')
+        self.assertEqual(
+            [('gwp_total_positive', 'Latitude')],
+            [(error['rule'], error['name']) for error in validate.new_errors(report, known)])
+
+    def test_main_fails_on_new_errors(self) -> None:
+        baseline_path = os.path.join(self.tmpdir, 'baseline.json')
+        csv_path = os.path.join(self.tmpdir, 'data.csv')
+        self._validate('HP,ProBook,2021,300,0.2,25,4,,7.7,0.05,0.05,,,,,')
+        # Without a baseline, all the errors are new.
+        with self.assertRaises(SystemExit):
+            validate.main([csv_path, '--json', baseline_path])
+        validate.main([csv_path, '--baseline', baseline_path])
+
+        self._validate('Dell,Latitude,2020,-1,,,,,,,,,,,,')
+        with self.assertRaises(SystemExit):
+            validate.main([csv_path, '--baseline', baseline_path])
+
+
+if __name__ == '__main__':
+    unittest.main()
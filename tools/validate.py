@@ -0,0 +1,237 @@
+"""Check the consistency of the data files with rules run on whole columns.
+
+Each rule flags the rows which break it, with array operations on the
+columns of the file's snapshot, so that the whole dataset is checked in
+milliseconds. The report lists the flagged rows of each rule, and can be
+saved as JSON:
+
+    python -m tools.validate boavizta-data-us.csv new_hp.csv --json report.json
+
+As a merge gate, only the errors which are not in a baseline report fail:
+
+    python -m tools.validate boavizta-data-us.csv --baseline tools/validation_baseline.json
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List, Literal, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from tools import snapshot
+
+PHASE_RATIOS = ('gwp_use_ratio', 'gwp_manufacturing_ratio', 'gwp_transport_ratio', 'gwp_eol_ratio')
+COMPONENT_RATIOS = (
+    'gwp_electronics_ratio', 'gwp_battery_ratio', 'gwp_hdd_ratio', 'gwp_ssd_ratio', 'gwp_othercomponents_ratio')
+# Tolerance on sums of ratios, which are often rounded in the reports.
+RATIO_TOLERANCE = 0.02
+# Plausible carbon intensities of electricity, in kgCO2eq/kWh: from nuclear
+# or hydro mixes (France, Sweden) to coal ones (Poland, India, South Africa).
+ELECTRICITY_FACTOR_RANGE = (0.01, 1.2)
+# The fields which identify a row in the reports.
+KEY_FIELDS = ('manufacturer', 'name', 'report_date')
+
+Severity = Literal['error', 'warning']
+
+
+class Rule(NamedTuple):
+    """A consistency rule on the devices."""
+    name: str
+    severity: Severity
+    description: str
+    # Fields shown with each flagged row.
+    fields: Tuple[str, ...]
+    # The rows which break the rule, from the snapshot of a data file.
+    check: Callable[[snapshot.Snapshot], np.ndarray]
+    # Extra information on a flagged row, from the snapshot and the row.
+    details: Optional[Callable[[snapshot.Snapshot, int], Dict[str, Any]]] = None
+
+
+def phase_ratios_sum(dataset: snapshot.Snapshot) -> np.ndarray:
+    """The sum of the phase ratios when known, NaN when none is."""
+    phases = np.stack([dataset.values(field) for field in PHASE_RATIOS], axis=1)
+    return np.where(np.isnan(phases).all(axis=1), np.nan, np.nansum(phases, axis=1))
+
+
+def electricity_factor(dataset: snapshot.Snapshot) -> np.ndarray:
+    """The carbon intensity of electricity (kgCO2eq/kWh) implied by the use phase, NaN when unknown."""
+    use_footprint = dataset.values('gwp_total') * dataset.values('gwp_use_ratio')
+    energy = dataset.values('yearly_tec') * dataset.values('lifetime')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(energy > 0, use_footprint / energy, np.nan)
+
+
+def _ratios_out_of_range(dataset: snapshot.Snapshot) -> np.ndarray:
+    ratios = np.stack([dataset.values(field) for field in PHASE_RATIOS + COMPONENT_RATIOS], axis=1)
+    return np.asarray(((ratios < 0) | (ratios > 1)).any(axis=1))
+
+
+def _phase_ratios_not_one(dataset: snapshot.Snapshot) -> np.ndarray:
+    total = phase_ratios_sum(dataset)
+    # Many reports give no transport or end of life ratio, written as 0.
+    phases_known = (np.stack([dataset.values(field) for field in PHASE_RATIOS], axis=1) > 0).all(axis=1)
+    return np.asarray((total > 1 + RATIO_TOLERANCE) | (phases_known & (total < 1 - RATIO_TOLERANCE)))
+
+
+def _components_over_manufacturing(dataset: snapshot.Snapshot) -> np.ndarray:
+    components = np.stack([dataset.values(field) for field in COMPONENT_RATIOS], axis=1)
+    total = np.nansum(components, axis=1)
+    return np.asarray(total > dataset.values('gwp_manufacturing_ratio') + RATIO_TOLERANCE)
+
+
+def _components_without_manufacturing(dataset: snapshot.Snapshot) -> np.ndarray:
+    components_known = ~np.isnan(np.stack([dataset.values(field) for field in COMPONENT_RATIOS], axis=1)).any(axis=1)
+    return np.asarray(components_known & np.isnan(dataset.values('gwp_manufacturing_ratio')))
+
+
+def _gwp_total_not_positive(dataset: snapshot.Snapshot) -> np.ndarray:
+    return np.asarray(dataset.values('gwp_total') <= 0)
+
+
+def _error_ratio_out_of_range(dataset: snapshot.Snapshot) -> np.ndarray:
+    error_ratio = dataset.values('gwp_error_ratio')
+    return np.asarray((error_ratio < 0) | (error_ratio > 1))
+
+
+def _implausible_electricity_factor(dataset: snapshot.Snapshot) -> np.ndarray:
+    factor = electricity_factor(dataset)
+    low, high = ELECTRICITY_FACTOR_RANGE
+    return np.asarray((factor < low) | (factor > high))
+
+
+def _malformed_numbers(dataset: snapshot.Snapshot) -> np.ndarray:
+    flagged = np.zeros(len(dataset), dtype=bool)
+    for field in dataset.fields:
+        flagged[list(dataset.malformed(field))] = True
+    return flagged
+
+
+def _malformed_texts(dataset: snapshot.Snapshot, row: int) -> Dict[str, Any]:
+    malformed = {field: dataset.malformed(field) for field in dataset.fields}
+    return {'malformed': {field: texts[row] for field, texts in malformed.items() if row in texts}}
+
+
+RULES = (
+    Rule(
+        'malformed_number', 'error', 'a numeric field is not a number: it is read as missing',
+        (), _malformed_numbers, _malformed_texts),
+    Rule(
+        'gwp_total_positive', 'error', 'gwp_total is not positive',
+        ('gwp_total',), _gwp_total_not_positive),
+    Rule(
+        'ratio_range', 'error', 'a phase or component ratio is not between 0 and 1',
+        PHASE_RATIOS + COMPONENT_RATIOS, _ratios_out_of_range),
+    Rule(
+        'phase_ratios_sum', 'error',
+        f'the phase ratios add up to more than 1, or not to 1 (±{RATIO_TOLERANCE}) while all are known and not 0',
+        PHASE_RATIOS, _phase_ratios_not_one),
+    Rule(
+        'components_in_manufacturing', 'error',
+        'the component ratios add up to more than the manufacturing ratio',
+        ('gwp_manufacturing_ratio',) + COMPONENT_RATIOS, _components_over_manufacturing),
+    Rule(
+        'components_without_manufacturing', 'warning',
+        'component ratios are known but not the manufacturing ratio',
+        ('gwp_manufacturing_ratio',) + COMPONENT_RATIOS, _components_without_manufacturing),
+    Rule(
+        'error_ratio_range', 'warning', 'gwp_error_ratio is not between 0 and 1',
+        ('gwp_error_ratio',), _error_ratio_out_of_range),
+    Rule(
+        'electricity_factor', 'warning',
+        'the electricity factor implied by gwp_total, gwp_use_ratio, yearly_tec and lifetime is not between '
+        f'{ELECTRICITY_FACTOR_RANGE[0]} and {ELECTRICITY_FACTOR_RANGE[1]} kgCO2eq/kWh',
+        ('gwp_total', 'gwp_use_ratio', 'yearly_tec', 'lifetime'), _implausible_electricity_factor),
+)
+
+
+def _json_value(value: Any) -> Any:
+    """A JSON value of a numpy scalar, None for missing numbers."""
+    value = value.item() if isinstance(value, np.generic) else value
+    return None if isinstance(value, float) and np.isnan(value) else value
+
+
+def validate(csv_path: str, rules: Sequence[Rule] = RULES) -> Dict[str, Any]:
+    """The report of the rules on a data file: the rows flagged by each rule, with their key and fields."""
+    start = time.perf_counter()
+    dataset = snapshot.load(csv_path)
+    rule_reports = []
+    for rule in rules:
+        rows = np.flatnonzero(rule.check(dataset))
+        values = {field: dataset.values(field)[rows].tolist() for field in KEY_FIELDS + rule.fields}
+        rule_reports.append({
+            'rule': rule.name,
+            'severity': rule.severity,
+            'description': rule.description,
+            'count': len(rows),
+            'rows': [
+                dict(
+                    {'row': int(row)}, **{field: _json_value(values[field][index]) for field in values},
+                    **(rule.details(dataset, row) if rule.details else {}))
+                for index, row in enumerate(rows.tolist())],
+        })
+    return {
+        'file': csv_path,
+        'rows': len(dataset),
+        'rules': rule_reports,
+        'seconds': round(time.perf_counter() - start, 4),
+    }
+
+
+def _anomaly_key(rule: str, row: Dict[str, Any]) -> Tuple[str, ...]:
+    return (rule,) + tuple(str(row.get(field) or '') for field in KEY_FIELDS)
+
+
+def known_anomalies(baseline: Sequence[Dict[str, Any]]) -> Set[Tuple[str, ...]]:
+    """The rules and keys of the rows flagged in baseline reports."""
+    return {
+        _anomaly_key(rule_report['rule'], row)
+        for report in baseline for rule_report in report['rules'] for row in rule_report['rows']}
+
+
+def new_errors(report: Dict[str, Any], known: Set[Tuple[str, ...]]) -> List[Dict[str, Any]]:
+    """The rows flagged by error rules in a report, which are not known anomalies."""
+    return [
+        dict(row, rule=rule_report['rule'])
+        for rule_report in report['rules'] if rule_report['severity'] == 'error'
+        for row in rule_report['rows'] if _anomaly_key(rule_report['rule'], row) not in known]
+
+
+def main(string_args: Optional[List[str]] = None) -> None:
+    argparser = argparse.ArgumentParser(
+        description='Check the consistency of Boavizta csv files',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argparser.add_argument('files', nargs='+', help='.csv files to check')
+    argparser.add_argument('--json', help='Output .json file for the reports')
+    argparser.add_argument('--baseline', help='.json reports of the known anomalies: only new errors fail')
+    argparser.add_argument('-v', '--verbose', action='store_true', help='Print the flagged rows')
+    args = argparser.parse_args(string_args)
+
+    known: Set[Tuple[str, ...]] = set()
+    if args.baseline:
+        with open(args.baseline, 'rt', encoding='utf-8') as baseline_file:
+            known = known_anomalies(json.load(baseline_file))
+
+    reports = [validate(csv_path) for csv_path in args.files]
+    errors: List[Dict[str, Any]] = []
+    for report in reports:
+        print(f'{report["file"]}: {report["rows"]} rows checked in {report["seconds"] * 1000:.1f} ms')
+        for rule_report in report['rules']:
+            if rule_report['count']:
+                print(f'  {rule_report["severity"]:<8} {rule_report["rule"]}: {rule_report["count"]} rows')
+                if args.verbose:
+                    for row in rule_report['rows']:
+                        print(f'    {row}')
+        errors.extend(dict(error, file=report['file']) for error in new_errors(report, known))
+
+    if args.json:
+        with open(args.json, 'wt', encoding='utf-8') as json_file:
+            json.dump(reports, json_file, indent=1)
+    if errors:
+        for error in errors:
+            print(f'New error: {error}', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()